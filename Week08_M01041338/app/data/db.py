@@ -1,17 +1,128 @@
 # Database connection and setup file
 
-import sqlite3
+import atexit
+import os
+import threading
 from pathlib import Path
+from app.data.pool import ConnectionPool
 
 # Path to the SQLite database file
 DB_PATH = Path("DATA") / "intelligence_platform.db"
 
+# Max open connections per database file
+POOL_SIZE = 8
+# Seconds to wait for a free connection before raising PoolTimeout
+POOL_TIMEOUT = 30.0
+
+# --- Performance profile ---
+# Named sets of PRAGMAs applied to every new connection.
+# "default" is plain SQLite (rollback journal, synchronous=FULL).
+# "performance" uses WAL so the CRUD writers no longer block dashboard readers.
+DB_PROFILE = os.environ.get("DB_PROFILE", "performance")
+MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))   # bytes
+CACHE_SIZE = int(os.environ.get("DB_CACHE_SIZE", -64000))             # negative = KiB
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+
+PROFILES = {
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": MMAP_SIZE,
+        "cache_size": CACHE_SIZE,
+        "temp_store": "MEMORY",
+        "busy_timeout": BUSY_TIMEOUT_MS,
+    },
+}
+
+
+def apply_profile(conn, profile_name=None):
+    # Run the PRAGMAs of a profile on one connection
+    settings = PROFILES[profile_name or DB_PROFILE]
+    for pragma, value in settings.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+def set_profile(profile_name, mmap_size=None, cache_size=None):
+    # Switch profile (and optionally tune mmap/cache); open pools are
+    # closed so the next connect_database() uses the new settings
+    global DB_PROFILE
+    if profile_name not in PROFILES:
+        raise ValueError(f"Unknown database profile: {profile_name}")
+    if mmap_size is not None:
+        PROFILES[profile_name]["mmap_size"] = int(mmap_size)
+    if cache_size is not None:
+        PROFILES[profile_name]["cache_size"] = int(cache_size)
+    DB_PROFILE = profile_name
+    close_all_pools()
+
+
+def active_profile():
+    # Report the active profile and what SQLite actually has set
+    conn = connect_database()
+    try:
+        current = {}
+        for pragma in ("journal_mode", "synchronous", "mmap_size",
+                       "cache_size", "temp_store", "busy_timeout"):
+            current[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+    finally:
+        conn.close()
+    return {"profile": DB_PROFILE, "settings": current}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(db_path=DB_PATH):
+    # One pool per database file, created on first use
+    db_path = Path(db_path)
+    key = str(db_path.resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # Make sure the DATA folder exists first
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            pool = ConnectionPool(
+                db_path,
+                max_size=POOL_SIZE,
+                timeout=POOL_TIMEOUT,
+                on_connect=apply_profile,
+            )
+            _pools[key] = pool
+        return pool
+
 
 def connect_database(db_path=DB_PATH):
-    # Connect to the SQLite database (creates it if missing)
-    # Make sure the DATA folder exists first
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    return sqlite3.connect(str(db_path))
+    # Check out a pooled connection to the SQLite database (creates it if missing)
+    # conn.close() gives the connection back to the pool
+    return _get_pool(db_path).acquire()
+
+
+def pooled_connection(db_path=DB_PATH):
+    # Same as connect_database() but as a context manager:
+    # with pooled_connection() as conn: ...
+    return _get_pool(db_path).connection()
+
+
+def pool_stats():
+    # Hit / wait / created counters for every open pool
+    with _pools_lock:
+        return [pool.snapshot() for pool in _pools.values()]
+
+
+def close_all_pools():
+    # Close every pooled connection (also runs at interpreter exit)
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+
+atexit.register(close_all_pools)
 
 
 def close_database(conn):
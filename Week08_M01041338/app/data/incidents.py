@@ -1,5 +1,6 @@
 import pandas as pd
 from app.data.db import connect_database
+from app.data.bulk import as_rows, write_many
 
 
 def insert_incident(date, incident_type, severity, status, description, reported_by=None):
@@ -94,3 +95,59 @@ def get_incidents_by_type():
     conn.close()
 
     return df
+
+
+# Column order for tuple records in insert_incidents()
+INCIDENT_FIELDS = ("date", "incident_type", "severity", "status", "description", "reported_by")
+
+
+def insert_incidents(records, chunk_size=None):
+    # Insert many incidents with executemany and return their new ids
+    # records: dicts or tuples in insert_incident() argument order
+    # chunk_size: commit every N incidents instead of once at the end
+    # Connect to the database
+    conn = connect_database()
+    try:
+        stats = write_many(conn, """
+            INSERT INTO cyber_incidents
+            (date, incident_type, severity, status, description, reported_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, as_rows(records, INCIDENT_FIELDS), chunk_size, return_ids=True)
+    finally:
+        # Close the database connection
+        conn.close()
+    return stats["ids"]
+
+
+def update_incidents_status(incident_ids, new_status, chunk_size=None):
+    # Set the same status on many incidents; returns how many were updated
+    # Connect to the database
+    conn = connect_database()
+    try:
+        stats = write_many(
+            conn,
+            "UPDATE cyber_incidents SET status = ? WHERE id = ?",
+            ((new_status, int(incident_id)) for incident_id in incident_ids),
+            chunk_size
+        )
+    finally:
+        # Close the database connection
+        conn.close()
+    return stats["affected"]
+
+
+def delete_incidents(incident_ids, chunk_size=None):
+    # Delete many incidents by ID; returns how many were deleted
+    # Connect to the database
+    conn = connect_database()
+    try:
+        stats = write_many(
+            conn,
+            "DELETE FROM cyber_incidents WHERE id = ?",
+            ((int(incident_id),) for incident_id in incident_ids),
+            chunk_size
+        )
+    finally:
+        # Close the database connection
+        conn.close()
+    return stats["affected"]
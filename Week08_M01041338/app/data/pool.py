@@ -0,0 +1,226 @@
+# Connection pool used behind connect_database()
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    # Raised when no connection becomes free before the checkout timeout
+    pass
+
+
+class PooledConnection(sqlite3.Connection):
+    # A normal sqlite3 connection whose close() hands it back to the pool,
+    # so existing "conn = connect_database() ... conn.close()" code keeps working
+    pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def close_for_real(self):
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    def __init__(self, database, max_size=8, timeout=30.0, row_factory=None,
+                 health_check_after=60.0, on_connect=None, factory=PooledConnection):
+        self.database = str(database)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.row_factory = row_factory
+        self.health_check_after = health_check_after
+        # Called once with every new connection (e.g. to set PRAGMAs)
+        self.on_connect = on_connect
+        # Connection class (a PooledConnection subclass, e.g. for tracing)
+        self.factory = factory
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []          # connections ready to be handed out
+        self._owners = {}        # checked-out connection -> owning thread
+        self._last_used = {}     # connection -> time it was last released
+        self._local = threading.local()
+        self._closed = False
+
+        # Counters shown by pool_stats()
+        self.stats = {
+            "created": 0,
+            "hits": 0,
+            "reentrant": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "discarded": 0,
+            "reclaimed": 0,
+        }
+
+    # --- internal helpers ---
+
+    def _new_connection(self):
+        # check_same_thread is off because a connection may serve different
+        # Streamlit script threads over its life (never two at the same time)
+        conn = sqlite3.connect(
+            self.database,
+            factory=self.factory,
+            check_same_thread=False,
+        )
+        conn.row_factory = self.row_factory
+        conn.pool = self
+        if self.on_connect is not None:
+            try:
+                self.on_connect(conn)
+            except Exception:
+                conn.close_for_real()
+                raise
+        self.stats["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        # Only ping connections that have been idle for a while
+        idle_for = time.monotonic() - self._last_used.get(conn, 0.0)
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(conn, None)
+        self.stats["discarded"] += 1
+        try:
+            conn.close_for_real()
+        except sqlite3.Error:
+            pass
+
+    def _reclaim_orphans(self):
+        # Take back connections whose thread died without calling close()
+        for conn, owner in list(self._owners.items()):
+            if not owner.is_alive():
+                del self._owners[conn]
+                self.stats["reclaimed"] += 1
+                self._discard(conn)
+
+    def _size(self):
+        return len(self._idle) + len(self._owners)
+
+    # --- public API ---
+
+    def acquire(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        # Same thread asking again while it still holds a connection:
+        # give it the same one back (e.g. a helper called inside main())
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            with self._cond:
+                self.stats["reentrant"] += 1
+            return held
+
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        wait_start = None
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    if not self._is_healthy(conn):
+                        self._discard(conn)
+                        continue
+                    self.stats["hits"] += 1
+                    break
+
+                if self._size() >= self.max_size:
+                    self._reclaim_orphans()
+
+                if self._size() < self.max_size:
+                    conn = self._new_connection()
+                    break
+
+                # Pool is full, wait for someone to release
+                if not waited:
+                    waited = True
+                    wait_start = time.monotonic()
+                    self.stats["waits"] += 1
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    self.stats["wait_seconds"] += time.monotonic() - wait_start
+                    raise PoolTimeout(
+                        f"No free database connection after {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+            if waited:
+                self.stats["wait_seconds"] += time.monotonic() - wait_start
+            self._owners[conn] = threading.current_thread()
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        # Nested checkout on the same thread: only the outermost close() releases
+        if getattr(self._local, "conn", None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+
+        with self._cond:
+            if conn not in self._owners:
+                # Already released (close() called twice)
+                return
+            del self._owners[conn]
+
+            # Match sqlite3 close(): anything not committed is thrown away
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.row_factory = self.row_factory
+            except sqlite3.Error:
+                self._discard(conn)
+                self._cond.notify()
+                return
+
+            if self._closed:
+                self._discard(conn)
+            else:
+                self._last_used[conn] = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        # with pool.connection() as conn: ...
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def snapshot(self):
+        with self._cond:
+            info = dict(self.stats)
+            info["database"] = self.database
+            info["max_size"] = self.max_size
+            info["idle"] = len(self._idle)
+            info["in_use"] = len(self._owners)
+            return info
+
+    def close_all(self):
+        # Close idle connections now; busy ones are closed when released
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._cond.notify_all()
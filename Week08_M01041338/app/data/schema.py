@@ -73,12 +73,68 @@ def create_it_tickets_table(conn):
     print(" IT tickets table created")
 
 
+# Secondary indexes for the columns the pages filter and group on.
+# Each entry is (index name, columns); composite indexes put the filter column
+# first so COUNT(*) ... GROUP BY queries can be answered from the index alone.
+INDEXES = {
+    "cyber_incidents": [
+        ("idx_incidents_type", ("incident_type",)),
+        ("idx_incidents_severity_status", ("severity", "status")),
+        ("idx_incidents_status", ("status",)),
+        ("idx_incidents_date_severity", ("date", "severity")),
+    ],
+    "it_tickets": [
+        ("idx_tickets_status_priority", ("status", "priority")),
+        ("idx_tickets_priority_status", ("priority", "status")),
+        ("idx_tickets_assigned_status", ("assigned_to", "status")),
+        ("idx_tickets_created_date", ("created_date",)),
+    ],
+    "datasets_metadata": [
+        ("idx_datasets_category", ("category",)),
+    ],
+}
+
+
+def _table_columns(conn, table_name):
+    # Column names of a table (empty set if the table does not exist)
+    rows = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+    return {row[1] for row in rows}
+
+
+def create_indexes(conn):
+    # Create the secondary indexes; indexes whose columns are missing are
+    # skipped (tables loaded straight from CSV can have a different shape)
+    cursor = conn.cursor()
+    created = []
+    for table_name, indexes in INDEXES.items():
+        columns = _table_columns(conn, table_name)
+        for index_name, index_columns in indexes:
+            if not set(index_columns) <= columns:
+                continue
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} "
+                f"ON {table_name} ({', '.join(index_columns)})"
+            )
+            created.append(index_name)
+    conn.commit()
+    print(f" {len(created)} indexes created")
+    return created
+
+
+def optimize_indexes(conn):
+    # Refresh the planner statistics so SQLite keeps picking the indexes
+    # (cheap; only re-analyzes tables that changed a lot)
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
 def create_all_tables(conn):
     # Create all database tables at once
     create_users_table(conn)
     create_cyber_incidents_table(conn)
     create_datasets_metadata_table(conn)
     create_it_tickets_table(conn)
+    create_indexes(conn)
 
 
 if __name__ == "__main__":
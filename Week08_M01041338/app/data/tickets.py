@@ -1,5 +1,6 @@
 import pandas as pd
 from app.data.db import connect_database
+from app.data.bulk import as_rows, write_many
 
 
 def insert_ticket(ticket_id, priority, status, category, subject, description, created_date, assigned_to=None):
@@ -48,3 +49,56 @@ def delete_ticket(ticket_id):
     )
     conn.commit()
     conn.close()
+
+
+# Column order for tuple records in insert_tickets()
+TICKET_FIELDS = (
+    "ticket_id", "priority", "status", "category", "subject",
+    "description", "created_date", "assigned_to"
+)
+
+
+def insert_tickets(records, chunk_size=None):
+    # Add many IT tickets in one go and return their new row ids
+    # records: dicts or tuples in insert_ticket() argument order
+    # chunk_size: commit every N tickets instead of once at the end
+    conn = connect_database()
+    try:
+        stats = write_many(conn, """
+            INSERT INTO it_tickets
+            (ticket_id, priority, status, category, subject, description, created_date, assigned_to)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, as_rows(records, TICKET_FIELDS), chunk_size, return_ids=True)
+    finally:
+        conn.close()
+    return stats["ids"]
+
+
+def update_tickets_status(ticket_ids, new_status, chunk_size=None):
+    # Set the same status on many tickets; returns how many were updated
+    conn = connect_database()
+    try:
+        stats = write_many(
+            conn,
+            "UPDATE it_tickets SET status = ? WHERE ticket_id = ?",
+            ((new_status, ticket_id) for ticket_id in ticket_ids),
+            chunk_size
+        )
+    finally:
+        conn.close()
+    return stats["affected"]
+
+
+def delete_tickets(ticket_ids, chunk_size=None):
+    # Remove many tickets; returns how many were deleted
+    conn = connect_database()
+    try:
+        stats = write_many(
+            conn,
+            "DELETE FROM it_tickets WHERE ticket_id = ?",
+            ((ticket_id,) for ticket_id in ticket_ids),
+            chunk_size
+        )
+    finally:
+        conn.close()
+    return stats["affected"]
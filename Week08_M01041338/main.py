@@ -2,39 +2,29 @@ from app.data.db import connect_database
 from app.data.schema import create_all_tables
 from app.services.user_service import register_user, login_user, migrate_users_from_file
 from app.data.incidents import insert_incident, get_all_incidents
-import pandas as pd
+from app.data.ingest import sync_csv
 
 
 def load_csv_data(conn):
-    # Load CSV files into the database using the same connection
-
-    try:
-        users_df = pd.read_csv('DATA/users.csv')
-        users_df.to_sql('users', conn, if_exists='replace', index=False)
-        print(f" Loaded {len(users_df)} users")
-    except Exception as e:
-        print(f"  Users: {e}")
-
-    try:
-        incidents_df = pd.read_csv('DATA/cyber_incidents.csv')
-        incidents_df.to_sql('cyber_incidents', conn, if_exists='replace', index=False)
-        print(f" Loaded {len(incidents_df)} cyber incidents")
-    except Exception as e:
-        print(f"  Incidents: {e}")
-
-    try:
-        tickets_df = pd.read_csv('DATA/it_tickets.csv')
-        tickets_df.to_sql('it_tickets', conn, if_exists='replace', index=False)
-        print(f" Loaded {len(tickets_df)} IT tickets")
-    except Exception as e:
-        print(f"  Tickets: {e}")
-
-    try:
-        datasets_df = pd.read_csv('DATA/datasets_metadata.csv')
-        datasets_df.to_sql('datasets_metadata', conn, if_exists='replace', index=False)
-        print(f" Loaded {len(datasets_df)} datasets")
-    except Exception as e:
-        print(f"  Datasets: {e}")
+    # Sync CSV files into the database using the same connection
+    # (the ingest ledger skips unchanged files and only loads new rows)
+    # (table, CSV file, what its rows are, title for messages)
+    csv_files = [
+        ('users', 'DATA/users.csv', 'users', 'Users'),
+        ('cyber_incidents', 'DATA/cyber_incidents.csv', 'cyber incidents', 'Incidents'),
+        ('it_tickets', 'DATA/it_tickets.csv', 'IT tickets', 'Tickets'),
+        ('datasets_metadata', 'DATA/datasets_metadata.csv', 'datasets', 'Datasets'),
+    ]
+
+    for table_name, csv_path, label, title in csv_files:
+        try:
+            stats = sync_csv(conn, csv_path, table_name)
+            if stats['action'] in ('skipped', 'touched'):
+                print(f" {title} unchanged, skipped")
+            else:
+                print(f" Loaded {stats['rows']} {label} ({stats['rows_per_sec']:,.0f} rows/sec)")
+        except Exception as e:
+            print(f"  {title}: {e}")
 
 
 def test_authentication():
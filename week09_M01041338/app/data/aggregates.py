@@ -0,0 +1,175 @@
+import pandas as pd
+from app.data.db import connect_database
+from app.data.cache import cached
+from app.data.rollups import ROLLUPS, rollup_counts
+from app.data.categories import decode_frame
+
+# Server-side aggregation for the dashboard and analytics pages.
+# Every chart gets its numbers from one GROUP BY query, so the result has one
+# row per category no matter how many rows the table holds.
+# Results are cached until the table is written (see app/data/cache.py).
+# Incident and ticket counts come from the trigger-maintained rollup tables
+# (app/data/rollups.py), so they cost O(categories) rather than O(rows).
+# Category labels are stored once, spelled one way (app/data/categories.py),
+# so KPIs match them exactly instead of normalising every label per render.
+
+# Tables/columns the pages may group on (names cannot be bound as SQL
+# parameters, so only these are allowed into the query text)
+GROUPABLE = {
+    "cyber_incidents": {"severity", "status", "incident_type", "reported_by", "date"},
+    "it_tickets": {"status", "priority", "category", "assigned_to"},
+    "datasets_metadata": {"category", "source", "owner", "format"},
+    "users": {"role"},
+    "users_data": {"role"},
+}
+
+
+def _check(table_name, column=None):
+    if table_name not in GROUPABLE:
+        raise ValueError(f"Unknown table: {table_name}")
+    if column is not None and column not in GROUPABLE[table_name]:
+        raise ValueError(f"Cannot group {table_name} by {column}")
+
+
+def _columns(conn, table_name):
+    rows = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+    return {row[1] for row in rows}
+
+
+def table_count(table_name):
+    # Number of rows in a table (0 if it does not exist yet)
+    _check(table_name)
+    return cached(table_name)(_table_count)(table_name)
+
+
+def _table_count(table_name):
+    if table_name in ROLLUPS:
+        return int(rollup_counts(table_name, [])["count"].sum())
+    conn = connect_database()
+    try:
+        if not _columns(conn, table_name):
+            return 0
+        return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def count_by(table_name, column):
+    # Breakdown of a table by one column: DataFrame [column, count], largest first
+    _check(table_name, column)
+    return cached(table_name)(_count_by)(table_name, column)
+
+
+def _count_by(table_name, column):
+    if column in ROLLUPS.get(table_name, {}).get("dimensions", ()):
+        return rollup_counts(table_name, [column])
+    conn = connect_database()
+    try:
+        if column not in _columns(conn, table_name):
+            return pd.DataFrame({column: [], "count": []})
+        return pd.read_sql_query(f"""
+            SELECT {column}, COUNT(*) AS count
+            FROM {table_name}
+            GROUP BY {column}
+            ORDER BY count DESC
+        """, conn)
+    finally:
+        conn.close()
+
+
+def latest_rows(table_name, limit=100):
+    # Newest `limit` rows of a table, for preview tables
+    _check(table_name)
+    return cached(table_name)(_latest_rows)(table_name, limit)
+
+
+def _latest_rows(table_name, limit):
+    conn = connect_database()
+    try:
+        return decode_frame(table_name, pd.read_sql_query(
+            f"SELECT * FROM {table_name} ORDER BY id DESC LIMIT ?",
+            conn,
+            params=(limit,)
+        ))
+    finally:
+        conn.close()
+
+
+# --- KPI cards (one query per card row) ---
+
+def _count_where(counts, column, values):
+    # Sum of counts whose `column` label is in `values`
+    return int(counts.loc[counts[column].isin(values), "count"].sum())
+
+
+@cached("cyber_incidents")
+def incident_kpis():
+    # Total / critical / high / resolved incidents over the whole table
+    counts = rollup_counts("cyber_incidents", ["severity", "status"])
+    return {
+        "total": int(counts["count"].sum()),
+        "critical": _count_where(counts, "severity", ["Critical"]),
+        "high": _count_where(counts, "severity", ["High"]),
+        "resolved": _count_where(counts, "status", ["Resolved"]),
+    }
+
+
+@cached("it_tickets")
+def ticket_kpis():
+    # Total / open / in progress / closed tickets over the whole table
+    counts = rollup_counts("it_tickets", ["status"])
+    return {
+        "total": int(counts["count"].sum()),
+        "open": _count_where(counts, "status", ["Open"]),
+        "in_progress": _count_where(counts, "status", ["In Progress"]),
+        "closed": _count_where(counts, "status", ["Closed"]),
+    }
+
+
+@cached("datasets_metadata")
+def dataset_kpis():
+    # Total datasets, distinct categories and distinct owners
+    conn = connect_database()
+    try:
+        owners = "COUNT(DISTINCT owner)" if "owner" in _columns(conn, "datasets_metadata") else "0"
+        row = conn.execute(f"""
+            SELECT COUNT(*), COUNT(DISTINCT category), {owners}
+            FROM datasets_metadata
+        """).fetchone()
+    finally:
+        conn.close()
+    return {"total": row[0], "categories": row[1], "owners": row[2]}
+
+
+# --- Chart breakdowns ---
+
+def incidents_by_severity():
+    return count_by("cyber_incidents", "severity")
+
+
+def incidents_by_status():
+    return count_by("cyber_incidents", "status")
+
+
+def incidents_by_type():
+    return count_by("cyber_incidents", "incident_type")
+
+
+def tickets_by_status():
+    return count_by("it_tickets", "status")
+
+
+def tickets_by_priority():
+    return count_by("it_tickets", "priority")
+
+
+def datasets_by_category():
+    return count_by("datasets_metadata", "category")
+
+
+def datasets_by_format():
+    return count_by("datasets_metadata", "format")
+
+
+def users_by_role(table_name="users_data"):
+    return count_by(table_name, "role")
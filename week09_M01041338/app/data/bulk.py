@@ -0,0 +1,64 @@
+# Batched writes
+#
+# Running one INSERT/UPDATE/DELETE per call costs a commit (and an fsync)
+# per row. write_many() sends rows through executemany() in batches inside
+# a single transaction, or commits every `chunk_size` rows so a long job
+# keeps its progress if it fails half way.
+
+from collections.abc import Mapping
+from itertools import islice
+
+# Rows per executemany() call
+BATCH_SIZE = 1000
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+def as_rows(records, fields, defaults=None):
+    # Records as dicts (by field name) or tuples (in field order) -> tuples
+    defaults = defaults or {}
+    for record in records:
+        if isinstance(record, Mapping):
+            yield tuple(record.get(f, defaults.get(f)) for f in fields)
+        elif isinstance(record, (str, bytes)):
+            raise TypeError(f"Record must be a dict or a tuple, got {record!r}")
+        else:
+            record = tuple(record)
+            missing = fields[len(record):]
+            yield record + tuple(defaults.get(f) for f in missing)
+
+
+def write_many(conn, sql, rows, chunk_size=None, return_ids=False):
+    # Run `sql` once per row of parameters
+    #   chunk_size=None: everything in one transaction (all or nothing)
+    #   chunk_size=N:    commit after every N rows (earlier chunks stay
+    #                    committed if a later one fails)
+    # Returns {"rows": rows sent, "affected": rows changed, "ids": [...]}
+    # ids (inserts only) relies on rowids being handed out one after the
+    # other, which holds because the write lock is held while a batch runs.
+    stats = {"rows": 0, "affected": 0, "ids": [] if return_ids else None}
+    size = chunk_size or BATCH_SIZE
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        for batch in _batches(rows, size):
+            cursor = conn.executemany(sql, batch)
+            stats["rows"] += len(batch)
+            stats["affected"] += max(cursor.rowcount, 0)
+            if return_ids:
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                stats["ids"].extend(range(last_id - len(batch) + 1, last_id + 1))
+            if chunk_size:
+                conn.commit()
+                conn.execute("BEGIN IMMEDIATE")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return stats
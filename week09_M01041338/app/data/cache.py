@@ -0,0 +1,108 @@
+# Read cache for the data layer
+#
+# Streamlit reruns the whole page script on every widget interaction, so the
+# same SELECTs run again and again although the data rarely changes. Readers
+# decorated with @cached(table) keep their result in a process-wide cache
+# shared by all sessions.
+#
+# Each table has a version counter. Writers call bump_version(table) after
+# they commit; a cached result is only served while the versions of the
+# tables it was read from are unchanged, so the first read after a write
+# goes back to the database.
+#
+# The counters live in this process only: writes made by another process
+# (e.g. a loader script) are picked up after clear_cache() or a restart.
+
+import functools
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import app.data.db as db
+
+# Results kept at most (least recently used are dropped first)
+MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_versions = {}           # table name -> write version
+_entries = OrderedDict()  # key -> (versions read, result)
+_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def table_version(table_name):
+    with _lock:
+        return _versions.get(table_name, 0)
+
+
+def bump_version(*table_names):
+    # Mark tables as written; cached results read from them go stale
+    with _lock:
+        for table_name in table_names:
+            _versions[table_name] = _versions.get(table_name, 0) + 1
+        stale = [key for key, (versions, _) in _entries.items()
+                 if any(name in dict(versions) for name in table_names)]
+        for key in stale:
+            del _entries[key]
+        _stats["invalidations"] += 1
+
+
+def _copy(result):
+    # Callers may modify what they get back; never hand out the cached object
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.copy()
+    if isinstance(result, list):
+        return list(result)
+    if isinstance(result, dict):
+        return {key: _copy(value) for key, value in result.items()}
+    return result
+
+
+def cached(*table_names):
+    # Cache a reader's result until one of `table_names` is written
+    def decorate(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, db.DATABASE_FILE, args, tuple(sorted(kwargs.items())))
+            with _lock:
+                # Versions are taken before the query runs, so a write that
+                # lands while we read makes this result stale straight away
+                versions = tuple((t, _versions.get(t, 0)) for t in table_names)
+                entry = _entries.get(key)
+                if entry is not None and entry[0] == versions:
+                    _entries.move_to_end(key)
+                    _stats["hits"] += 1
+                    return _copy(entry[1])
+                _stats["misses"] += 1
+
+            result = func(*args, **kwargs)
+
+            with _lock:
+                current = tuple((t, _versions.get(t, 0)) for t in table_names)
+                if current == versions:
+                    _entries[key] = (versions, result)
+                    _entries.move_to_end(key)
+                    while len(_entries) > MAX_ENTRIES:
+                        _entries.popitem(last=False)
+                        _stats["evictions"] += 1
+            return _copy(result)
+
+        return wrapper
+    return decorate
+
+
+def clear_cache():
+    with _lock:
+        _entries.clear()
+
+
+def cache_stats():
+    with _lock:
+        info = dict(_stats)
+        info["entries"] = len(_entries)
+        info["versions"] = dict(_versions)
+    lookups = info["hits"] + info["misses"]
+    info["hit_rate"] = info["hits"] / lookups if lookups else 0.0
+    return info
@@ -0,0 +1,180 @@
+# Integer-coded category columns
+#
+# severity, status, incident_type and priority hold a handful of distinct
+# values over millions of rows. Each gets a lookup table (like the statuses
+# table in week 8) and the data tables store the small integer id:
+#
+#   severities (id, severity_name)    cyber_incidents.severity -> id
+#
+# Writers pass labels; encoder() turns them into ids, spelling them the
+# way the lookup table already does ("low", "LOW" and "Low" are one value,
+# "in-progress" and "in_progress" are "In Progress"). Labels never seen
+# before are added. Readers turn ids back into pandas Categorical columns,
+# so DataFrames hold one small code per row instead of a string.
+
+import numpy as np
+import pandas as pd
+from app.data.db import connect_database
+from app.data.cache import cached, bump_version
+
+# Column -> (lookup table, label column, labels added up front, in display order)
+LOOKUPS = {
+    "severity": ("severities", "severity_name", ("Critical", "High", "Medium", "Low")),
+    "status": ("statuses", "status_name", (
+        "Open", "In Progress", "Investigating", "Contained", "Resolved", "Closed",
+    )),
+    "incident_type": ("incident_types", "type_name", (
+        "Phishing", "Malware", "DDoS", "Ransomware", "Data Breach",
+    )),
+    "priority": ("priorities", "priority_name", ("Critical", "High", "Medium", "Low")),
+}
+
+# Tables whose category columns are stored as lookup ids
+CODED_COLUMNS = {
+    "cyber_incidents": ("incident_type", "severity", "status"),
+    "it_tickets": ("priority", "status"),
+}
+
+
+def create_lookup_tables(conn):
+    # Create the lookup tables and add the standard labels (if missing)
+    for table, label_column, seeds in LOOKUPS.values():
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {label_column} TEXT UNIQUE NOT NULL
+            )
+        """)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {table} ({label_column}) VALUES (?)",
+            [(label,) for label in seeds]
+        )
+    conn.commit()
+    print(" Lookup tables created")
+
+
+def coded_columns(conn, table_name):
+    # Category columns of a table that hold lookup ids (declared INTEGER);
+    # a table not migrated yet still holds the labels themselves
+    declared = {
+        row[1]: (row[2] or "").upper()
+        for row in conn.execute(f"PRAGMA table_info({table_name})")
+    }
+    return [
+        column for column in CODED_COLUMNS.get(table_name, ())
+        if declared.get(column, "").startswith("INTEGER")
+    ]
+
+
+def _key(label):
+    # What two spellings of one label have in common
+    return " ".join(str(label).replace("_", " ").replace("-", " ").split()).lower()
+
+
+def canonical_label(label):
+    # How a label never seen before is stored: separators as spaces,
+    # all-lower/all-upper text in title case ("in_progress" -> "In Progress")
+    text = " ".join(str(label).replace("_", " ").replace("-", " ").split())
+    if text.islower() or text.isupper():
+        text = text.title()
+    return text
+
+
+def _read_labels(conn, column):
+    table, label_column, _ = LOOKUPS[column]
+    return conn.execute(f"SELECT id, {label_column} FROM {table} ORDER BY id").fetchall()
+
+
+def encoder(conn, column):
+    # Function label -> id for one column, adding labels the lookup lacks
+    # (inside the caller's transaction). None and "" stay None; ints are
+    # taken to be ids already.
+    table, label_column, _ = LOOKUPS[column]
+    ids = {_key(label): code for code, label in _read_labels(conn, column)}
+
+    def encode(value):
+        if value is None or isinstance(value, (int, np.integer)):
+            return value
+        key = _key(value)
+        if not key:
+            return None
+        code = ids.get(key)
+        if code is None:
+            label = canonical_label(value)
+            conn.execute(
+                f"INSERT OR IGNORE INTO {table} ({label_column}) VALUES (?)", (label,)
+            )
+            code = conn.execute(
+                f"SELECT id FROM {table} WHERE {label_column} = ?", (label,)
+            ).fetchone()[0]
+            ids[key] = code
+            bump_version(table)
+        return code
+
+    return encode
+
+
+def table_encoder(conn, table_name):
+    # Function (column, value) -> what to store in a table: the lookup id
+    # for its coded columns, the value itself for any other column
+    encoders = {column: encoder(conn, column) for column in coded_columns(conn, table_name)}
+
+    def encode(column, value):
+        return encoders[column](value) if column in encoders else value
+
+    return encode
+
+
+def codes_for(conn, column, labels):
+    # Ids of labels that exist (for filters: an unknown label matches nothing)
+    ids = {_key(label): code for code, label in _read_labels(conn, column)}
+    codes = []
+    for label in labels:
+        if isinstance(label, (int, np.integer)):
+            codes.append(int(label))
+        elif _key(label) in ids:
+            codes.append(ids[_key(label)])
+    return codes
+
+
+def _labels(column):
+    # [(id, label)] of one lookup table; cached until a label is added
+    return cached(LOOKUPS[column][0])(_fetch_labels)(column)
+
+
+def _fetch_labels(column):
+    conn = connect_database()
+    try:
+        return [tuple(row) for row in _read_labels(conn, column)]
+    finally:
+        conn.close()
+
+
+def decode(column, codes):
+    # Lookup ids -> pandas Categorical of labels (categories in id order)
+    codes = pd.to_numeric(pd.Series(codes), errors="coerce")
+    labels = _labels(column)
+    top = int(codes.max()) if codes.notna().any() else 0
+    if labels and top > labels[-1][0]:
+        # Added by another connection since the labels were cached
+        bump_version(LOOKUPS[column][0])
+        labels = _labels(column)
+    ids = [code for code, _ in labels]
+    positions = np.full(max(ids + [top]) + 1, -1, dtype=np.int64)
+    positions[ids] = np.arange(len(ids))
+    values = codes.fillna(0).astype(np.int64).clip(lower=0).to_numpy()
+    return pd.Categorical.from_codes(positions[values], [label for _, label in labels])
+
+
+def decode_frame(table_name, df):
+    # Replace the coded columns of a table's rows with Categorical labels
+    # (columns that still hold text, e.g. before migrating, are left alone)
+    for column in CODED_COLUMNS.get(table_name, ()):
+        if column not in df.columns or isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            present = df[column].dropna()
+            if len(present) and not isinstance(present.iloc[0], (int, np.integer)):
+                continue
+        df[column] = decode(column, df[column])
+    return df
@@ -1,17 +1,127 @@
+import atexit
 import sqlite3
 import os
+import threading
+from pathlib import Path
+from app.data.pool import ConnectionPool
+from app.data.tracing import connection_factory
 
 # Name of the SQLite database file
 DATABASE_FILE = "intelligence_platform.db"
 
+# Max open connections per database file
+POOL_SIZE = 8
+# Seconds to wait for a free connection before raising PoolTimeout
+POOL_TIMEOUT = 30.0
+
+# --- Performance profile ---
+# Named sets of PRAGMAs applied to every new connection.
+# "default" is plain SQLite (rollback journal, synchronous=FULL).
+# "performance" uses WAL so the CRUD writers no longer block dashboard readers.
+DB_PROFILE = os.environ.get("DB_PROFILE", "performance")
+MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))   # bytes
+CACHE_SIZE = int(os.environ.get("DB_CACHE_SIZE", -64000))             # negative = KiB
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+
+PROFILES = {
+    "default": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": MMAP_SIZE,
+        "cache_size": CACHE_SIZE,
+        "temp_store": "MEMORY",
+        "busy_timeout": BUSY_TIMEOUT_MS,
+    },
+}
+
+
+def apply_profile(conn, profile_name=None):
+    # Run the PRAGMAs of a profile on one connection
+    settings = PROFILES[profile_name or DB_PROFILE]
+    for pragma, value in settings.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+def set_profile(profile_name, mmap_size=None, cache_size=None):
+    # Switch profile (and optionally tune mmap/cache); open pools are
+    # closed so the next connect_database() uses the new settings
+    global DB_PROFILE
+    if profile_name not in PROFILES:
+        raise ValueError(f"Unknown database profile: {profile_name}")
+    if mmap_size is not None:
+        PROFILES[profile_name]["mmap_size"] = int(mmap_size)
+    if cache_size is not None:
+        PROFILES[profile_name]["cache_size"] = int(cache_size)
+    DB_PROFILE = profile_name
+    close_all_pools()
+
+
+def active_profile():
+    # Report the active profile and what SQLite actually has set
+    conn = connect_database()
+    try:
+        current = {}
+        for pragma in ("journal_mode", "synchronous", "mmap_size",
+                       "cache_size", "temp_store", "busy_timeout"):
+            current[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+    finally:
+        conn.close()
+    return {"profile": DB_PROFILE, "settings": current}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(db_file=None):
+    # One pool per database file, created on first use
+    # (DATABASE_FILE is read at call time so scripts can point it elsewhere)
+    db_file = db_file or DATABASE_FILE
+    key = str(Path(db_file).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # Show current working directory (helps with debugging paths)
+            print("Working directory:", os.getcwd())
+            # Rows come back as dictionaries instead of tuples
+            pool = ConnectionPool(
+                db_file,
+                max_size=POOL_SIZE,
+                timeout=POOL_TIMEOUT,
+                row_factory=sqlite3.Row,
+                on_connect=apply_profile,
+                # Times every query (app/data/tracing.py; DB_TRACE=0 turns it off)
+                factory=connection_factory(),
+            )
+            _pools[key] = pool
+        return pool
+
 def connect_database():
-    # Show current working directory (helps with debugging paths)
-    print("Working directory:", os.getcwd())
-    # Connect to the SQLite database
-    conn = sqlite3.connect(DATABASE_FILE)
-    # Return rows as dictionaries instead of tuples
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Check out a pooled connection (conn.close() gives it back to the pool)
+    return _get_pool().acquire()
+
+def pooled_connection():
+    # Same as connect_database() but as a context manager:
+    # with pooled_connection() as conn: ...
+    return _get_pool().connection()
+
+def pool_stats():
+    # Hit / wait / created counters for every open pool
+    with _pools_lock:
+        return [pool.snapshot() for pool in _pools.values()]
+
+def close_all_pools():
+    # Close every pooled connection (also runs at interpreter exit)
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+atexit.register(close_all_pools)
 
 def close_database(conn):
     # Safely close the database connection
@@ -1,43 +1,66 @@
-import pandas as pd
 from app.data.db import connect_database
+from app.data.bulk import as_rows, write_many
+from app.data.rollups import rollup_counts
+from app.data.cache import cached, bump_version
+from app.data.pagination import keyset_page, PAGE_SIZE
+from app.data.categories import table_encoder
+from app.data.snapshots import read_snapshot
 
 
 def insert_incident(date, incident_type, severity, status, description, reported_by=None):
     # Add a new incident into the cyber_incidents table
     conn = connect_database()
+    encode = table_encoder(conn, "cyber_incidents")
     cursor = conn.cursor()
     cursor.execute("""
         INSERT INTO cyber_incidents
         (date, incident_type, severity, status, description, reported_by)
         VALUES (?, ?, ?, ?, ?, ?)
-    """, (date, incident_type, severity, status, description, reported_by))
+    """, (date, encode("incident_type", incident_type), encode("severity", severity),
+          encode("status", status), description, reported_by))
     conn.commit()
     incident_id = cursor.lastrowid
     conn.close()
+    bump_version("cyber_incidents")
     return incident_id
 
 
 def get_all_incidents():
-    # Get all incidents from the database
+    # Get all incidents, newest first, from the columnar snapshot
+    # (rebuilt after each write, see app/data/snapshots.py)
+    return read_snapshot("cyber_incidents")
+
+
+@cached("cyber_incidents")
+def get_incidents_page(after=None, before=None, page_size=PAGE_SIZE, order_by="id", severities=None):
+    # Get one page of incidents, newest first, ordered by id or by (date, id)
+    # Pass the "last"/"first" cursor of the current page as after/before
+    if order_by not in ("id", "date"):
+        raise ValueError(f"Cannot order incidents by {order_by}")
     conn = connect_database()
-    df = pd.read_sql_query(
-        "SELECT * FROM cyber_incidents ORDER BY id DESC",
-        conn
-    )
-    conn.close()
-    return df
+    try:
+        return keyset_page(
+            conn, "cyber_incidents",
+            order_column="date" if order_by == "date" else None,
+            after=after, before=before, page_size=page_size,
+            filters={"severity": severities} if severities is not None else None
+        )
+    finally:
+        conn.close()
 
 
 def update_incident_status(incident_id, new_status):
     # Update the status of a specific incident
     conn = connect_database()
+    encode = table_encoder(conn, "cyber_incidents")
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE cyber_incidents SET status = ? WHERE id = ?",
-        (new_status, incident_id)
+        (encode("status", new_status), incident_id)
     )
     conn.commit()
     conn.close()
+    bump_version("cyber_incidents")
 
 
 def delete_incident(incident_id):
@@ -50,16 +73,70 @@ def delete_incident(incident_id):
     )
     conn.commit()
     conn.close()
+    bump_version("cyber_incidents")
 
 
+@cached("cyber_incidents")
 def get_incidents_by_type():
     # Get a count of incidents grouped by type
+    # Read from the trigger-maintained rollup, not the incidents table
+    return rollup_counts("cyber_incidents", ["incident_type"])
+
+
+# Column order for tuple records in insert_incidents()
+INCIDENT_FIELDS = ("date", "incident_type", "severity", "status", "description", "reported_by")
+
+
+def insert_incidents(records, chunk_size=None):
+    # Insert many incidents with executemany and return their new ids
+    # records: dicts or tuples in insert_incident() argument order
+    # chunk_size: commit every N incidents instead of once at the end
     conn = connect_database()
-    df = pd.read_sql_query("""
-        SELECT incident_type, COUNT(*) as count
-        FROM cyber_incidents
-        GROUP BY incident_type
-        ORDER BY count DESC
-    """, conn)
-    conn.close()
-    return df
+    try:
+        encode = table_encoder(conn, "cyber_incidents")
+        rows = (
+            tuple(encode(field, value) for field, value in zip(INCIDENT_FIELDS, row))
+            for row in as_rows(records, INCIDENT_FIELDS)
+        )
+        stats = write_many(conn, """
+            INSERT INTO cyber_incidents
+            (date, incident_type, severity, status, description, reported_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows, chunk_size, return_ids=True)
+    finally:
+        conn.close()
+        bump_version("cyber_incidents")
+    return stats["ids"]
+
+
+def update_incidents_status(incident_ids, new_status, chunk_size=None):
+    # Set the same status on many incidents; returns how many were updated
+    conn = connect_database()
+    try:
+        new_status = table_encoder(conn, "cyber_incidents")("status", new_status)
+        stats = write_many(
+            conn,
+            "UPDATE cyber_incidents SET status = ? WHERE id = ?",
+            ((new_status, int(incident_id)) for incident_id in incident_ids),
+            chunk_size
+        )
+    finally:
+        conn.close()
+        bump_version("cyber_incidents")
+    return stats["affected"]
+
+
+def delete_incidents(incident_ids, chunk_size=None):
+    # Delete many incidents by ID; returns how many were deleted
+    conn = connect_database()
+    try:
+        stats = write_many(
+            conn,
+            "DELETE FROM cyber_incidents WHERE id = ?",
+            ((int(incident_id),) for incident_id in incident_ids),
+            chunk_size
+        )
+    finally:
+        conn.close()
+        bump_version("cyber_incidents")
+    return stats["affected"]
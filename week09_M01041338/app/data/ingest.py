@@ -0,0 +1,354 @@
+# Streaming CSV -> SQLite loader
+#
+# Reads a CSV a fixed number of rows at a time with the csv module and
+# writes each chunk with executemany(), all inside one transaction.
+# Memory use depends on CHUNK_SIZE, not on the size of the file.
+#
+# sync_csv() adds an ingest ledger on top: unchanged files are skipped from
+# their size/mtime alone, and files that only grew are loaded from the byte
+# offset where the previous load stopped.
+
+import csv
+import hashlib
+import io
+import os
+import time
+from itertools import islice
+from pathlib import Path
+
+from app.data.categories import coded_columns, encoder
+
+# Rows per executemany() call
+CHUNK_SIZE = 5000
+
+# How rows are written:
+#   append  - plain INSERT
+#   upsert  - insert new ids, update rows whose id already exists
+#   replace - empty the table first (the table itself is kept)
+MODES = ("append", "upsert", "replace")
+
+# CSV column -> table column, for exports whose headers differ from the schema
+COLUMN_ALIASES = {
+    "it_tickets": {"title": "subject"},
+    "datasets_metadata": {"name": "dataset_name"},
+}
+
+# Columns the schema requires but the CSV exports do not have,
+# filled from the other values in the row
+DERIVED_COLUMNS = {
+    "it_tickets": {"ticket_id": lambda row: f"TKT-{int(row['id']):05d}"},
+}
+
+
+def _table_columns(conn, table_name):
+    rows = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+    return [row[1] for row in rows]
+
+
+def _guess_type(values):
+    # Pick a column type from the first chunk of values
+    seen = [v for v in values if v is not None]
+    if not seen:
+        return "TEXT"
+    try:
+        for v in seen:
+            int(v)
+        return "INTEGER"
+    except ValueError:
+        pass
+    try:
+        for v in seen:
+            float(v)
+        return "REAL"
+    except ValueError:
+        return "TEXT"
+
+
+def _create_table(conn, table_name, columns, first_chunk):
+    # New table shaped like the CSV; "id" becomes the primary key
+    column_defs = []
+    for i, column in enumerate(columns):
+        if column == "id":
+            column_defs.append('"id" INTEGER PRIMARY KEY')
+        else:
+            column_type = _guess_type(row[i] for row in first_chunk)
+            column_defs.append(f'"{column}" {column_type}')
+    conn.execute(f'CREATE TABLE "{table_name}" ({", ".join(column_defs)})')
+
+
+def _has_unique_key(conn, table_name, key):
+    # True if `key` is the primary key or has a single-column unique index
+    for row in conn.execute(f"PRAGMA table_info({table_name})"):
+        if row[1] == key and row[5] == 1:
+            return True
+    for index in conn.execute(f"PRAGMA index_list({table_name})").fetchall():
+        if index[2]:
+            index_columns = conn.execute(f'PRAGMA index_info("{index[1]}")').fetchall()
+            if [c[2] for c in index_columns] == [key]:
+                return True
+    return False
+
+
+def _insert_sql(table_name, columns, mode):
+    names = ", ".join(f'"{c}"' for c in columns)
+    marks = ", ".join("?" for _ in columns)
+    sql = f'INSERT INTO "{table_name}" ({names}) VALUES ({marks})'
+    if mode == "upsert":
+        others = [c for c in columns if c != "id"]
+        if others:
+            updates = ", ".join(f'"{c}" = excluded."{c}"' for c in others)
+            current = ", ".join(f'"{c}"' for c in others)
+            incoming = ", ".join(f'excluded."{c}"' for c in others)
+            # Rows that did not change are left alone (no write, no index churn)
+            sql += (
+                f' ON CONFLICT("id") DO UPDATE SET {updates}'
+                f' WHERE ({current}) IS NOT ({incoming})'
+            )
+        else:
+            sql += ' ON CONFLICT("id") DO NOTHING'
+    return sql
+
+
+def _read_rows(reader, width):
+    # Empty CSV fields become NULL; short rows are padded
+    for row in reader:
+        if not row:
+            continue
+        row = [value if value != "" else None for value in row[:width]]
+        if len(row) < width:
+            row.extend([None] * (width - len(row)))
+        yield row
+
+
+def _read_header(csv_path, encoding):
+    with open(csv_path, newline="", encoding=encoding) as f:
+        return next(csv.reader(f), None)
+
+
+def ingest_csv(conn, csv_path, table_name, mode="upsert", chunk_size=CHUNK_SIZE,
+               encoding="utf-8", start_offset=0, min_id=None):
+    # Load one CSV file into a table and return load statistics
+    # start_offset: byte offset to start reading rows from (0 = after the header)
+    # min_id: skip rows whose id is not above this watermark
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+
+    csv_path = Path(csv_path)
+    started = time.perf_counter()
+    rows_written = 0
+    chunks = 0
+    max_id = None
+
+    header = _read_header(csv_path, encoding)
+    if not header:
+        raise ValueError(f"{csv_path} is empty")
+
+    with open(csv_path, "rb") as raw:
+        f = io.TextIOWrapper(raw, encoding=encoding, newline="")
+        if start_offset:
+            raw.seek(start_offset)
+            reader = csv.reader(f)
+        else:
+            reader = csv.reader(f)
+            next(reader, None)
+
+        aliases = COLUMN_ALIASES.get(table_name, {})
+        columns = [aliases.get(name.strip(), name.strip()) for name in header]
+        rows = _read_rows(reader, len(header))
+        id_index = columns.index("id") if "id" in columns else None
+        if min_id is not None and id_index is not None:
+            rows = (row for row in rows if row[id_index] is not None and int(row[id_index]) > min_id)
+        first_chunk = list(islice(rows, chunk_size))
+
+        try:
+            # Explicit BEGIN so table changes and all chunks commit together
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+
+            existing = _table_columns(conn, table_name)
+            if not existing:
+                _create_table(conn, table_name, columns, first_chunk)
+                existing = list(columns)
+            else:
+                # Keep the table, just add columns the CSV brings along
+                for column in columns:
+                    if column not in existing:
+                        conn.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{column}"')
+                        existing.append(column)
+
+            # Schema columns we can derive from the row (e.g. ticket_id)
+            derived = {
+                name: make for name, make in DERIVED_COLUMNS.get(table_name, {}).items()
+                if name in existing and name not in columns
+            }
+            all_columns = columns + list(derived)
+
+            # Category labels -> lookup ids, for columns that store ids
+            encoders = {
+                columns.index(column): encoder(conn, column)
+                for column in coded_columns(conn, table_name) if column in columns
+            }
+
+            if mode == "upsert":
+                if "id" not in columns:
+                    raise ValueError(f"upsert needs an 'id' column in {csv_path.name}")
+                if not _has_unique_key(conn, table_name, "id"):
+                    conn.execute(
+                        f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{table_name}_id" '
+                        f'ON "{table_name}" ("id")'
+                    )
+            elif mode == "replace":
+                conn.execute(f'DELETE FROM "{table_name}"')
+
+            sql = _insert_sql(table_name, all_columns, mode)
+            chunk = first_chunk
+            while chunk:
+                if id_index is not None:
+                    ids = [int(row[id_index]) for row in chunk if row[id_index] is not None]
+                    if ids:
+                        max_id = max(ids) if max_id is None else max(max_id, *ids)
+                if encoders:
+                    for row in chunk:
+                        for i, encode in encoders.items():
+                            row[i] = encode(row[i])
+                if derived:
+                    for row in chunk:
+                        values = dict(zip(columns, row))
+                        row.extend(make(values) for make in derived.values())
+                conn.executemany(sql, chunk)
+                rows_written += len(chunk)
+                chunks += 1
+                chunk = list(islice(rows, chunk_size))
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    seconds = time.perf_counter() - started
+    return {
+        "table": table_name,
+        "file": str(csv_path),
+        "mode": mode,
+        "rows": rows_written,
+        "chunks": chunks,
+        "max_id": max_id,
+        "seconds": seconds,
+        "rows_per_sec": rows_written / seconds if seconds > 0 else 0.0,
+    }
+
+
+# --- Ingest ledger ---
+
+def create_ingest_ledger_table(conn):
+    # One row per source file: what it looked like when it was last loaded
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_ledger (
+            source_path TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            max_id INTEGER,
+            rows_loaded INTEGER NOT NULL DEFAULT 0,
+            loaded_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (source_path, table_name)
+        )
+    """)
+    conn.commit()
+
+
+def _file_hash(path, length=None, block_size=1024 * 1024):
+    # sha256 of the whole file, or of its first `length` bytes
+    digest = hashlib.sha256()
+    remaining = length
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            size = block_size if remaining is None else min(block_size, remaining)
+            block = f.read(size)
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _ends_with_newline(path, size):
+    # A load can only resume at an offset that ends a complete line
+    if size == 0:
+        return False
+    with open(path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+
+def sync_csv(conn, csv_path, table_name, chunk_size=CHUNK_SIZE, encoding="utf-8"):
+    # Bring a table up to date with its CSV, doing as little work as possible:
+    #   unchanged size + mtime -> skip without opening the file
+    #   same content hash      -> skip (file was only touched)
+    #   file only grew         -> load just the new bytes, above the id watermark
+    #   anything else          -> upsert every row (unchanged rows are not rewritten)
+    create_ingest_ledger_table(conn)
+    csv_path = Path(csv_path)
+    source = str(csv_path.resolve())
+    stat = os.stat(csv_path)
+
+    previous = conn.execute(
+        "SELECT file_size, mtime_ns, content_hash, max_id, rows_loaded "
+        "FROM ingest_ledger WHERE source_path = ? AND table_name = ?",
+        (source, table_name)
+    ).fetchone()
+
+    if previous is not None:
+        old_size, old_mtime, old_hash, old_max_id, old_rows = previous
+        if old_size == stat.st_size and old_mtime == stat.st_mtime_ns:
+            return {"table": table_name, "file": str(csv_path), "action": "skipped", "rows": 0}
+
+    content_hash = _file_hash(csv_path)
+    action = "full"
+    start_offset = 0
+    min_id = None
+    max_id = None
+    rows_loaded = 0
+
+    if previous is not None:
+        if content_hash == old_hash:
+            action = "touched"
+        elif (
+            stat.st_size > old_size
+            and _ends_with_newline(csv_path, old_size)
+            and _file_hash(csv_path, old_size) == old_hash
+        ):
+            # Old file is an exact prefix of the new one: only rows were appended
+            action = "appended"
+            start_offset = old_size
+            min_id = old_max_id
+        max_id = old_max_id
+        rows_loaded = old_rows
+
+    stats = {"table": table_name, "file": str(csv_path), "action": action, "rows": 0}
+    if action != "touched":
+        stats = ingest_csv(
+            conn, csv_path, table_name, mode="upsert", chunk_size=chunk_size,
+            encoding=encoding, start_offset=start_offset, min_id=min_id,
+        )
+        stats["action"] = action
+        rows_loaded = rows_loaded + stats["rows"] if action == "appended" else stats["rows"]
+        if stats["max_id"] is not None:
+            max_id = stats["max_id"] if max_id is None or action == "full" else max(max_id, stats["max_id"])
+
+    conn.execute("""
+        INSERT INTO ingest_ledger
+        (source_path, table_name, file_size, mtime_ns, content_hash, max_id, rows_loaded, loaded_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(source_path, table_name) DO UPDATE SET
+            file_size = excluded.file_size,
+            mtime_ns = excluded.mtime_ns,
+            content_hash = excluded.content_hash,
+            max_id = excluded.max_id,
+            rows_loaded = excluded.rows_loaded,
+            loaded_at = excluded.loaded_at
+    """, (source, table_name, stat.st_size, stat.st_mtime_ns, content_hash, max_id, rows_loaded))
+    conn.commit()
+    return stats
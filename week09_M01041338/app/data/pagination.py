@@ -0,0 +1,133 @@
+# Keyset (cursor) pagination
+#
+# Pages are read newest first, ordered by id or by (order column, id).
+# Instead of OFFSET, each page starts from the key of the last row the user
+# saw, so the query is an index range read and costs the same on page 1 and
+# page 10,000, whatever the table size.
+#
+# A cursor is the key of a row: (id,) when ordering by id, or
+# (value, id) when ordering by a column. Rows whose order column is NULL
+# come after all other rows.
+
+import pandas as pd
+from app.data.categories import coded_columns, codes_for, decode_frame
+
+# Rows per page unless the caller asks for something else
+PAGE_SIZE = 50
+
+
+def _segments(order_column, cursor, backward):
+    # (condition, params, descending) for each index range to read, in order
+    if order_column is None:
+        if cursor is None:
+            yield "", [], True
+        elif backward:
+            yield '"id" > ?', [cursor[-1]], False
+        else:
+            yield '"id" < ?', [cursor[-1]], True
+        return
+
+    column = f'"{order_column}"'
+    if not backward:
+        if cursor is None:
+            yield f"{column} IS NOT NULL", [], True
+        elif cursor[0] is not None:
+            # Row value comparison: one index range, no OR
+            yield f'({column}, "id") < (?, ?)', list(cursor), True
+        if cursor is None or cursor[0] is not None:
+            yield f"{column} IS NULL", [], True
+        else:
+            yield f'{column} IS NULL AND "id" < ?', [cursor[1]], True
+    else:
+        if cursor[0] is None:
+            yield f'{column} IS NULL AND "id" > ?', [cursor[1]], False
+            yield f"{column} IS NOT NULL", [], False
+        else:
+            yield f'({column}, "id") > (?, ?)', list(cursor), False
+
+
+def _fetch(conn, table_name, order_column, condition, params, filters, descending, limit):
+    clauses = [condition] if condition else []
+    params = list(params)
+    for column, values in (filters or {}).items():
+        values = list(values)
+        if not values:
+            clauses.append("0")
+            continue
+        clauses.append(f'"{column}" IN ({", ".join("?" for _ in values)})')
+        params.extend(values)
+
+    direction = "DESC" if descending else "ASC"
+    order = f'"id" {direction}'
+    if order_column is not None:
+        order = f'"{order_column}" {direction}, {order}'
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    cursor = conn.execute(
+        f'SELECT * FROM "{table_name}" {where} ORDER BY {order} LIMIT ?',
+        params + [limit]
+    )
+    columns = [d[0] for d in cursor.description]
+    return columns, [tuple(row) for row in cursor.fetchall()]
+
+
+def keyset_page(conn, table_name, order_column=None, after=None, before=None,
+                page_size=PAGE_SIZE, filters=None):
+    # One page of a table, newest first
+    #   after:   cursor of the last row of the current page -> next page
+    #   before:  cursor of the first row of the current page -> previous page
+    #   filters: {column: [allowed values]}
+    # Returns {"rows": DataFrame, "first": cursor, "last": cursor,
+    #          "has_previous": bool, "has_next": bool}
+    if after is not None and before is not None:
+        raise ValueError("Pass either after or before, not both")
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+
+    if filters:
+        # Category filters are given as labels; those columns hold lookup ids
+        coded = coded_columns(conn, table_name)
+        filters = {
+            column: codes_for(conn, column, values) if column in coded else values
+            for column, values in filters.items()
+        }
+
+    backward = before is not None
+    cursor = before if backward else after
+    wanted = page_size + 1      # one extra row tells us whether there is more
+    columns = None
+    rows = []
+    for condition, params, descending in _segments(order_column, cursor, backward):
+        segment_columns, segment_rows = _fetch(
+            conn, table_name, order_column, condition, params, filters,
+            descending, wanted - len(rows)
+        )
+        columns = columns or segment_columns
+        rows.extend(segment_rows)
+        if len(rows) >= wanted:
+            break
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if backward:
+        if not more:
+            # Walked back to the start: show a full first page instead
+            return keyset_page(conn, table_name, order_column, page_size=page_size, filters=filters)
+        rows.reverse()
+
+    id_index = columns.index("id")
+    order_index = columns.index(order_column) if order_column is not None else None
+
+    def key(row):
+        if order_index is None:
+            return (row[id_index],)
+        return (row[order_index], row[id_index])
+
+    return {
+        "rows": decode_frame(table_name, pd.DataFrame(rows, columns=columns)),
+        "first": key(rows[0]) if rows else None,
+        "last": key(rows[-1]) if rows else None,
+        "has_previous": more if backward else after is not None,
+        "has_next": True if backward else more,
+    }
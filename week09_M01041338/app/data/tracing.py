@@ -0,0 +1,339 @@
+# Query tracing and the slow-query log
+#
+# Connections handed out by connect_database() are TracedConnections: every
+# statement run through them is timed from execute() until its last row has
+# been fetched (or the cursor is closed or reused), and recorded as
+#
+#   SQL text, fingerprint, seconds, rows returned, calling function
+#
+# The fingerprint is the statement with its literals replaced by ? and
+# IN (...) / VALUES lists collapsed, so "WHERE id = 3" and "WHERE id = 7"
+# count as one query. Per fingerprint we keep call counts, totals and the
+# last WINDOW durations (for p50/p95/p99); the Settings page shows the
+# queries that took the most time in total.
+#
+# Statements slower than SLOW_QUERY_MS are also appended to SLOW_QUERY_LOG
+# as JSON lines. Parameters are never logged (they can be password hashes).
+#
+# Settings (environment):
+#   DB_TRACE=0           turn tracing off (plain pooled connections)
+#   DB_SLOW_QUERY_MS     slow-query threshold in milliseconds (default 100)
+#   DB_SLOW_QUERY_LOG    slow-query log file (default slow_queries.log, "" = none)
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache
+
+from app.data.pool import PooledConnection
+
+TRACE_QUERIES = os.environ.get("DB_TRACE", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG = os.environ.get("DB_SLOW_QUERY_LOG", "slow_queries.log")
+
+# Durations kept per fingerprint for the percentiles
+WINDOW = 500
+# Slow queries kept in memory for the Settings page
+RECENT_SLOW = 100
+# Characters of SQL kept in the log and the in-memory records
+SQL_CHARS = 2000
+
+_stats = {}               # fingerprint -> _QueryStats
+_slow = deque(maxlen=RECENT_SLOW)
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+class _QueryStats:
+    __slots__ = ("calls", "seconds", "max_seconds", "rows", "durations", "callers", "sql")
+
+    def __init__(self, sql):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.durations = deque(maxlen=WINDOW)
+        self.callers = Counter()
+        self.sql = sql
+
+
+# --- fingerprints ---
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.])")
+_NAMED = re.compile(r"[:@$]\w+")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:\s*,\s*\(\?(?:, \?)*\))+")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    # The shape of a statement: literals and placeholders as ?, lists of
+    # them as (...), whitespace and comments dropped
+    text = _COMMENTS.sub(" ", sql)
+    text = _STRINGS.sub("?", text)
+    text = _NUMBERS.sub("?", text)
+    text = _NAMED.sub("?", text)
+    text = _SPACES.sub(" ", text).strip().rstrip(";").strip()
+    text = _LISTS.sub("(...)", text)
+    text = _ROWS.sub(r"\1, ...", text)
+    return text
+
+
+# --- who ran it ---
+
+_SKIP_FILES = (
+    os.path.dirname(sqlite3.__file__),
+    os.path.join("site-packages", ""),
+    os.path.join("dist-packages", ""),
+)
+_SKIP_MODULES = ("app.data.tracing", "app.data.pool", "contextlib")
+
+
+@lru_cache(maxsize=1024)
+def _module_name(module, filename):
+    # Name to report for frames of this module, or None to look further out
+    if module in _SKIP_MODULES or any(part in filename for part in _SKIP_FILES):
+        return None
+    if module == "__main__":
+        return os.path.splitext(os.path.basename(filename))[0]
+    return module
+
+
+def _caller():
+    # "module.function:line" of the first frame outside this module, the
+    # pool, the standard library's sqlite3 and third-party code (pandas)
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        module = _module_name(frame.f_globals.get("__name__", ""), code.co_filename)
+        if module is not None:
+            return f"{module}.{code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+
+# --- recording ---
+
+def record_query(sql, seconds, rows, caller):
+    # Add one finished statement to the statistics (and the slow-query log)
+    key = fingerprint(sql)
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = _QueryStats(sql[:SQL_CHARS])
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.rows += rows
+        stats.durations.append(seconds)
+        stats.callers[caller] += 1
+        if seconds > stats.max_seconds:
+            stats.max_seconds = seconds
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "ms": round(seconds * 1000, 1),
+            "rows": rows,
+            "caller": caller,
+            "fingerprint": key,
+            "sql": sql[:SQL_CHARS],
+        }
+        with _lock:
+            _slow.append(entry)
+        _write_slow(entry)
+
+
+def _write_slow(entry):
+    if not SLOW_QUERY_LOG:
+        return
+    line = json.dumps(entry) + "\n"
+    with _log_lock:
+        try:
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            pass              # a read-only folder must not break the query
+
+
+class _Pending:
+    # A statement whose rows are still being fetched
+    __slots__ = ("sql", "caller", "seconds", "rows")
+
+    def __init__(self, sql, caller, seconds):
+        self.sql = sql
+        self.caller = caller
+        self.seconds = seconds
+        self.rows = 0
+
+
+class TracedCursor(sqlite3.Cursor):
+    # Times each statement, including the fetches that read its rows
+    _pending = None
+
+    def _finish(self):
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            record_query(pending.sql, pending.seconds, pending.rows, pending.caller)
+
+    def _run(self, method, sql, args):
+        self._finish()
+        caller = _caller()
+        started = time.perf_counter()
+        try:
+            method(self, sql, *args)
+        finally:
+            pending = _Pending(sql, caller, time.perf_counter() - started)
+            if self.description is None:
+                # No result rows (INSERT, UPDATE, DDL...): done already
+                pending.rows = max(self.rowcount, 0)
+                record_query(pending.sql, pending.seconds, pending.rows, pending.caller)
+            else:
+                self._pending = pending
+        return self
+
+    def execute(self, sql, *args):
+        return self._run(sqlite3.Cursor.execute, sql, args)
+
+    def executemany(self, sql, *args):
+        return self._run(sqlite3.Cursor.executemany, sql, args)
+
+    def executescript(self, sql, *args):
+        return self._run(sqlite3.Cursor.executescript, sql, args)
+
+    def fetchone(self):
+        pending = self._pending
+        if pending is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        pending.seconds += time.perf_counter() - started
+        if row is None:
+            self._finish()
+        else:
+            pending.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        pending = self._pending
+        size = self.arraysize if size is None else size
+        if pending is None:
+            return super().fetchmany(size)
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        pending.seconds += time.perf_counter() - started
+        pending.rows += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        pending = self._pending
+        if pending is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        pending.seconds += time.perf_counter() - started
+        pending.rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        pending = self._pending
+        if pending is None:
+            return super().__next__()
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            pending.seconds += time.perf_counter() - started
+            self._finish()
+            raise
+        pending.seconds += time.perf_counter() - started
+        pending.rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # A cursor dropped before its last row (e.g. fetchone() on a lookup)
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class TracedConnection(PooledConnection):
+    # Pooled connection whose cursors are TracedCursors. conn.execute() and
+    # friends are routed through cursor() (sqlite3 would bypass it).
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+    def executescript(self, sql):
+        return self.cursor().executescript(sql)
+
+
+def connection_factory():
+    # Connection class for the pool: traced unless DB_TRACE=0
+    return TracedConnection if TRACE_QUERIES else PooledConnection
+
+
+# --- reading the statistics ---
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def query_stats(limit=20):
+    # Queries that took the most time in total, as a list of dicts
+    # (times in milliseconds; percentiles over the last WINDOW calls)
+    with _lock:
+        rows = []
+        for key, stats in _stats.items():
+            ordered = sorted(stats.durations)
+            rows.append({
+                "fingerprint": key,
+                "calls": stats.calls,
+                "total_ms": stats.seconds * 1000,
+                "mean_ms": stats.seconds * 1000 / stats.calls,
+                "p50_ms": _percentile(ordered, 0.50) * 1000,
+                "p95_ms": _percentile(ordered, 0.95) * 1000,
+                "p99_ms": _percentile(ordered, 0.99) * 1000,
+                "max_ms": stats.max_seconds * 1000,
+                "rows": stats.rows,
+                "top_caller": stats.callers.most_common(1)[0][0],
+                "callers": len(stats.callers),
+            })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def slow_queries(limit=RECENT_SLOW):
+    # The most recent slow queries, newest first
+    with _lock:
+        return list(reversed(_slow))[:limit]
+
+
+def reset_query_stats():
+    # Forget all statistics (the slow-query log file is kept)
+    with _lock:
+        _stats.clear()
+        _slow.clear()
@@ -0,0 +1,240 @@
+# Page render profiler
+#
+# Every widget click reruns the whole page script, so how long a click
+# takes is the sum of everything the page does top to bottom. Pages mark
+# their parts:
+#
+#   start_page("Dashboard")                 # after the login check
+#   with section("incident KPIs", "fetch"):
+#       kpis = incident_kpis()
+#   with section("severity chart", "figure"):
+#       fig = px.bar(...)
+#       st.plotly_chart(fig)
+#   ...
+#   render_diagnostics()                    # last line of the page
+#
+# Kinds:
+#   fetch      reading from the data layer
+#   aggregate  pandas work done in the page
+#   figure     building a Plotly figure and sending it to the browser
+#   table      st.dataframe (the frame is serialised to Arrow)
+#   assistant  the OpenAI assistant panel
+# Time spent outside any section (widgets, layout, text) is "other".
+#
+# Timings of every session are added up per (page, section) in this
+# process. Admins see them, next to the last rerun's, in a collapsed
+# Diagnostics expander at the bottom of the sidebar, which can also
+# capture a cProfile of one rerun.
+#
+# PAGE_PROFILE=0 (environment) turns it off; sections then do nothing.
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import streamlit as st
+
+PAGE_PROFILE = os.environ.get("PAGE_PROFILE", "1") != "0"
+
+# Durations kept per section for the percentiles
+WINDOW = 200
+# Functions listed from a cProfile capture
+PROFILE_LINES = 30
+
+_totals = {}              # (page, section, kind) -> _SectionStats
+_lock = threading.Lock()
+_local = threading.local()            # rerun in progress on this script thread
+_capturing = None                     # thread running the one cProfile capture
+
+
+class _SectionStats:
+    __slots__ = ("calls", "seconds", "durations")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.durations = deque(maxlen=WINDOW)
+
+
+class _Rerun:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.sections = []    # (name, kind, seconds, depth)
+        self.depth = 0
+        self.profiler = None
+
+
+def _claim_capture():
+    # One cProfile capture at a time (a thread that died mid-rerun, e.g.
+    # after st.rerun(), does not count)
+    global _capturing
+    with _lock:
+        if _capturing is not None and _capturing.is_alive():
+            return False
+        _capturing = threading.current_thread()
+        return True
+
+
+def _end_capture(run):
+    global _capturing
+    run.profiler.disable()
+    with _lock:
+        _capturing = None
+
+
+def start_page(page):
+    # Start timing a rerun of `page` (and profile it if that was asked for)
+    if not PAGE_PROFILE:
+        return
+    stale = getattr(_local, "run", None)
+    if stale is not None and stale.profiler is not None:
+        # The last rerun on this thread stopped early (st.stop(), st.rerun())
+        _end_capture(stale)
+    run = _Rerun(page)
+    if st.session_state.pop("profile_next_rerun", None) == page and _claim_capture():
+        run.profiler = cProfile.Profile()
+        run.profiler.enable()
+    _local.run = run
+
+
+@contextmanager
+def section(name, kind="fetch"):
+    # Time the block as one named part of the current rerun
+    run = getattr(_local, "run", None)
+    if run is None:
+        yield
+        return
+    started = time.perf_counter()
+    run.depth += 1
+    try:
+        yield
+    finally:
+        run.depth -= 1
+        run.sections.append((name, kind, time.perf_counter() - started, run.depth))
+
+
+def _add(key, seconds):
+    stats = _totals.get(key)
+    if stats is None:
+        stats = _totals[key] = _SectionStats()
+    stats.calls += 1
+    stats.seconds += seconds
+    stats.durations.append(seconds)
+
+
+def finish_page():
+    # End the rerun started by start_page() and add it to the totals.
+    # Returns the rerun (None if none was started).
+    run = getattr(_local, "run", None)
+    _local.run = None
+    if run is None:
+        return None
+    run.seconds = time.perf_counter() - run.started
+
+    if run.profiler is not None:
+        _end_capture(run)
+        out = io.StringIO()
+        stats = pstats.Stats(run.profiler, stream=out).strip_dirs()
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+        st.session_state.page_profile = {"page": run.page, "text": out.getvalue()}
+        run.profiler = None
+
+    timed = sum(seconds for _, _, seconds, depth in run.sections if depth == 0)
+    with _lock:
+        for name, kind, seconds, _ in run.sections:
+            _add((run.page, name, kind), seconds)
+        _add((run.page, "(outside sections)", "other"), max(run.seconds - timed, 0.0))
+        _add((run.page, "(whole rerun)", "total"), run.seconds)
+    return run
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def page_stats(page=None):
+    # Timings per (page, section) from all sessions, slowest in total first
+    # (milliseconds; percentiles over the last WINDOW reruns)
+    with _lock:
+        rows = []
+        for (page_name, name, kind), stats in _totals.items():
+            if page is not None and page_name != page:
+                continue
+            ordered = sorted(stats.durations)
+            rows.append({
+                "page": page_name,
+                "section": name,
+                "kind": kind,
+                "calls": stats.calls,
+                "total_ms": stats.seconds * 1000,
+                "mean_ms": stats.seconds * 1000 / stats.calls,
+                "p50_ms": _percentile(ordered, 0.50) * 1000,
+                "p95_ms": _percentile(ordered, 0.95) * 1000,
+            })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def reset_page_stats():
+    with _lock:
+        _totals.clear()
+
+
+def render_diagnostics():
+    # Close the rerun and, for admins, show the timings in the sidebar
+    run = finish_page()
+    if run is None or st.session_state.get("role") != "admin":
+        return
+
+    with st.sidebar.expander("🩺 Diagnostics", expanded=False):
+        st.caption(f"This rerun: {run.seconds * 1000:.0f} ms")
+
+        # Where this rerun's time went, per kind of work
+        by_kind = {}
+        for _, kind, seconds, depth in run.sections:
+            if depth == 0:
+                by_kind[kind] = by_kind.get(kind, 0.0) + seconds
+        by_kind["other"] = max(run.seconds - sum(by_kind.values()), 0.0)
+        st.dataframe(
+            [{"kind": kind, "ms": round(seconds * 1000, 1),
+              "share": f"{seconds / run.seconds:.0%}" if run.seconds else "-"}
+             for kind, seconds in sorted(by_kind.items(), key=lambda item: -item[1])],
+            use_container_width=True,
+            hide_index=True
+        )
+        st.dataframe(
+            [{"section": name, "kind": kind, "ms": round(seconds * 1000, 1)}
+             for name, kind, seconds, _ in sorted(run.sections, key=lambda s: -s[2])],
+            use_container_width=True,
+            hide_index=True
+        )
+
+        st.caption("All sessions (ms)")
+        st.dataframe(
+            [{"section": row["section"], "kind": row["kind"], "calls": row["calls"],
+              "mean": round(row["mean_ms"], 1), "p95": round(row["p95_ms"], 1)}
+             for row in page_stats(run.page)],
+            use_container_width=True,
+            hide_index=True
+        )
+
+        if st.button("Profile Next Rerun", key="diagnostics_profile", use_container_width=True):
+            st.session_state.profile_next_rerun = run.page
+            st.rerun()
+        captured = st.session_state.get("page_profile")
+        if captured and captured["page"] == run.page:
+            st.caption("cProfile of the last profiled rerun (cumulative time)")
+            st.code(captured["text"], language=None)
+
+        if st.button("Reset Timings", key="diagnostics_reset", use_container_width=True):
+            reset_page_stats()
+            st.session_state.pop("page_profile", None)
@@ -1,59 +1,32 @@
-import bcrypt
-import os
+from app.services.auth_pool import get_auth_pool
+from app.services.user_store import get_user_store
 
 # File where usernames + hashed passwords + roles are stored
 USER_FILE = "users.txt"
 
 def hash_password(plain_text_password):
-    # Hash a normal password using bcrypt (salt is generated automatically)
-    password_bytes = plain_text_password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    # Hash a password with bcrypt on the auth worker pool
+    # (keeps CPU-heavy hashing off the Streamlit script thread)
+    return get_auth_pool().hash_password(plain_text_password)
 
 def verify_password(plain_text_password, hashed_password):
-    # Check if a password matches the stored bcrypt hash
-    try:
-        password_bytes = plain_text_password.encode('utf-8')
-        hashed_bytes = hashed_password.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hashed_bytes)
-    except Exception as e:
-        print(f"Password verification error: {e}")
-        return False
+    # Check a password against its bcrypt hash on the auth worker pool
+    # Raises AuthBusy / AuthTimeout if the pool is overloaded
+    return get_auth_pool().verify_password(plain_text_password, hashed_password)
 
 # --- File helper functions ---
 
-def _load_users():
-    # Read users.txt and return users in a dictionary
+def _store():
+    # Indexed, append-only store over users.txt (see user_store.py)
     # File format: username,password_hash,role
-    users = {}
-    if not os.path.exists(USER_FILE):
-        return users
-
-    with open(USER_FILE, 'r') as f:
-        for line in f:
-            try:
-                username, password_hash, role = line.strip().split(',', 2)
-                users[username] = {'password_hash': password_hash, 'role': role}
-            except ValueError:
-                # Skip any broken lines
-                continue
-    return users
-
-def _save_users(users):
-    # Write the full users dictionary back into users.txt
-    with open(USER_FILE, 'w') as f:
-        for username, data in users.items():
-            line = f"{username},{data['password_hash']},{data['role']}\n"
-            f.write(line)
+    return get_user_store(USER_FILE)
 
 # --- Main functions ---
 
 def login_user(username, password):
     # Login: check username exists + password is correct
     try:
-        users = _load_users()
-        user_data = users.get(username)
+        user_data = _store().get(username)
 
         if not user_data:
             return False, "Username not found."
@@ -69,19 +42,18 @@ def login_user(username, password):
 def register_user(username, password, role="user"):
     # Register: add a new user if the username is not taken
     try:
-        users = _load_users()
+        store = _store()
 
-        if username in users:
+        if store.exists(username):
             return False, f"Username '{username}' already exists."
 
         hashed = hash_password(password)
 
-        users[username] = {
-            'password_hash': hashed,
-            'role': role
-        }
+        # add() re-checks under the file lock, so two registrations
+        # racing for the same name cannot both succeed
+        if not store.add(username, hashed, role):
+            return False, f"Username '{username}' already exists."
 
-        _save_users(users)
         return True, f"User '{username}' registered successfully!"
 
     except Exception as e:
@@ -90,8 +62,7 @@ def register_user(username, password, role="user"):
 def user_exists(username):
     # Quick check if a username exists in users.txt
     try:
-        users = _load_users()
-        return username in users
+        return _store().exists(username)
     except Exception:
         return False
 
@@ -0,0 +1,301 @@
+# Append-only user store on top of users.txt
+#
+# users.txt keeps its old format (username,password_hash,role per line) but
+# is never rewritten on registration: new or changed users are appended and
+# the last line for a username wins. An offset index (username -> byte
+# offset of its latest line) makes lookups a single seek + readline.
+#
+# The index lives in memory, is saved next to the data file as
+# users.txt.idx and is refreshed by looking at the file's size/mtime, so
+# appends made by other processes are picked up by reading only the new tail.
+# Writers hold an exclusive lock on users.txt.lock.
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:          # Windows
+    fcntl = None
+    import msvcrt
+
+# Compact when at least this many lines are stale and they are over half the file
+COMPACT_MIN_STALE = 1000
+COMPACT_STALE_RATIO = 0.5
+# Save the on-disk index after this many lines were indexed since the last save
+INDEX_SAVE_EVERY = 1000
+
+
+class _FileLock:
+    # Exclusive lock shared between processes (one lock file per store)
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._file = None
+        self._depth = 0
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            self._file = open(self.path, "a+b")
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+
+def _parse_line(line):
+    # b"username,hash,role\n" -> (username, hash, role) or None for broken lines
+    try:
+        username, password_hash, role = line.decode("utf-8").strip().split(",", 2)
+    except ValueError:
+        return None
+    return username, password_hash, role
+
+
+class UserStore:
+    def __init__(self, path):
+        self.path = str(path)
+        self.index_path = self.path + ".idx"
+        self._lock = _FileLock(self.path + ".lock")
+        self._mutex = threading.RLock()
+
+        self._offsets = {}       # username -> offset of its latest line
+        self._indexed_size = 0   # bytes of users.txt covered by _offsets
+        self._file_id = None     # (device, inode) of the indexed users.txt
+        self._mtime_ns = None
+        self._lines = 0          # lines indexed, including stale ones
+        self._unsaved = 0        # lines indexed since the index file was saved
+        self._loaded = False
+
+    # --- index maintenance ---
+
+    def _scan(self, start):
+        # Index every line from byte `start` to the end of users.txt
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Half-written last line: index it next time
+                    break
+                parsed = _parse_line(line)
+                if parsed is not None:
+                    self._offsets[parsed[0]] = offset
+                    self._lines += 1
+                    self._unsaved += 1
+                offset += len(line)
+        self._indexed_size = offset
+
+    def _load_index_file(self, file_id):
+        # Load users.txt.idx if it belongs to the current users.txt
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                header = f.readline().strip().split(",")
+                if len(header) != 4 or (int(header[0]), int(header[1])) != file_id:
+                    return False
+                self._indexed_size = int(header[2])
+                self._lines = int(header[3])
+                offsets = {}
+                for line in f:
+                    username, _, offset = line.rstrip("\n").rpartition("\t")
+                    offsets[username] = int(offset)
+                self._offsets = offsets
+                self._unsaved = 0
+                return True
+        except (OSError, ValueError):
+            return False
+
+    def _save_index_file(self):
+        # Write to a temp file first so readers never see half an index
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"{self._file_id[0]},{self._file_id[1]},{self._indexed_size},{self._lines}\n")
+            for username, offset in self._offsets.items():
+                f.write(f"{username}\t{offset}\n")
+        os.replace(tmp_path, self.index_path)
+        self._unsaved = 0
+
+    def _reset(self):
+        self._offsets = {}
+        self._indexed_size = 0
+        self._lines = 0
+        self._unsaved = 0
+
+    def _refresh(self):
+        # Make the index match users.txt; cheap when nothing changed
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            self._file_id = None
+            self._mtime_ns = None
+            self._loaded = True
+            return
+
+        file_id = (stat.st_dev, stat.st_ino)
+        if self._loaded and file_id == self._file_id and stat.st_mtime_ns == self._mtime_ns \
+                and stat.st_size == self._indexed_size:
+            return
+
+        if not self._loaded or file_id != self._file_id or stat.st_size < self._indexed_size:
+            # First use, or the file was replaced (compacted) by someone else
+            self._reset()
+            self._file_id = file_id
+            if not self._load_index_file(file_id) or self._indexed_size > stat.st_size:
+                self._reset()
+
+        self._scan(self._indexed_size)
+        self._mtime_ns = stat.st_mtime_ns
+        self._loaded = True
+
+        if self._unsaved >= INDEX_SAVE_EVERY:
+            self._save_index_file()
+
+    def _read_at(self, offset):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return _parse_line(f.readline())
+
+    # --- public API ---
+
+    def get(self, username):
+        # Return {'password_hash': ..., 'role': ...} or None
+        with self._mutex:
+            self._refresh()
+            offset = self._offsets.get(username)
+            if offset is None:
+                return None
+            parsed = self._read_at(offset)
+        if parsed is None or parsed[0] != username:
+            return None
+        return {"password_hash": parsed[1], "role": parsed[2]}
+
+    def exists(self, username):
+        with self._mutex:
+            self._refresh()
+            return username in self._offsets
+
+    def add(self, username, password_hash, role):
+        # Append a new user; returns False if the username is taken
+        line = f"{username},{password_hash},{role}\n".encode("utf-8")
+        with self._mutex, self._lock:
+            self._end_last_line()
+            # Another process may have appended since our last look
+            self._refresh()
+            if username in self._offsets:
+                return False
+            self._append(username, line)
+            self._maybe_compact()
+        return True
+
+    def put(self, username, password_hash, role):
+        # Add or replace a user (the old line becomes stale)
+        line = f"{username},{password_hash},{role}\n".encode("utf-8")
+        with self._mutex, self._lock:
+            self._end_last_line()
+            self._refresh()
+            self._append(username, line)
+            self._maybe_compact()
+
+    def _end_last_line(self):
+        # A last line without "\n" (the file was edited by hand, or saved by
+        # an editor that drops it) would be joined with the next append;
+        # end it first so it is indexed too. Writers only, under the lock.
+        try:
+            with open(self.path, "r+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size == 0:
+                    return
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+
+    def _append(self, username, line):
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        if offset != self._indexed_size:
+            # File grew under us without the lock (should not happen); rescan
+            self._scan(self._indexed_size)
+        else:
+            self._offsets[username] = offset
+            self._lines += 1
+            self._unsaved += 1
+            self._indexed_size = offset + len(line)
+        stat = os.stat(self.path)
+        self._file_id = (stat.st_dev, stat.st_ino)
+        self._mtime_ns = stat.st_mtime_ns
+
+    def stale_lines(self):
+        with self._mutex:
+            self._refresh()
+            return self._lines - len(self._offsets)
+
+    def _maybe_compact(self):
+        stale = self._lines - len(self._offsets)
+        if stale >= COMPACT_MIN_STALE and stale > self._lines * COMPACT_STALE_RATIO:
+            self.compact()
+
+    def compact(self):
+        # Rewrite users.txt with only the latest line per user
+        with self._mutex, self._lock:
+            self._refresh()
+            tmp_path = self.path + ".compact"
+            new_offsets = {}
+            with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+                for username, offset in sorted(self._offsets.items(), key=lambda item: item[1]):
+                    src.seek(offset)
+                    line = src.readline()
+                    new_offsets[username] = dst.tell()
+                    dst.write(line)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp_path, self.path)
+
+            stat = os.stat(self.path)
+            self._offsets = new_offsets
+            self._lines = len(new_offsets)
+            self._indexed_size = stat.st_size
+            self._file_id = (stat.st_dev, stat.st_ino)
+            self._mtime_ns = stat.st_mtime_ns
+            self._save_index_file()
+
+    def __len__(self):
+        with self._mutex:
+            self._refresh()
+            return len(self._offsets)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_user_store(path):
+    # One store (and one in-memory index) per users file
+    key = os.path.abspath(path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = UserStore(path)
+        return _stores[key]
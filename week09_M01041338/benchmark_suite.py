@@ -0,0 +1,321 @@
+# Benchmark suite: the app's data paths at 10K / 1M / 10M rows
+#
+# For each size, generates the DATA/ CSVs with generate_data.py into a temp
+# folder, loads them into a fresh database and times:
+#
+#   ingest <table>          sync_csv() of the CSV into an empty table
+#   resync unchanged        sync_csv() of all four CSVs again (size + mtime match)
+#   resync touched          ... after touching them (content hash is checked)
+#   get_all_incidents       cold (no snapshot, no cache) and warm
+#   get_incidents_by_type   cold and warm
+#   login index             first lookup in users.txt (builds the username index)
+#   login                   login_user() with the right password (one bcrypt check)
+#   login unknown user      login_user() of a username that does not exist
+#   dashboard <tab>         every call one Dashboard tab makes, cold and warm
+#   analytics               every call the Analytics page makes, cold and warm
+#
+# "cold" clears the query cache (and snapshots) before each run; SQLite's own
+# page cache stays warm, as it would in the running app.
+#
+# Results are written as JSON (sorted keys, one benchmark per block), so the
+# files of two releases can be diffed, or compared with --compare:
+#
+# Run from the week09 folder:
+#   python benchmark_suite.py [sizes ...] [--out results.json]
+#       sizes: numbers or 10k / 1m / 10m (default 10k 1m; 10m needs ~10 GB of disk)
+#   python benchmark_suite.py --compare old.json new.json
+
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import app.data.db as db
+import app.data.tracing as tracing
+import app.services.user_service as user_service
+from app.data.aggregates import (
+    table_count, latest_rows, users_by_role,
+    incident_kpis, ticket_kpis, dataset_kpis,
+    incidents_by_severity, incidents_by_status, incidents_by_type,
+    tickets_by_status, tickets_by_priority,
+    datasets_by_category, datasets_by_format,
+)
+from app.data.cache import bump_version, clear_cache
+from app.data.incidents import get_all_incidents, get_incidents_by_type
+from app.data.ingest import sync_csv
+from app.data.schema import ensure_schema
+from app.data.snapshots import drop_snapshots
+from app.services.user_store import get_user_store
+from generate_data import PASSWORD, generate, parse_rows
+
+SIZES = ("10k", "1m")
+REPEAT = 5
+LOGINS = 5
+OUT_FILE = "benchmark_results.json"
+# A benchmark this much slower (median) is flagged by --compare
+SLOWER = 1.2
+
+# Same tables and files as the Analytics page loads
+TABLES = {
+    "users_data": "users.csv",
+    "cyber_incidents": "cyber_incidents.csv",
+    "it_tickets": "it_tickets.csv",
+    "datasets_metadata": "datasets_metadata.csv",
+}
+PREVIEW_ROWS = 100
+
+
+# --- what each page asks the data layer for ---
+
+def dashboard_cybersecurity():
+    return [
+        incident_kpis(), incidents_by_severity(), incidents_by_status(),
+        latest_rows("cyber_incidents", PREVIEW_ROWS),
+    ]
+
+
+def dashboard_it_operations():
+    return [
+        ticket_kpis(), tickets_by_status(), tickets_by_priority(),
+        latest_rows("it_tickets", PREVIEW_ROWS),
+    ]
+
+
+def dashboard_data_analysis():
+    return [
+        dataset_kpis(), datasets_by_category(), datasets_by_format(),
+        latest_rows("datasets_metadata", PREVIEW_ROWS),
+    ]
+
+
+def analytics():
+    return [table_count(table) for table in TABLES] + [
+        users_by_role(), incidents_by_type(), incidents_by_severity(),
+        tickets_by_priority(), tickets_by_status(),
+    ]
+
+
+PAGES = {
+    "dashboard cybersecurity": dashboard_cybersecurity,
+    "dashboard it operations": dashboard_it_operations,
+    "dashboard data analysis": dashboard_data_analysis,
+    "analytics": analytics,
+}
+
+
+# --- timing ---
+
+def _rows(result):
+    # Rows a call returned (0 for a dict of KPIs)
+    if isinstance(result, list):
+        return sum(_rows(item) for item in result)
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    return 0
+
+
+def _summary(seconds, rows):
+    return {
+        "runs": len(seconds),
+        "min_s": round(min(seconds), 6),
+        "median_s": round(statistics.median(seconds), 6),
+        "max_s": round(max(seconds), 6),
+        "rows": rows,
+    }
+
+
+def time_call(fn, repeat=REPEAT, before=None):
+    # Run fn `repeat` times (calling `before` untimed ahead of each run)
+    seconds = []
+    rows = 0
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - started)
+        rows = _rows(result)
+    return _summary(seconds, rows)
+
+
+def cold():
+    clear_cache()
+    drop_snapshots()
+
+
+# --- one size ---
+
+def setup(workdir, rows):
+    # Generate the CSVs and point the data layer at an empty database
+    data_dir = workdir / "DATA"
+    started = time.perf_counter()
+    generate(data_dir, rows)
+    generated = time.perf_counter() - started
+
+    db.close_all_pools()
+    db.DATABASE_FILE = str(workdir / "benchmark.db")
+    user_service.USER_FILE = str(data_dir / "users.txt")
+    ensure_schema()
+    cold()
+    return data_dir, generated
+
+
+def bench_ingest(data_dir, results):
+    conn = db.connect_database()
+    try:
+        for table_name, csv_file in TABLES.items():
+            started = time.perf_counter()
+            stats = sync_csv(conn, data_dir / csv_file, table_name)
+            seconds = time.perf_counter() - started
+            bump_version(table_name)
+            results[f"ingest {table_name}"] = dict(
+                _summary([seconds], stats["rows"]),
+                rows_per_s=round(stats["rows"] / seconds),
+            )
+
+        def resync():
+            for table_name, csv_file in TABLES.items():
+                sync_csv(conn, data_dir / csv_file, table_name)
+
+        def touch():
+            for csv_file in TABLES.values():
+                os.utime(data_dir / csv_file)
+
+        results["resync unchanged"] = time_call(resync)
+        results["resync touched"] = time_call(resync, before=touch)
+    finally:
+        conn.close()
+
+
+def bench_reads(results):
+    results["get_all_incidents cold"] = time_call(get_all_incidents, before=cold)
+    results["get_all_incidents warm"] = time_call(get_all_incidents)
+    results["get_incidents_by_type cold"] = time_call(get_incidents_by_type, before=clear_cache)
+    results["get_incidents_by_type warm"] = time_call(get_incidents_by_type)
+    for name, page in PAGES.items():
+        results[f"{name} cold"] = time_call(page, before=clear_cache)
+        results[f"{name} warm"] = time_call(page)
+
+
+def bench_login(data_dir, results, rows):
+    started = time.perf_counter()
+    get_user_store(user_service.USER_FILE).get("user1")
+    results["login index"] = _summary([time.perf_counter() - started], rows)
+
+    # Start the bcrypt worker pool before timing
+    user_service.login_user("user1", PASSWORD)
+    rng = random.Random(rows)
+    usernames = iter([f"user{rng.randint(1, rows)}" for _ in range(LOGINS)])
+
+    def login():
+        ok, role = user_service.login_user(next(usernames), PASSWORD)
+        if not ok:
+            raise RuntimeError(f"benchmark login failed: {role}")
+
+    results["login"] = time_call(login, repeat=LOGINS)
+    results["login unknown user"] = time_call(
+        lambda: user_service.login_user("no-such-user", PASSWORD)
+    )
+
+
+def run_size(rows):
+    results = {}
+    workdir = Path(tempfile.mkdtemp(prefix="benchmark_suite_"))
+    try:
+        data_dir, generated = setup(workdir, rows)
+        print(f"{rows:>12,} rows  (data generated in {generated:.1f}s)")
+        bench_ingest(data_dir, results)
+        bench_reads(results)
+        bench_login(data_dir, results, rows)
+    finally:
+        db.close_all_pools()
+        shutil.rmtree(workdir, ignore_errors=True)
+    for name, result in results.items():
+        print(f"{rows:>12,}  {name:<32}{result['median_s']:>10.4f}s{result['rows']:>12,} rows")
+    return results
+
+
+# --- output ---
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    try:
+        import pyarrow
+        pyarrow_version = pyarrow.__version__
+    except ImportError:
+        pyarrow_version = None
+    return {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pd.__version__,
+        "pyarrow": pyarrow_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "db_profile": db.DB_PROFILE,
+        "db_trace": tracing.TRACE_QUERIES,
+        "repeat": REPEAT,
+    }
+
+
+def compare(old_file, new_file):
+    # Median of every benchmark in both files, new / old
+    with open(old_file, encoding="utf-8") as f:
+        old = json.load(f)["results"]
+    with open(new_file, encoding="utf-8") as f:
+        new = json.load(f)["results"]
+    print(f"{'size':>12}  {'benchmark':<32}{'old s':>10}{'new s':>10}{'new/old':>9}")
+    for size in sorted(set(old) & set(new), key=int):
+        for name in sorted(set(old[size]) & set(new[size])):
+            before = old[size][name]["median_s"]
+            after = new[size][name]["median_s"]
+            ratio = after / before if before else float("inf")
+            flag = "  slower" if ratio >= SLOWER else ""
+            print(f"{int(size):>12,}  {name:<32}{before:>10.4f}{after:>10.4f}{ratio:>8.2f}x{flag}")
+
+
+def main(args):
+    out_file = OUT_FILE
+    if "--out" in args:
+        i = args.index("--out")
+        out_file = args[i + 1]
+        del args[i:i + 2]
+    sizes = [parse_rows(arg) for arg in args] or [parse_rows(size) for size in SIZES]
+
+    # Every cold read of a big table is "slow"; keep them out of the log
+    tracing.SLOW_QUERY_LOG = ""
+    report = {"environment": environment(), "results": {}}
+    for rows in sizes:
+        report["results"][str(rows)] = run_size(rows)
+
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\n Results written to {out_file}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--compare"]:
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,281 @@
+# Synthetic data generator: the DATA/ CSVs at any size
+#
+# Writes the four tables the app loads, shaped like the shipped exports
+# (same headers, same label spellings, so app/data/ingest.py loads them
+# as it loads the real ones), plus a users.txt for the login store:
+#
+#   cyber_incidents.csv    id,date,incident_type,severity,status,description,reported_by
+#   it_tickets.csv         id,title,priority,status,category,assigned_to,created_date,resolved_date
+#   datasets_metadata.csv  id,name,source,category,owner,format,size,last_updated
+#   users.csv              id,username,role,department,created_date
+#   users.txt              username,password_hash,role (password: PASSWORD)
+#
+# The data is skewed the way real logs are: a few incident types, low
+# severities and busy reporters account for most rows, volume grows over
+# the years and dips at weekends, tickets open in office hours, and old
+# incidents/tickets are mostly resolved while recent ones are still open.
+# About 1% of labels use another spelling ("In Progress", "in_progress",
+# "HIGH") like hand-edited exports do.
+#
+# Rows are written CHUNK_ROWS at a time, so memory does not grow with size.
+# Same seed -> same files.
+#
+# Run from the week09 folder:  python generate_data.py [rows] [out_dir]
+#   rows: a number or 10k / 1m / 10m (default 10k); out_dir default DATA_generated
+
+import csv
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+SCALES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+SEED = 1510
+CHUNK_ROWS = 250_000
+
+# Shared password of every generated login (one bcrypt hash for all users)
+PASSWORD = "Password123!"
+
+START = np.datetime64("2019-01-01")
+END = np.datetime64("2025-01-01")
+# Incidents/tickets older than this (days before END) are mostly closed
+RECENT_DAYS = 60
+
+INCIDENT_TYPES = {
+    "Phishing": 0.38, "Malware": 0.24, "DDoS": 0.14, "Ransomware": 0.09,
+    "Data Breach": 0.06, "Insider Threat": 0.05, "SQL Injection": 0.04,
+}
+SEVERITIES = {"low": 0.44, "medium": 0.31, "high": 0.18, "critical": 0.07}
+# Status mix for old and for recent rows
+INCIDENT_STATUS_OLD = {"resolved": 0.62, "closed": 0.30, "in-progress": 0.05, "open": 0.03}
+INCIDENT_STATUS_RECENT = {"open": 0.35, "in-progress": 0.40, "resolved": 0.20, "closed": 0.05}
+TICKET_STATUS_OLD = {"closed": 0.70, "resolved": 0.22, "in progress": 0.05, "open": 0.03}
+TICKET_STATUS_RECENT = {"open": 0.40, "in progress": 0.35, "resolved": 0.15, "closed": 0.10}
+PRIORITIES = {"low": 0.40, "medium": 0.35, "high": 0.18, "critical": 0.07}
+TICKET_CATEGORIES = {
+    "Software": 0.31, "Account": 0.22, "Hardware": 0.17, "Network": 0.14,
+    "Email": 0.10, "Database": 0.06,
+}
+# Median hours to resolve a ticket, per priority
+RESOLVE_HOURS = {"critical": 4, "high": 12, "medium": 36, "low": 96}
+DATASET_CATEGORIES = {
+    "Security": 0.30, "Operations": 0.22, "Finance": 0.16, "Marketing": 0.12,
+    "Research": 0.12, "HR": 0.08,
+}
+SOURCES = {"Internal": 0.45, "Cloud Storage": 0.25, "API": 0.15, "Partner": 0.10, "Public": 0.05}
+FORMATS = {"CSV": 0.40, "Parquet": 0.25, "JSON": 0.20, "Excel": 0.10, "SQL": 0.05}
+ROLES = {"user": 0.85, "analyst": 0.12, "admin": 0.03}
+DEPARTMENTS = {
+    "IT Operations": 0.30, "Cybersecurity": 0.25, "Data Science": 0.20,
+    "Management": 0.10, "Finance": 0.10, "HR": 0.05,
+}
+# Other spellings mixed into ~1% of labels
+SPELLINGS = {
+    "in-progress": ("In Progress", "in_progress"),
+    "in progress": ("In Progress", "in-progress"),
+    "high": ("HIGH", "High"),
+    "low": ("Low", "LOW"),
+    "medium": ("Medium",),
+    "critical": ("Critical", "CRITICAL"),
+    "open": ("Open", "OPEN"),
+    "resolved": ("Resolved",),
+    "closed": ("Closed",),
+}
+RESPELL_SHARE = 0.01
+
+INCIDENT_TEXT = (
+    "Security event detected", "Suspicious login from unusual location",
+    "Malicious attachment reported by employee", "Unusual outbound traffic",
+    "Endpoint alert raised by antivirus", "Credential stuffing attempt blocked",
+    "Privilege escalation attempt", "Data exfiltration suspected",
+)
+TICKET_TEXT = (
+    "Password reset", "Laptop will not boot", "VPN keeps disconnecting",
+    "Cannot access shared drive", "Email not syncing", "Printer offline",
+    "Request new software licence", "Database query timing out",
+)
+
+
+def parse_rows(text):
+    # "10k" / "1m" / "10m" or a plain number
+    return SCALES.get(str(text).lower()) or int(str(text).replace("_", ""))
+
+
+def _pick(rng, weights, size):
+    labels = np.array(list(weights), dtype=object)
+    p = np.array(list(weights.values()), dtype=float)
+    return labels[rng.choice(len(labels), size=size, p=p / p.sum())]
+
+
+def _respell(rng, labels):
+    # Swap ~RESPELL_SHARE of the labels for another spelling
+    hits = np.flatnonzero(rng.random(len(labels)) < RESPELL_SHARE)
+    for i in hits:
+        others = SPELLINGS.get(labels[i])
+        if others:
+            labels[i] = others[rng.integers(len(others))]
+    return labels
+
+
+def _skewed_ids(rng, size, count):
+    # 1..count with a few ids taking most rows (Zipf-like)
+    return (rng.zipf(1.6, size) - 1) % count + 1
+
+
+def _days(rng, size):
+    # Day offsets from START: volume grows over time, weekends are quieter
+    span = int((END - START) / np.timedelta64(1, "D"))
+    days = (span * np.sqrt(rng.random(size))).astype(np.int64)
+    weekday = (days + 1) % 7           # 2019-01-01 was a Tuesday; 5, 6 = Sat, Sun
+    weekend = (weekday >= 5) & (rng.random(size) < 0.6)
+    days[weekend] -= weekday[weekend] - 4          # moved back to Friday
+    return np.clip(days, 0, span - 1)
+
+
+def _dates(days):
+    return np.datetime_as_string(START + days.astype("timedelta64[D]"), unit="D")
+
+
+def _status(rng, days, old, recent):
+    # Mostly closed when old, mostly open when recent
+    span = int((END - START) / np.timedelta64(1, "D"))
+    is_recent = days >= span - RECENT_DAYS
+    status = _pick(rng, old, len(days))
+    status[is_recent] = _pick(rng, recent, int(is_recent.sum()))
+    return status
+
+
+def _write(path, header, make_chunk, rows, seed):
+    # Write `rows` rows, CHUNK_ROWS at a time; make_chunk(rng, first_id, size)
+    # returns the columns of one chunk
+    rng = np.random.default_rng(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for first in range(1, rows + 1, CHUNK_ROWS):
+            size = min(CHUNK_ROWS, rows + 1 - first)
+            writer.writerows(zip(*make_chunk(rng, first, size)))
+
+
+def _incidents(rng, first, size):
+    ids = np.arange(first, first + size)
+    days = _days(rng, size)
+    text = np.array(INCIDENT_TEXT, dtype=object)[rng.integers(len(INCIDENT_TEXT), size=size)]
+    return (
+        ids,
+        _dates(days),
+        _pick(rng, INCIDENT_TYPES, size),
+        _respell(rng, _pick(rng, SEVERITIES, size)),
+        _respell(rng, _status(rng, days, INCIDENT_STATUS_OLD, INCIDENT_STATUS_RECENT)),
+        [f"Incident {i} - {t}" for i, t in zip(ids, text)],
+        [f"user{n}" for n in _skewed_ids(rng, size, 500)],
+    )
+
+
+def _tickets(rng, first, size):
+    ids = np.arange(first, first + size)
+    days = _days(rng, size)
+    # Opened in office hours (around 1 pm)
+    minutes = np.clip(rng.normal(13 * 60, 180, size), 0, 24 * 60 - 1).astype(np.int64)
+    created = START + days.astype("timedelta64[D]") + minutes.astype("timedelta64[m]")
+    priority = _pick(rng, PRIORITIES, size)
+    status = _status(rng, days, TICKET_STATUS_OLD, TICKET_STATUS_RECENT)
+    median = np.array([RESOLVE_HOURS[p] for p in priority], dtype=float)
+    hours = (median * rng.lognormal(0.0, 0.8, size) * 60).astype(np.int64)
+    resolved = np.datetime_as_string(created + hours.astype("timedelta64[m]"), unit="s")
+    done = np.isin(status, ("closed", "resolved"))
+    resolved = np.where(done, np.char.replace(resolved, "T", " "), "")
+    text = np.array(TICKET_TEXT, dtype=object)[rng.integers(len(TICKET_TEXT), size=size)]
+    return (
+        ids,
+        [f"Ticket {i} - {t}" for i, t in zip(ids, text)],
+        _respell(rng, priority),
+        _respell(rng, status),
+        _pick(rng, TICKET_CATEGORIES, size),
+        [f"agent{n}" for n in _skewed_ids(rng, size, 40)],
+        np.char.replace(np.datetime_as_string(created, unit="s"), "T", " "),
+        resolved,
+    )
+
+
+def _datasets(rng, first, size):
+    ids = np.arange(first, first + size)
+    return (
+        ids,
+        [f"Dataset_{i}" for i in ids],
+        _pick(rng, SOURCES, size),
+        _pick(rng, DATASET_CATEGORIES, size),
+        [f"owner{n}" for n in _skewed_ids(rng, size, 200)],
+        _pick(rng, FORMATS, size),
+        rng.lognormal(10.0, 1.5, size).astype(np.int64),    # bytes, long tail
+        _dates(_days(rng, size)),
+    )
+
+
+def _users(rng, first, size):
+    ids = np.arange(first, first + size)
+    return (
+        ids,
+        [f"user{i}" for i in ids],
+        _pick(rng, ROLES, size),
+        _pick(rng, DEPARTMENTS, size),
+        _dates(_days(rng, size)),
+    )
+
+
+def write_login_store(path, users_csv):
+    # users.txt for the login store: every user from users.csv, all with
+    # the same password (bcrypt is slow on purpose; hashing once is enough)
+    import bcrypt
+    password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    with open(users_csv, newline="", encoding="utf-8") as source, open(path, "w", encoding="utf-8") as out:
+        reader = csv.reader(source)
+        next(reader)
+        out.writelines(f"{row[1]},{password_hash},{row[2]}\n" for row in reader)
+
+
+TABLES = {
+    "cyber_incidents": (
+        ("id", "date", "incident_type", "severity", "status", "description", "reported_by"),
+        _incidents,
+    ),
+    "it_tickets": (
+        ("id", "title", "priority", "status", "category", "assigned_to", "created_date", "resolved_date"),
+        _tickets,
+    ),
+    "datasets_metadata": (
+        ("id", "name", "source", "category", "owner", "format", "size", "last_updated"),
+        _datasets,
+    ),
+    "users": (
+        ("id", "username", "role", "department", "created_date"),
+        _users,
+    ),
+}
+
+
+def generate(out_dir, rows, seed=SEED, tables=None, login_store=True):
+    # Write <table>.csv for each table (rows rows each) into out_dir and
+    # return {file name: seconds taken}
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    timings = {}
+    for n, name in enumerate(tables or TABLES):
+        header, make_chunk = TABLES[name]
+        started = time.perf_counter()
+        _write(out_dir / f"{name}.csv", header, make_chunk, rows, seed + n)
+        timings[f"{name}.csv"] = time.perf_counter() - started
+    if login_store and (tables is None or "users" in tables):
+        started = time.perf_counter()
+        write_login_store(out_dir / "users.txt", out_dir / "users.csv")
+        timings["users.txt"] = time.perf_counter() - started
+    return timings
+
+
+if __name__ == "__main__":
+    rows = parse_rows(sys.argv[1]) if len(sys.argv) > 1 else SCALES["10k"]
+    out_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else Path("DATA_generated")
+    for name, seconds in generate(out_dir, rows).items():
+        size_mb = (out_dir / name).stat().st_size / 1e6
+        print(f" {name:<24}{rows:>12,} rows {size_mb:>10.1f} MB {seconds:>8.1f}s")
@@ -1,7 +1,17 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from app.data.db import connect_database
+from app.data.aggregates import (
+    incident_kpis, ticket_kpis, dataset_kpis,
+    incidents_by_severity, incidents_by_status,
+    tickets_by_status, tickets_by_priority,
+    datasets_by_category, datasets_by_format, latest_rows
+)
+from app.data.schema import ensure_schema
+from app.services.profiler import start_page, section, render_diagnostics
+
+# Rows shown in the "latest" tables (charts and KPIs always cover the whole table)
+PREVIEW_ROWS = 100
 
 # Page setup
 st.set_page_config(page_title="Dashboard", page_icon="📊", layout="wide")
@@ -11,6 +21,9 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.error("Please log in first!")
     st.stop()
 
+# Time this rerun (diagnostics in the sidebar for admins)
+start_page("Dashboard")
+
 # Sidebar user info
 with st.sidebar:
     st.write(f"User: {st.session_state.username}")
@@ -18,6 +31,7 @@ with st.sidebar:
     st.divider()
 
 st.title("📊 Dashboard")
+ensure_schema()
 
 # Dashboard selector
 col1, col2 = st.columns([3, 1])
@@ -43,30 +57,23 @@ if "Cybersecurity" in dashboard_type:
         )
 
     try:
-        # Pull latest incidents from the database
-        conn = connect_database()
-        incidents_df = pd.read_sql_query(
-            "SELECT * FROM cyber_incidents LIMIT 100",
-            conn
-        )
-        conn.close()
+        # KPI counts are computed in SQL over the whole table
+        with section("incident KPIs"):
+            kpis = incident_kpis()
 
-        if incidents_df.empty:
+        if kpis["total"] == 0:
             st.warning("No incidents data available")
         else:
             # KPI cards
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total Incidents", len(incidents_df))
+                st.metric("Total Incidents", kpis["total"])
             with col2:
-                critical = len(incidents_df[incidents_df['severity'].str.lower() == 'critical'])
-                st.metric("Critical", critical)
+                st.metric("Critical", kpis["critical"])
             with col3:
-                high = len(incidents_df[incidents_df['severity'].str.lower() == 'high'])
-                st.metric("High", high)
+                st.metric("High", kpis["high"])
             with col4:
-                resolved = len(incidents_df[incidents_df['status'].str.lower() == 'resolved'])
-                st.metric("Resolved", resolved)
+                st.metric("Resolved", kpis["resolved"])
 
             st.divider()
 
@@ -75,52 +82,59 @@ if "Cybersecurity" in dashboard_type:
 
             with col1:
                 st.subheader("Incidents by Severity")
-                severity_counts = incidents_df['severity'].value_counts()
-
-                if chart_type == "Bar":
-                    fig = px.bar(
-                        x=severity_counts.index,
-                        y=severity_counts.values,
-                        labels={'x': 'Severity', 'y': 'Count'},
-                        color=severity_counts.index,
-                        color_discrete_map={
-                            'critical': 'darkred',
-                            'high': 'red',
-                            'medium': 'orange',
-                            'low': 'green'
-                        }
-                    )
-                elif chart_type == "Pie":
-                    fig = px.pie(
-                        values=severity_counts.values,
-                        names=severity_counts.index,
-                        title="Severity Distribution"
-                    )
-                else:
-                    fig = px.line(
-                        x=severity_counts.index,
-                        y=severity_counts.values,
-                        markers=True,
-                        labels={'x': 'Severity', 'y': 'Count'}
-                    )
+                with section("incidents by severity"):
+                    severity_counts = incidents_by_severity().set_index('severity')['count']
+
+                with section("severity chart", "figure"):
+                    if chart_type == "Bar":
+                        fig = px.bar(
+                            x=severity_counts.index,
+                            y=severity_counts.values,
+                            labels={'x': 'Severity', 'y': 'Count'},
+                            color=severity_counts.index,
+                            color_discrete_map={
+                                'critical': 'darkred',
+                                'high': 'red',
+                                'medium': 'orange',
+                                'low': 'green'
+                            }
+                        )
+                    elif chart_type == "Pie":
+                        fig = px.pie(
+                            values=severity_counts.values,
+                            names=severity_counts.index,
+                            title="Severity Distribution"
+                        )
+                    else:
+                        fig = px.line(
+                            x=severity_counts.index,
+                            y=severity_counts.values,
+                            markers=True,
+                            labels={'x': 'Severity', 'y': 'Count'}
+                        )
 
-                st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(fig, use_container_width=True)
 
             with col2:
                 st.subheader("Incidents by Status")
-                status_counts = incidents_df['status'].value_counts()
-                fig = px.pie(
-                    values=status_counts.values,
-                    names=status_counts.index,
-                    title="Status Distribution"
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                with section("incidents by status"):
+                    status_counts = incidents_by_status().set_index('status')['count']
+                with section("incident status chart", "figure"):
+                    fig = px.pie(
+                        values=status_counts.values,
+                        names=status_counts.index,
+                        title="Status Distribution"
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
 
             st.divider()
 
-            # Table view
-            with st.expander("📋 View All Incidents"):
-                st.dataframe(incidents_df, use_container_width=True)
+            # Table view (latest rows only; counts above cover everything)
+            with st.expander(f"📋 View Latest {PREVIEW_ROWS} Incidents"):
+                with section("latest incidents"):
+                    incidents_df = latest_rows("cyber_incidents", PREVIEW_ROWS)
+                with section("latest incidents table", "table"):
+                    st.dataframe(incidents_df, use_container_width=True)
 
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
@@ -138,30 +152,23 @@ elif "IT Operations" in dashboard_type:
         )
 
     try:
-        # Pull latest tickets from the database
-        conn = connect_database()
-        tickets_df = pd.read_sql_query(
-            "SELECT * FROM it_tickets LIMIT 100",
-            conn
-        )
-        conn.close()
+        # KPI counts are computed in SQL over the whole table
+        with section("ticket KPIs"):
+            kpis = ticket_kpis()
 
-        if tickets_df.empty:
+        if kpis["total"] == 0:
             st.warning("No tickets data available")
         else:
             # KPI cards
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total Tickets", len(tickets_df))
+                st.metric("Total Tickets", kpis["total"])
             with col2:
-                open_tickets = len(tickets_df[tickets_df['status'].str.lower() == 'open'])
-                st.metric("Open", open_tickets)
+                st.metric("Open", kpis["open"])
             with col3:
-                in_progress = len(tickets_df[tickets_df['status'].str.lower() == 'in progress'])
-                st.metric("In Progress", in_progress)
+                st.metric("In Progress", kpis["in_progress"])
             with col4:
-                closed = len(tickets_df[tickets_df['status'].str.lower() == 'closed'])
-                st.metric("Closed", closed)
+                st.metric("Closed", kpis["closed"])
 
             st.divider()
 
@@ -170,51 +177,58 @@ elif "IT Operations" in dashboard_type:
 
             with col1:
                 st.subheader("Tickets by Status")
-                status_counts = tickets_df['status'].value_counts()
-
-                if chart_type == "Bar":
-                    fig = px.bar(
-                        x=status_counts.index,
-                        y=status_counts.values,
-                        labels={'x': 'Status', 'y': 'Count'},
-                        color=status_counts.index,
-                        color_discrete_map={
-                            'open': 'red',
-                            'in progress': 'orange',
-                            'closed': 'green'
-                        }
-                    )
-                elif chart_type == "Pie":
-                    fig = px.pie(
-                        values=status_counts.values,
-                        names=status_counts.index,
-                        title="Status Distribution"
-                    )
-                else:
-                    fig = px.line(
-                        x=status_counts.index,
-                        y=status_counts.values,
-                        markers=True,
-                        labels={'x': 'Status', 'y': 'Count'}
-                    )
+                with section("tickets by status"):
+                    status_counts = tickets_by_status().set_index('status')['count']
+
+                with section("ticket status chart", "figure"):
+                    if chart_type == "Bar":
+                        fig = px.bar(
+                            x=status_counts.index,
+                            y=status_counts.values,
+                            labels={'x': 'Status', 'y': 'Count'},
+                            color=status_counts.index,
+                            color_discrete_map={
+                                'open': 'red',
+                                'in progress': 'orange',
+                                'closed': 'green'
+                            }
+                        )
+                    elif chart_type == "Pie":
+                        fig = px.pie(
+                            values=status_counts.values,
+                            names=status_counts.index,
+                            title="Status Distribution"
+                        )
+                    else:
+                        fig = px.line(
+                            x=status_counts.index,
+                            y=status_counts.values,
+                            markers=True,
+                            labels={'x': 'Status', 'y': 'Count'}
+                        )
 
-                st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(fig, use_container_width=True)
 
             with col2:
                 st.subheader("Tickets by Priority")
-                priority_counts = tickets_df['priority'].value_counts()
-                fig = px.pie(
-                    values=priority_counts.values,
-                    names=priority_counts.index,
-                    title="Priority Distribution"
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                with section("tickets by priority"):
+                    priority_counts = tickets_by_priority().set_index('priority')['count']
+                with section("priority chart", "figure"):
+                    fig = px.pie(
+                        values=priority_counts.values,
+                        names=priority_counts.index,
+                        title="Priority Distribution"
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
 
             st.divider()
 
-            # Table view
-            with st.expander("📋 View All Tickets"):
-                st.dataframe(tickets_df, use_container_width=True)
+            # Table view (latest rows only; counts above cover everything)
+            with st.expander(f"📋 View Latest {PREVIEW_ROWS} Tickets"):
+                with section("latest tickets"):
+                    tickets_df = latest_rows("it_tickets", PREVIEW_ROWS)
+                with section("latest tickets table", "table"):
+                    st.dataframe(tickets_df, use_container_width=True)
 
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
@@ -232,29 +246,23 @@ elif "Data Analysis" in dashboard_type:
         )
 
     try:
-        # Pull dataset metadata from the database
-        conn = connect_database()
-        datasets_df = pd.read_sql_query(
-            "SELECT * FROM datasets_metadata LIMIT 100",
-            conn
-        )
-        conn.close()
+        # KPI counts are computed in SQL over the whole table
+        with section("dataset KPIs"):
+            kpis = dataset_kpis()
 
-        if datasets_df.empty:
+        if kpis["total"] == 0:
             st.warning("No datasets data available")
         else:
             # KPI cards
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Total Datasets", len(datasets_df))
+                st.metric("Total Datasets", kpis["total"])
             with col2:
-                unique_categories = datasets_df['category'].nunique()
-                st.metric("Categories", unique_categories)
+                st.metric("Categories", kpis["categories"])
             with col3:
-                unique_owners = datasets_df['owner'].nunique() if 'owner' in datasets_df.columns else 0
-                st.metric("Owners", unique_owners)
+                st.metric("Owners", kpis["owners"])
             with col4:
-                st.metric("Records", len(datasets_df))
+                st.metric("Records", kpis["total"])
 
             st.divider()
 
@@ -263,56 +271,65 @@ elif "Data Analysis" in dashboard_type:
 
             with col1:
                 st.subheader("Datasets by Category")
-                category_counts = datasets_df['category'].value_counts()
-
-                if chart_type == "Bar":
-                    fig = px.bar(
-                        x=category_counts.index,
-                        y=category_counts.values,
-                        labels={'x': 'Category', 'y': 'Count'},
-                        color=category_counts.values,
-                        color_continuous_scale="Blues"
-                    )
-                elif chart_type == "Pie":
-                    fig = px.pie(
-                        values=category_counts.values,
-                        names=category_counts.index,
-                        title="Category Distribution"
-                    )
-                else:
-                    scatter_df = pd.DataFrame({
-                        'Category': category_counts.index,
-                        'Count': category_counts.values
-                    })
-                    fig = px.scatter(
-                        scatter_df,
-                        x='Category',
-                        y='Count',
-                        size='Count',
-                        color='Count',
-                        color_continuous_scale="Viridis"
-                    )
+                with section("datasets by category"):
+                    category_counts = datasets_by_category().set_index('category')['count']
+
+                with section("category chart", "figure"):
+                    if chart_type == "Bar":
+                        fig = px.bar(
+                            x=category_counts.index,
+                            y=category_counts.values,
+                            labels={'x': 'Category', 'y': 'Count'},
+                            color=category_counts.values,
+                            color_continuous_scale="Blues"
+                        )
+                    elif chart_type == "Pie":
+                        fig = px.pie(
+                            values=category_counts.values,
+                            names=category_counts.index,
+                            title="Category Distribution"
+                        )
+                    else:
+                        scatter_df = pd.DataFrame({
+                            'Category': category_counts.index,
+                            'Count': category_counts.values
+                        })
+                        fig = px.scatter(
+                            scatter_df,
+                            x='Category',
+                            y='Count',
+                            size='Count',
+                            color='Count',
+                            color_continuous_scale="Viridis"
+                        )
 
-                st.plotly_chart(fig, use_container_width=True)
+                    st.plotly_chart(fig, use_container_width=True)
 
             with col2:
                 st.subheader("Data Distribution")
-                if 'format' in datasets_df.columns:
-                    format_counts = datasets_df['format'].value_counts()
-                    fig = px.pie(
-                        values=format_counts.values,
-                        names=format_counts.index,
-                        title="Format Distribution"
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.info("Format data not available")
+                with section("datasets by format"):
+                    format_counts = datasets_by_format().set_index('format')['count']
+                with section("format chart", "figure"):
+                    if not format_counts.empty:
+                        fig = px.pie(
+                            values=format_counts.values,
+                            names=format_counts.index,
+                            title="Format Distribution"
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+                    else:
+                        st.info("Format data not available")
 
             st.divider()
 
-            # Table view
-            with st.expander("📋 View All Datasets"):
-                st.dataframe(datasets_df, use_container_width=True)
+            # Table view (latest rows only; counts above cover everything)
+            with st.expander(f"📋 View Latest {PREVIEW_ROWS} Datasets"):
+                with section("latest datasets"):
+                    datasets_df = latest_rows("datasets_metadata", PREVIEW_ROWS)
+                with section("latest datasets table", "table"):
+                    st.dataframe(datasets_df, use_container_width=True)
 
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
+
+render_diagnostics()
@@ -1,8 +1,15 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from pathlib import Path
 from app.data.db import connect_database
+from app.data.ingest import sync_csv
+from app.data.schema import ensure_schema
+from app.data.cache import bump_version
+from app.services.profiler import start_page, section, render_diagnostics
+from app.data.aggregates import (
+    table_count, users_by_role, incidents_by_type, incidents_by_severity,
+    tickets_by_priority, tickets_by_status
+)
 
 st.set_page_config(page_title="Analytics & Reporting", page_icon="📊", layout="wide")
 
@@ -12,6 +19,9 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.info("👈 Go to Home page to login")
     st.stop()
 
+# Time this rerun (diagnostics in the sidebar for admins)
+start_page("Analytics")
+
 # Sidebar
 with st.sidebar:
     st.write(f"User: {st.session_state.username}")
@@ -21,7 +31,11 @@ st.title("Analytics & Reporting")
 
 # Load CSV data into database
 def load_csv_data():
-    # Load CSVs into SQLite tables (only if the table doesn't exist yet)
+    # Sync CSVs into SQLite tables through the ingest ledger:
+    # unchanged files are skipped, new rows are appended, edited rows upserted.
+    # The tables are created (and migrated) first so the CSVs load into the
+    # schema.py shape rather than creating tables shaped like the CSV.
+    ensure_schema()
     conn = connect_database()
     tables = {
         'users_data': 'users.csv',
@@ -31,46 +45,33 @@ def load_csv_data():
     }
 
     for table_name, csv_file in tables.items():
-        cursor = conn.cursor()
-
-        # Check if table already exists
-        cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-        if not cursor.fetchone():
-            csv_path = Path("DATA") / csv_file
+        csv_path = Path("DATA") / csv_file
 
-            # If the CSV exists, load it into the database
-            if csv_path.exists():
-                df = pd.read_csv(csv_path)
-                df.to_sql(table_name, conn, if_exists='replace', index=False)
+        # If the CSV exists, bring its table up to date
+        if csv_path.exists():
+            stats = sync_csv(conn, csv_path, table_name)
+            if stats["action"] in ("full", "appended"):
+                bump_version(table_name)
 
-    conn.commit()
     conn.close()
 
-# Run the CSV load once on page load
-load_csv_data()
+# Sync on page load (cheap when the CSVs have not changed)
+with section("CSV sync"):
+    load_csv_data()
 
 # Get data
 try:
-    conn = connect_database()
-
-    # Pull data from each table
-    users_df = pd.read_sql_query("SELECT * FROM users_data", conn)
-    incidents_df = pd.read_sql_query("SELECT * FROM cyber_incidents", conn)
-    tickets_df = pd.read_sql_query("SELECT * FROM it_tickets", conn)
-    datasets_df = pd.read_sql_query("SELECT * FROM datasets_metadata", conn)
-
-    conn.close()
-
-    # Basic top metrics
+    # Basic top metrics (counted in SQL, no rows are loaded)
     col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Total Users", len(users_df))
-    with col2:
-        st.metric("Total Incidents", len(incidents_df))
-    with col3:
-        st.metric("Total Tickets", len(tickets_df))
-    with col4:
-        st.metric("Total Datasets", len(datasets_df))
+    with section("table counts"):
+        with col1:
+            st.metric("Total Users", table_count("users_data"))
+        with col2:
+            st.metric("Total Incidents", table_count("cyber_incidents"))
+        with col3:
+            st.metric("Total Tickets", table_count("it_tickets"))
+        with col4:
+            st.metric("Total Datasets", table_count("datasets_metadata"))
 
     st.divider()
 
@@ -99,18 +100,19 @@ try:
                 if st.button("Bar Chart", key="user_bar", use_container_width=True):
                     st.session_state.user_graph1 = 'bar'
 
-            role_counts = users_df['role'].value_counts().reset_index()
-            role_counts.columns = ['role', 'count']
+            with section("users by role"):
+                role_counts = users_by_role()
 
-            if st.session_state.user_graph1 == 'pie':
-                fig1 = px.pie(role_counts, values='count', names='role')
-                fig1.update_traces(textposition='inside', textinfo='percent+label')
-                fig1.update_layout(showlegend=True, height=450, margin=dict(t=0, b=0, l=0, r=0))
-            else:
-                fig1 = px.bar(role_counts, x='role', y='count', color='role')
-                fig1.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
+            with section("role chart", "figure"):
+                if st.session_state.user_graph1 == 'pie':
+                    fig1 = px.pie(role_counts, values='count', names='role')
+                    fig1.update_traces(textposition='inside', textinfo='percent+label')
+                    fig1.update_layout(showlegend=True, height=450, margin=dict(t=0, b=0, l=0, r=0))
+                else:
+                    fig1 = px.bar(role_counts, x='role', y='count', color='role')
+                    fig1.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
 
-            st.plotly_chart(fig1, use_container_width=True)
+                st.plotly_chart(fig1, use_container_width=True)
 
         with col2:
             st.markdown("##### Role Statistics")
@@ -127,11 +129,13 @@ try:
                     st.session_state.user_graph2 = 'hbar'
 
             if st.session_state.user_graph2 == 'table':
-                st.dataframe(role_counts, use_container_width=True, hide_index=True, height=450)
+                with section("role table", "table"):
+                    st.dataframe(role_counts, use_container_width=True, hide_index=True, height=450)
             else:
-                fig2 = px.bar(role_counts, y='role', x='count', orientation='h', color='role')
-                fig2.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
-                st.plotly_chart(fig2, use_container_width=True)
+                with section("role bar chart", "figure"):
+                    fig2 = px.bar(role_counts, y='role', x='count', orientation='h', color='role')
+                    fig2.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
+                    st.plotly_chart(fig2, use_container_width=True)
 
     # ========== INCIDENTS TAB ==========
     with tab2:
@@ -153,17 +157,19 @@ try:
                 if st.button("Line Chart", key="incident_line", use_container_width=True):
                     st.session_state.incident_graph1 = 'line'
 
-            type_counts = incidents_df['incident_type'].value_counts().reset_index()
-            type_counts.columns = ['type', 'count']
+            with section("incidents by type"):
+                type_counts = incidents_by_type()
+                type_counts.columns = ['type', 'count']
 
-            if st.session_state.incident_graph1 == 'bar':
-                fig3 = px.bar(type_counts, x='type', y='count')
-                fig3.update_layout(showlegend=False, height=450, xaxis_tickangle=-45, margin=dict(t=0, b=0, l=0, r=0))
-            else:
-                fig3 = px.line(type_counts, x='type', y='count', markers=True)
-                fig3.update_layout(height=450, xaxis_tickangle=-45, margin=dict(t=0, b=0, l=0, r=0))
+            with section("type chart", "figure"):
+                if st.session_state.incident_graph1 == 'bar':
+                    fig3 = px.bar(type_counts, x='type', y='count')
+                    fig3.update_layout(showlegend=False, height=450, xaxis_tickangle=-45, margin=dict(t=0, b=0, l=0, r=0))
+                else:
+                    fig3 = px.line(type_counts, x='type', y='count', markers=True)
+                    fig3.update_layout(height=450, xaxis_tickangle=-45, margin=dict(t=0, b=0, l=0, r=0))
 
-            st.plotly_chart(fig3, use_container_width=True)
+                st.plotly_chart(fig3, use_container_width=True)
 
         with col2:
             st.markdown("##### Severity Breakdown")
@@ -179,17 +185,18 @@ try:
                 if st.button("Pie Chart", key="incident_pie", use_container_width=True):
                     st.session_state.incident_graph2 = 'pie'
 
-            severity_counts = incidents_df['severity'].value_counts().reset_index()
-            severity_counts.columns = ['severity', 'count']
+            with section("incidents by severity"):
+                severity_counts = incidents_by_severity()
 
-            if st.session_state.incident_graph2 == 'bar':
-                fig4 = px.bar(severity_counts, x='severity', y='count', color='severity')
-                fig4.update_layout(showlegend=True, height=450, margin=dict(t=0, b=0, l=0, r=0))
-            else:
-                fig4 = px.pie(severity_counts, values='count', names='severity')
-                fig4.update_layout(height=450, margin=dict(t=0, b=0, l=0, r=0))
+            with section("severity chart", "figure"):
+                if st.session_state.incident_graph2 == 'bar':
+                    fig4 = px.bar(severity_counts, x='severity', y='count', color='severity')
+                    fig4.update_layout(showlegend=True, height=450, margin=dict(t=0, b=0, l=0, r=0))
+                else:
+                    fig4 = px.pie(severity_counts, values='count', names='severity')
+                    fig4.update_layout(height=450, margin=dict(t=0, b=0, l=0, r=0))
 
-            st.plotly_chart(fig4, use_container_width=True)
+                st.plotly_chart(fig4, use_container_width=True)
 
     # ========== TICKETS TAB ==========
     with tab3:
@@ -211,17 +218,18 @@ try:
                 if st.button("Pie Chart", key="ticket_pie", use_container_width=True):
                     st.session_state.ticket_graph1 = 'pie'
 
-            priority_counts = tickets_df['priority'].value_counts().reset_index()
-            priority_counts.columns = ['priority', 'count']
+            with section("tickets by priority"):
+                priority_counts = tickets_by_priority()
 
-            if st.session_state.ticket_graph1 == 'bar':
-                fig5 = px.bar(priority_counts, x='priority', y='count', color='priority')
-                fig5.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
-            else:
-                fig5 = px.pie(priority_counts, values='count', names='priority')
-                fig5.update_layout(height=450, margin=dict(t=0, b=0, l=0, r=0))
+            with section("priority chart", "figure"):
+                if st.session_state.ticket_graph1 == 'bar':
+                    fig5 = px.bar(priority_counts, x='priority', y='count', color='priority')
+                    fig5.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
+                else:
+                    fig5 = px.pie(priority_counts, values='count', names='priority')
+                    fig5.update_layout(height=450, margin=dict(t=0, b=0, l=0, r=0))
 
-            st.plotly_chart(fig5, use_container_width=True)
+                st.plotly_chart(fig5, use_container_width=True)
 
         with col2:
             st.markdown("##### Tickets by Status")
@@ -237,18 +245,21 @@ try:
                 if st.button("Donut Chart", key="ticket_donut", use_container_width=True):
                     st.session_state.ticket_graph2 = 'donut'
 
-            ticket_status_counts = tickets_df['status'].value_counts().reset_index()
-            ticket_status_counts.columns = ['status', 'count']
+            with section("tickets by status"):
+                ticket_status_counts = tickets_by_status()
 
-            if st.session_state.ticket_graph2 == 'bar':
-                fig6 = px.bar(ticket_status_counts, x='status', y='count', color='status')
-                fig6.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
-            else:
-                fig6 = px.pie(ticket_status_counts, values='count', names='status', hole=0.4)
-                fig6.update_layout(height=450, margin=dict(t=0, b=0, l=0, r=0))
+            with section("status chart", "figure"):
+                if st.session_state.ticket_graph2 == 'bar':
+                    fig6 = px.bar(ticket_status_counts, x='status', y='count', color='status')
+                    fig6.update_layout(showlegend=False, height=450, margin=dict(t=0, b=0, l=0, r=0))
+                else:
+                    fig6 = px.pie(ticket_status_counts, values='count', names='status', hole=0.4)
+                    fig6.update_layout(height=450, margin=dict(t=0, b=0, l=0, r=0))
 
-            st.plotly_chart(fig6, use_container_width=True)
+                st.plotly_chart(fig6, use_container_width=True)
 
 except Exception as e:
     st.error(f"Error loading data: {str(e)}")
     st.info("Please ensure the database is properly initialized and contains data.")
+
+render_diagnostics()
@@ -1,7 +1,13 @@
 import streamlit as st
-import pandas as pd
 import sqlite3
 from datetime import datetime
+from app.data.db import connect_database
+from app.data.cache import cached, bump_version
+from app.data.pagination import keyset_page, PAGE_SIZE
+from app.data.search import search_incidents, search_tickets
+from app.data.schema import ensure_schema
+from app.data.categories import table_encoder
+from app.services.profiler import start_page, section, render_diagnostics
 
 st.set_page_config(page_title="CRUD Operations", page_icon="⚙️", layout="wide")
 
@@ -9,6 +15,9 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.error("Please log in first!")
     st.stop()
 
+# Time this rerun (diagnostics in the sidebar for admins)
+start_page("CRUD Operations")
+
 with st.sidebar:
     st.write(f"User: {st.session_state.username}")
     st.write(f"Role: {st.session_state.role.upper()}")
@@ -16,14 +25,41 @@ with st.sidebar:
 
 st.title("⚙️ CRUD Operations Management")
 
+# Tables (and the columns written below) exist before anything is read
+ensure_schema()
+
 # ============================================
 # DATABASE CONNECTION
 # ============================================
 
 def connect_db():
-    conn = sqlite3.connect('intelligence_platform.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled and traced like every other query (rows are sqlite3.Row)
+    return connect_database()
+
+# ============================================
+# PAGED READS
+# ============================================
+
+def _fetch_page(table_name, order_column, after, before, page_size):
+    conn = connect_db()
+    try:
+        # Tables loaded straight from a CSV may not have the date column
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+        if order_column not in columns:
+            order_column = None
+        return keyset_page(conn, table_name, order_column, after, before, page_size)
+    finally:
+        conn.close()
+
+def read_page(table_name, order_column=None, after=None, before=None, page_size=PAGE_SIZE):
+    # One keyset page, newest first; cached until the table is written
+    # (errors are not cached). Returns None, after showing the error, if the
+    # table cannot be read (e.g. it does not exist yet).
+    try:
+        return cached(table_name)(_fetch_page)(table_name, order_column, after, before, page_size)
+    except sqlite3.OperationalError as e:
+        st.error(str(e))
+        return None
 
 # ============================================
 # CYBER INCIDENTS CRUD
@@ -33,27 +69,25 @@ def create_incident(title, description, severity, status, source_ip, target_ip):
     conn = connect_db()
     cursor = conn.cursor()
     try:
+        now = datetime.now()
+        # Severity/status are stored as lookup ids
+        encode = table_encoder(conn, "cyber_incidents")
         cursor.execute("""
-            INSERT INTO cyber_incidents (title, description, severity, status, source_ip, target_ip, created_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (title, description, severity, status, source_ip, target_ip, datetime.now()))
+            INSERT INTO cyber_incidents (date, title, description, severity, status, source_ip, target_ip, created_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (now.strftime("%Y-%m-%d"), title, description, encode("severity", severity),
+              encode("status", status), source_ip, target_ip, now))
         conn.commit()
+        bump_version("cyber_incidents")
         return True, "Incident created successfully"
     except Exception as e:
         return False, str(e)
     finally:
         conn.close()
 
-def read_incidents(limit=100):
-    conn = connect_db()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT * FROM cyber_incidents LIMIT ?", (limit,))
-        return cursor.fetchall()
-    except Exception as e:
-        return []
-    finally:
-        conn.close()
+def read_incidents(after=None, before=None, page_size=PAGE_SIZE, order_by="id"):
+    # order_by: "id" or "date" (date, then id)
+    return read_page("cyber_incidents", "date" if order_by == "date" else None, after, before, page_size)
 
 def update_incident(incident_id, title=None, description=None, severity=None, status=None, source_ip=None, target_ip=None):
     conn = connect_db()
@@ -61,11 +95,12 @@ def update_incident(incident_id, title=None, description=None, severity=None, st
     try:
         updates = []
         params = []
+        encode = table_encoder(conn, "cyber_incidents")
         
         if title: updates.append("title = ?"); params.append(title)
         if description: updates.append("description = ?"); params.append(description)
-        if severity: updates.append("severity = ?"); params.append(severity)
-        if status: updates.append("status = ?"); params.append(status)
+        if severity: updates.append("severity = ?"); params.append(encode("severity", severity))
+        if status: updates.append("status = ?"); params.append(encode("status", status))
         if source_ip: updates.append("source_ip = ?"); params.append(source_ip)
         if target_ip: updates.append("target_ip = ?"); params.append(target_ip)
         
@@ -76,6 +111,7 @@ def update_incident(incident_id, title=None, description=None, severity=None, st
         query = f"UPDATE cyber_incidents SET {', '.join(updates)} WHERE id = ?"
         cursor.execute(query, params)
         conn.commit()
+        bump_version("cyber_incidents")
         return True, "Incident updated successfully"
     except Exception as e:
         return False, str(e)
@@ -88,6 +124,7 @@ def delete_incident(incident_id):
     try:
         cursor.execute("DELETE FROM cyber_incidents WHERE id = ?", (incident_id,))
         conn.commit()
+        bump_version("cyber_incidents")
         return True, "Incident deleted successfully"
     except Exception as e:
         return False, str(e)
@@ -102,27 +139,24 @@ def create_ticket(title, description, status, priority, assigned_to, category):
     conn = connect_db()
     cursor = conn.cursor()
     try:
+        encode = table_encoder(conn, "it_tickets")
+        # ticket_id follows the TKT-00042 pattern of the imported tickets
         cursor.execute("""
-            INSERT INTO it_tickets (title, description, status, priority, assigned_to, category, created_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (title, description, status, priority, assigned_to, category, datetime.now()))
+            INSERT INTO it_tickets (ticket_id, subject, description, status, priority, assigned_to, category, created_date)
+            VALUES ('TKT-' || printf('%05d', (SELECT IFNULL(MAX(id), 0) + 1 FROM it_tickets)), ?, ?, ?, ?, ?, ?, ?)
+        """, (title, description, encode("status", status), encode("priority", priority),
+              assigned_to, category, datetime.now()))
         conn.commit()
+        bump_version("it_tickets")
         return True, "Ticket created successfully"
     except Exception as e:
         return False, str(e)
     finally:
         conn.close()
 
-def read_tickets(limit=100):
-    conn = connect_db()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT * FROM it_tickets LIMIT ?", (limit,))
-        return cursor.fetchall()
-    except Exception as e:
-        return []
-    finally:
-        conn.close()
+def read_tickets(after=None, before=None, page_size=PAGE_SIZE, order_by="id"):
+    # order_by: "id" or "date" (created_date, then id)
+    return read_page("it_tickets", "created_date" if order_by == "date" else None, after, before, page_size)
 
 def update_ticket(ticket_id, title=None, description=None, status=None, priority=None, assigned_to=None, category=None):
     conn = connect_db()
@@ -130,11 +164,12 @@ def update_ticket(ticket_id, title=None, description=None, status=None, priority
     try:
         updates = []
         params = []
+        encode = table_encoder(conn, "it_tickets")
         
-        if title: updates.append("title = ?"); params.append(title)
+        if title: updates.append("subject = ?"); params.append(title)
         if description: updates.append("description = ?"); params.append(description)
-        if status: updates.append("status = ?"); params.append(status)
-        if priority: updates.append("priority = ?"); params.append(priority)
+        if status: updates.append("status = ?"); params.append(encode("status", status))
+        if priority: updates.append("priority = ?"); params.append(encode("priority", priority))
         if assigned_to: updates.append("assigned_to = ?"); params.append(assigned_to)
         if category: updates.append("category = ?"); params.append(category)
         
@@ -145,6 +180,7 @@ def update_ticket(ticket_id, title=None, description=None, status=None, priority
         query = f"UPDATE it_tickets SET {', '.join(updates)} WHERE id = ?"
         cursor.execute(query, params)
         conn.commit()
+        bump_version("it_tickets")
         return True, "Ticket updated successfully"
     except Exception as e:
         return False, str(e)
@@ -157,6 +193,7 @@ def delete_ticket(ticket_id):
     try:
         cursor.execute("DELETE FROM it_tickets WHERE id = ?", (ticket_id,))
         conn.commit()
+        bump_version("it_tickets")
         return True, "Ticket deleted successfully"
     except Exception as e:
         return False, str(e)
@@ -172,26 +209,20 @@ def create_dataset(name, description, category, owner, format, file_path):
     cursor = conn.cursor()
     try:
         cursor.execute("""
-            INSERT INTO datasets_metadata (name, description, category, owner, format, file_path, created_date)
+            INSERT INTO datasets_metadata (dataset_name, description, category, owner, format, file_path, created_date)
             VALUES (?, ?, ?, ?, ?, ?, ?)
         """, (name, description, category, owner, format, file_path, datetime.now()))
         conn.commit()
+        bump_version("datasets_metadata")
         return True, "Dataset created successfully"
     except Exception as e:
         return False, str(e)
     finally:
         conn.close()
 
-def read_datasets(limit=100):
-    conn = connect_db()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT * FROM datasets_metadata LIMIT ?", (limit,))
-        return cursor.fetchall()
-    except Exception as e:
-        return []
-    finally:
-        conn.close()
+def read_datasets(after=None, before=None, page_size=PAGE_SIZE, order_by="id"):
+    # order_by: "id" or "date" (last_updated, then id)
+    return read_page("datasets_metadata", "last_updated" if order_by == "date" else None, after, before, page_size)
 
 def update_dataset(dataset_id, name=None, description=None, category=None, owner=None, format=None, file_path=None):
     conn = connect_db()
@@ -200,7 +231,7 @@ def update_dataset(dataset_id, name=None, description=None, category=None, owner
         updates = []
         params = []
         
-        if name: updates.append("name = ?"); params.append(name)
+        if name: updates.append("dataset_name = ?"); params.append(name)
         if description: updates.append("description = ?"); params.append(description)
         if category: updates.append("category = ?"); params.append(category)
         if owner: updates.append("owner = ?"); params.append(owner)
@@ -214,6 +245,7 @@ def update_dataset(dataset_id, name=None, description=None, category=None, owner
         query = f"UPDATE datasets_metadata SET {', '.join(updates)} WHERE id = ?"
         cursor.execute(query, params)
         conn.commit()
+        bump_version("datasets_metadata")
         return True, "Dataset updated successfully"
     except Exception as e:
         return False, str(e)
@@ -226,12 +258,76 @@ def delete_dataset(dataset_id):
     try:
         cursor.execute("DELETE FROM datasets_metadata WHERE id = ?", (dataset_id,))
         conn.commit()
+        bump_version("datasets_metadata")
         return True, "Dataset deleted successfully"
     except Exception as e:
         return False, str(e)
     finally:
         conn.close()
 
+# ============================================
+# UI - PAGED TABLE
+# ============================================
+
+def paged_table(key, reader):
+    # Show one page of a table with previous/next controls.
+    # The cursor lives in session_state; returns False if there are no rows
+    # (True if the table could not be read: the reader showed why).
+    col1, col2 = st.columns(2)
+    with col1:
+        order_by = st.radio("Order By", ["id", "date"], horizontal=True, key=f"{key}_order")
+    with col2:
+        page_size = st.selectbox("Rows per Page", [25, 50, 100, 250], index=1, key=f"{key}_page_size")
+    
+    # A cursor only makes sense for the ordering it was taken with
+    if st.session_state.get(f"{key}_page_filter") != (order_by, page_size):
+        st.session_state[f"{key}_page_filter"] = (order_by, page_size)
+        st.session_state[f"{key}_cursor"] = {}
+    
+    with section(f"{key} page"):
+        page = reader(page_size=page_size, order_by=order_by, **st.session_state[f"{key}_cursor"])
+    if page is None:
+        return True
+    if page["rows"].empty:
+        return False
+    
+    with section(f"{key} table", "table"):
+        st.dataframe(page["rows"], use_container_width=True)
+    
+    col1, col2, col3 = st.columns([1, 4, 1])
+    with col1:
+        if st.button("◀ Previous", key=f"{key}_previous", disabled=not page["has_previous"], use_container_width=True):
+            st.session_state[f"{key}_cursor"] = {"before": page["first"]}
+            st.rerun()
+    with col2:
+        st.caption(f"{len(page['rows'])} rows, ids {page['rows']['id'].min()} to {page['rows']['id'].max()}")
+    with col3:
+        if st.button("Next ▶", key=f"{key}_next", disabled=not page["has_next"], use_container_width=True):
+            st.session_state[f"{key}_cursor"] = {"after": page["last"]}
+            st.rerun()
+    return True
+
+def search_box(key, search, label):
+    # Full-text search above a table; returns True if a search was run
+    query = st.text_input(f"Search {label}", placeholder="Words to find (word* matches a prefix)", key=f"{key}_search")
+    if not query:
+        return False
+    
+    try:
+        with section(f"{key} search"):
+            results = search(query, limit=50)
+    except Exception as e:
+        st.error(f"Search failed: {e}")
+        return True
+    
+    if results.empty:
+        st.info(f"No matching {label}")
+    else:
+        st.caption(f"Top {len(results)} matches, best first")
+        for _, row in results.iterrows():
+            st.markdown(f"**#{row['id']}** — {row['snippet']}")
+    return True
+
 # ============================================
 # UI - CRUD TYPE SELECTOR
 # ============================================
@@ -276,12 +372,9 @@ if crud_type == "Cyber Incidents":
     
     elif operation == "Read":
         st.write("### View All Incidents")
-        incidents = read_incidents(limit=100)
-        if incidents:
-            df = pd.DataFrame([dict(row) for row in incidents])
-            st.dataframe(df, use_container_width=True)
-        else:
-            st.info("No incidents found")
+        if not search_box("incidents", search_incidents, "incidents"):
+            if not paged_table("incidents", read_incidents):
+                st.info("No incidents found")
     
     elif operation == "Update":
         st.write("### Update Incident")
@@ -355,12 +448,9 @@ elif crud_type == "IT Tickets":
     
     elif operation == "Read":
         st.write("### View All Tickets")
-        tickets = read_tickets(limit=100)
-        if tickets:
-            df = pd.DataFrame([dict(row) for row in tickets])
-            st.dataframe(df, use_container_width=True)
-        else:
-            st.info("No tickets found")
+        if not search_box("tickets", search_tickets, "tickets"):
+            if not paged_table("tickets", read_tickets):
+                st.info("No tickets found")
     
     elif operation == "Update":
         st.write("### Update Ticket")
@@ -434,11 +524,7 @@ elif crud_type == "Datasets":
     
     elif operation == "Read":
         st.write("### View All Datasets")
-        datasets = read_datasets(limit=100)
-        if datasets:
-            df = pd.DataFrame([dict(row) for row in datasets])
-            st.dataframe(df, use_container_width=True)
-        else:
+        if not paged_table("datasets", read_datasets):
             st.info("No datasets found")
     
     elif operation == "Update":
@@ -479,4 +565,6 @@ elif crud_type == "Datasets":
                 st.success(msg)
                 st.rerun()
             else:
-                st.error(msg)
\ No newline at end of file
+                st.error(msg)
+
+render_diagnostics()
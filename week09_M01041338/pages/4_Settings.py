@@ -1,4 +1,8 @@
 import streamlit as st
+from app.data.cache import cache_stats, clear_cache
+from app.data.snapshots import drop_snapshots
+from app.data.tracing import query_stats, slow_queries, reset_query_stats, SLOW_QUERY_MS
+from app.services.profiler import start_page, render_diagnostics
 
 st.set_page_config(
     page_title="Settings",
@@ -10,13 +14,16 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.error("Please log in first!")
     st.stop()
 
+# Time this rerun (diagnostics in the sidebar for admins)
+start_page("Settings")
+
 with st.sidebar:
     st.write(f"User: {st.session_state.username}")
     st.write(f"Role: {st.session_state.role.upper()}")
 
 st.title("Settings")
 
-tab1, tab2, tab3 = st.tabs(["Profile", "Preferences", "About"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["Profile", "Preferences", "Cache", "Queries", "About"])
 
 with tab1:
     st.subheader("User Profile")
@@ -61,6 +68,77 @@ with tab2:
         st.success("Preferences saved!")
 
 with tab3:
+    st.subheader("Read Cache")
+    
+    # Hit/miss counters of the shared data cache (app/data/cache.py)
+    stats = cache_stats()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hits", stats["hits"])
+    col2.metric("Misses", stats["misses"])
+    col3.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+    col4.metric("Cached Results", stats["entries"])
+    
+    # Write version per table (goes up on every insert/update/delete)
+    if stats["versions"]:
+        st.write("Table versions:")
+        st.dataframe(
+            [{"table": table, "version": version} for table, version in sorted(stats["versions"].items())],
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    if st.button("Clear Cache"):
+        clear_cache()
+        drop_snapshots()
+        st.success("Cache cleared!")
+
+with tab4:
+    st.subheader("Query Statistics")
+    
+    # Collected by the traced connections in app/data/tracing.py since the app started
+    if st.session_state.role != "admin":
+        st.info("Only admins can view query statistics")
+    else:
+        if st.button("Reset Query Statistics"):
+            reset_query_stats()
+            st.success("Query statistics reset!")
+        
+        top = query_stats(limit=20)
+        if top:
+            st.write("Queries that took the most time in total (ms; percentiles over recent calls):")
+            st.dataframe(
+                [
+                    {
+                        "query": q["fingerprint"],
+                        "calls": q["calls"],
+                        "total": round(q["total_ms"], 1),
+                        "mean": round(q["mean_ms"], 2),
+                        "p50": round(q["p50_ms"], 2),
+                        "p95": round(q["p95_ms"], 2),
+                        "p99": round(q["p99_ms"], 2),
+                        "rows": q["rows"],
+                        "called from": q["top_caller"],
+                    }
+                    for q in top
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("No queries recorded yet")
+        
+        slow = slow_queries(limit=20)
+        st.write(f"Slowest recent queries (over {SLOW_QUERY_MS:g} ms):")
+        if slow:
+            st.dataframe(
+                [{"time": q["time"], "ms": q["ms"], "rows": q["rows"],
+                  "called from": q["caller"], "query": q["fingerprint"]} for q in slow],
+                use_container_width=True,
+                hide_index=True
+            )
+
+with tab5:
     st.subheader("About")
     
     st.markdown("""
@@ -88,4 +166,6 @@ with tab3:
     - Instructor: Teaching Guide
     
     Support: For technical issues, contact your instructor.
-    """)
\ No newline at end of file
+    """)
+
+render_diagnostics()
@@ -1,4 +1,5 @@
 import streamlit as st
+from app.data.schema import ensure_schema
 from app.services.user_service import login_user, register_user
 
 # Initialize session state
@@ -11,6 +12,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Tables, migrations and indexes (once per database file per process)
+ensure_schema()
+
 # ---------------- LOGIN / REGISTER ----------------
 if not st.session_state.logged_in:
     st.markdown("<h1 style='text-align: center;'>📊 Week 10 Dashboard</h1>", unsafe_allow_html=True)
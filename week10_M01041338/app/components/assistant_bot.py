@@ -1,86 +1,121 @@
 import streamlit as st
 import pandas as pd
-from openai import OpenAI
+from app.services.assistant_client import stream_reply, MODEL, TEMPERATURE
+from app.data.assistant_cache import cache_scope, lookup, store
+from app.services.dataset_profile import summarize_frame, summarize_counts
+from app.services.chat_history import ChatHistory
+from app.services.retrieval import question_context
 
-# Display an error message showing which file loaded the assistant
-st.error(f"ASSISTANT BOT LOADED FROM: {__file__}")
-
-# Create and return an OpenAI client using the API key from Streamlit secrets
-def _client():
-    return OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-
-# Generate a short text summary of the dataframe
-def _df_summary(df: pd.DataFrame) -> str:
-    cols = list(df.columns)
-    lines = [f"Rows: {len(df)}", f"Columns: {', '.join(cols)}"]
-
-    # For object/string columns, find the most common value
-    for c in cols:
-        if df[c].dtype == "object" and len(df) > 0:
-            try:
-                lines.append(f"Top {c}: {df[c].value_counts().idxmax()}")
-            except Exception:
-                pass
-
-    return "\n".join(lines)
+# API key from Streamlit secrets (the client itself is shared, see assistant_client.py)
+def _api_key():
+    return st.secrets["OPENAI_API_KEY"]
 
 # Render the AI assistant UI for a specific page and dataframe
-def render_assistant(df: pd.DataFrame, page_name: str):
+# (search_tables: tables whose rows matching each question go in the prompt;
+# counts: df is a frame of counts, e.g. get_incident_counts(), summarized as
+# totals over every row it counts)
+def render_assistant(df: pd.DataFrame, page_name: str, search_tables=(), counts=False):
     st.markdown("---")
     st.subheader(f"🤖 OpenAI Assistant — {page_name}")
 
     # Unique key for storing chat history per page
     hist_key = f"chat_msgs_{page_name}"
 
-    # Initialize chat history if it does not exist
-    if hist_key not in st.session_state:
-        st.session_state[hist_key] = []
+    # Initialize chat history if it does not exist (bounded in tokens, see chat_history.py)
+    if not isinstance(st.session_state.get(hist_key), ChatHistory):
+        st.session_state[hist_key] = ChatHistory()
+    history = st.session_state[hist_key]
 
     # System prompt that defines assistant behavior and dataset context
+    # (column profile or totals within its token budget, cached while the data is unchanged)
+    summary = summarize_counts(df) if counts else summarize_frame(df)
     system_prompt = (
         "You are an AI assistant inside a Streamlit dashboard.\n"
         f"Context: {page_name}\n\n"
         "Dataset summary:\n"
-        f"{_df_summary(df)}\n\n"
+        f"{summary}\n\n"
         "Rules:\n"
         "- Be clear and concise.\n"
         "- Do not invent columns.\n"
+        "- If rows matching the question are listed, answer from them and cite their ids.\n"
     )
 
-    # Display previous chat messages
-    for m in st.session_state[hist_key]:
+    # Display previous chat messages (older ones live on only in the summary)
+    if history.folded:
+        st.caption(f"{history.folded} earlier messages are kept as a summary")
+    for m in history.messages:
         with st.chat_message(m["role"]):
             st.markdown(m["content"])
 
     # Button to clear the chat history
     if st.button("Clear Chat", use_container_width=True, key=f"clear_{page_name}"):
-        st.session_state[hist_key] = []
+        st.session_state[hist_key] = ChatHistory()
         st.rerun()
 
     # Input box for user messages
     user_msg = st.chat_input("Ask the AI (e.g. 'summarize', 'risks', 'priorities')")
 
     if user_msg:
+        # Rows matching the question, from the search index (see retrieval.py)
+        try:
+            context = question_context(user_msg, search_tables)
+        except Exception:
+            context = {"text": "", "rows": 0}   # the chat works without them
+        if context["text"]:
+            system_prompt += f"\n{context['text']}\n"
+
+        # Cache key for this question: page, data (and matching rows), model
+        # and the turns before it
+        scope = cache_scope(page_name, summary + context["text"], MODEL, TEMPERATURE, history.turns())
+
         # Store and display user message
-        st.session_state[hist_key].append({"role": "user", "content": user_msg})
+        history.append("user", user_msg)
         with st.chat_message("user"):
             st.markdown(user_msg)
 
-        # Combine system prompt with conversation history
-        messages = [{"role": "system", "content": system_prompt}] + st.session_state[hist_key]
+        # System prompt, a summary of older turns and the latest turns,
+        # within the request's token budget
+        messages = history.request_messages(system_prompt)
 
+        # Same question about the same data answered before: reply at once
         try:
-            # Send the conversation to OpenAI
-            resp = _client().chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.3,
-            )
-            reply = resp.choices[0].message.content
+            hit = lookup(scope, user_msg)
+        except Exception:
+            hit = None          # a cache problem must not stop the chat
+        if hit:
+            history.append("assistant", hit["reply"])
+            with st.chat_message("assistant"):
+                st.markdown(hit["reply"])
+                note = " · similar question" if hit["similarity"] < 1 else ""
+                st.caption(f"cached · saved {hit['seconds']:.1f}s{note}")
+            return
+
+        # Stream the reply as it arrives. Clicking Stop (or any other widget)
+        # reruns the page, which closes the stream; what arrived is kept.
+        stop_slot = st.empty()
+        stop_slot.button("Stop", key=f"stop_{page_name}")
+        try:
+            reply = stream_reply(_api_key(), messages)
         except Exception as e:
-            reply = f"OpenAI error: {e}"
+            history.append("assistant", f"OpenAI error: {e}")
+            with st.chat_message("assistant"):
+                st.markdown(f"OpenAI error: {e}")
+            return
 
-        # Store and display assistant response
-        st.session_state[hist_key].append({"role": "assistant", "content": reply})
-        with st.chat_message("assistant"):
-            st.markdown(reply)
+        try:
+            with st.chat_message("assistant"):
+                st.write_stream(reply)
+                rows = f" · {context['rows']} matching rows" if context["rows"] else ""
+                st.caption(f"{reply.summary()} · {history.last_request['tokens']} prompt tokens{rows}")
+        finally:
+            reply.close()
+            stop_slot.empty()
+            # Store the assistant response (the part received, if it was stopped)
+            history.append("assistant", reply.text or f"OpenAI error: {reply.error or 'no reply'}")
+
+        # Only complete replies are cached
+        if reply.status == "ok":
+            try:
+                store(scope, user_msg, reply.text, reply.seconds)
+            except Exception:
+                pass
@@ -0,0 +1,212 @@
+# Response cache for the assistant panel
+#
+# Analysts ask the same questions ("summarize", "risks") about the same data
+# again and again, and each one used to wait for the model. Replies are
+# kept in the assistant_cache table of the app database, keyed on a hash of
+#
+#   page, fingerprint of the data summary the model is shown, the question
+#   (lower case, punctuation and extra spaces dropped), model, temperature,
+#   and the earlier turns of the conversation
+#
+# The earlier turns are part of the key so a follow-up such as "why?" is only
+# answered from the cache after the same conversation; a question at the
+# start of a chat matches any earlier chat about the same data.
+#
+# Entries expire TTL seconds after they were stored; beyond MAX_ENTRIES the
+# least recently used ones are dropped. With SIMILARITY set (0..1), a
+# question that is only close to a cached one ("summarise the data" /
+# "summarize the data") is also a hit, if everything else in the key matches.
+#
+# Settings (environment):
+#   ASSISTANT_CACHE=0                   no cache
+#   ASSISTANT_CACHE_TTL                 seconds a reply stays valid (default 86400)
+#   ASSISTANT_CACHE_MAX_ENTRIES         default 1000
+#   ASSISTANT_CACHE_SIMILARITY          near-duplicate threshold, e.g. 0.9 (default 0 = exact only)
+
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import app.data.db as db
+from app.data.db import connect_database
+
+ENABLED = os.environ.get("ASSISTANT_CACHE", "1") != "0"
+TTL = float(os.environ.get("ASSISTANT_CACHE_TTL", 24 * 60 * 60))
+MAX_ENTRIES = int(os.environ.get("ASSISTANT_CACHE_MAX_ENTRIES", 1000))
+SIMILARITY = float(os.environ.get("ASSISTANT_CACHE_SIMILARITY", 0))
+
+_ready = set()            # database files with the table
+_lock = threading.Lock()
+_stats = {"hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "saved_s": 0.0}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def create_assistant_cache_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS assistant_cache (
+            key TEXT PRIMARY KEY,
+            scope TEXT NOT NULL,
+            question TEXT NOT NULL,
+            reply TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_assistant_cache_scope ON assistant_cache(scope)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_assistant_cache_last_used ON assistant_cache(last_used)")
+    conn.commit()
+
+
+def _connect():
+    conn = connect_database()
+    with _lock:
+        ready = db.DATABASE_FILE in _ready
+    if not ready:
+        create_assistant_cache_table(conn)
+        with _lock:
+            _ready.add(db.DATABASE_FILE)
+    return conn
+
+
+def normalize_question(question):
+    # "  Summarize the data!! " -> "summarize the data"
+    text = _PUNCTUATION.sub(" ", question.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def _hash(*parts):
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def cache_scope(page_name, data_summary, model, temperature, history=()):
+    # Everything in the key except the question: page, data, model settings
+    # and the earlier turns ({"role", "content"} dicts; questions normalized)
+    turns = [
+        (m["role"], normalize_question(m["content"]) if m["role"] == "user" else m["content"])
+        for m in history
+    ]
+    return _hash(page_name, _hash(data_summary), model, float(temperature), turns)
+
+
+def lookup(scope, question):
+    # The cached reply for this question as {"reply", "seconds", "similarity"},
+    # or None. seconds is how long the model took to write it.
+    if not ENABLED:
+        return None
+    normalized = normalize_question(question)
+    now = time.time()
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT key, reply, seconds, created_at FROM assistant_cache WHERE key = ?",
+            (_hash(scope, normalized),)
+        ).fetchone()
+        similarity = 1.0
+        if (row is None or row["created_at"] < now - TTL) and SIMILARITY > 0:
+            row, similarity = _closest(conn, scope, normalized, now)
+        if row is None or row["created_at"] < now - TTL:
+            with _lock:
+                _stats["misses"] += 1
+            return None
+
+        conn.execute(
+            "UPDATE assistant_cache SET last_used = ?, hits = hits + 1 WHERE key = ?",
+            (now, row["key"])
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    with _lock:
+        _stats["hits"] += 1
+        _stats["saved_s"] += row["seconds"]
+        if similarity < 1.0:
+            _stats["similar_hits"] += 1
+    return {"reply": row["reply"], "seconds": row["seconds"], "similarity": similarity}
+
+
+def _closest(conn, scope, normalized, now):
+    # Most similar unexpired question in the scope, if above SIMILARITY
+    best, best_ratio = None, 0.0
+    rows = conn.execute(
+        "SELECT key, question, reply, seconds, created_at FROM assistant_cache "
+        "WHERE scope = ? AND created_at >= ?",
+        (scope, now - TTL)
+    ).fetchall()
+    for row in rows:
+        ratio = difflib.SequenceMatcher(None, normalized, row["question"]).ratio()
+        if ratio > best_ratio:
+            best, best_ratio = row, ratio
+    if best_ratio >= SIMILARITY:
+        return best, best_ratio
+    return None, 0.0
+
+
+def store(scope, question, reply, seconds):
+    # Keep a finished reply (seconds: how long the model took)
+    if not ENABLED:
+        return
+    normalized = normalize_question(question)
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("""
+            INSERT INTO assistant_cache (key, scope, question, reply, seconds, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                reply = excluded.reply,
+                seconds = excluded.seconds,
+                created_at = excluded.created_at,
+                last_used = excluded.last_used
+        """, (_hash(scope, normalized), scope, normalized, reply, seconds, now, now))
+        evicted = _evict(conn, now)
+        conn.commit()
+    finally:
+        conn.close()
+    with _lock:
+        _stats["stores"] += 1
+        _stats["evictions"] += evicted
+
+
+def _evict(conn, now):
+    # Drop expired entries, then the least recently used beyond MAX_ENTRIES
+    expired = conn.execute("DELETE FROM assistant_cache WHERE created_at < ?", (now - TTL,)).rowcount
+    overflow = conn.execute("""
+        DELETE FROM assistant_cache WHERE key IN (
+            SELECT key FROM assistant_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )
+    """, (MAX_ENTRIES,)).rowcount
+    return expired + overflow
+
+
+def assistant_cache_stats():
+    # Hits, misses, hit rate and model time saved since the app started,
+    # plus the entries currently stored
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    conn = _connect()
+    try:
+        stats["entries"] = conn.execute("SELECT COUNT(*) FROM assistant_cache").fetchone()[0]
+    finally:
+        conn.close()
+    return stats
+
+
+def clear_assistant_cache():
+    # Forget every cached reply (the counters are kept)
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM assistant_cache")
+        conn.commit()
+    finally:
+        conn.close()
@@ -1,34 +1,59 @@
 import pandas as pd
 from app.data.db import connect_database
+from app.data.bulk import as_rows, write_many
+from app.data.rollups import rollup_counts
+from app.data.timeseries import time_series
+from app.data.cache import cached, bump_version
+from app.data.pagination import keyset_page, PAGE_SIZE
+from app.data.categories import table_encoder, decode_frame
+from app.data.snapshots import read_snapshot
 
 
 # CREATE
 def insert_incident(date, incident_type, severity, status, description, reported_by=None):
     conn = connect_database()
+    encode = table_encoder(conn, "cyber_incidents")
     cursor = conn.cursor()
     cursor.execute("""
         INSERT INTO cyber_incidents
         (date, incident_type, severity, status, description, reported_by)
         VALUES (?, ?, ?, ?, ?, ?)
-    """, (date, incident_type, severity, status, description, reported_by))
+    """, (date, encode("incident_type", incident_type), encode("severity", severity),
+          encode("status", status), description, reported_by))
     conn.commit()
     incident_id = cursor.lastrowid
     conn.close()
+    bump_version("cyber_incidents")
     return incident_id
 
 
 # READ (all)
 def get_all_incidents():
+    # Newest first, from the columnar snapshot (rebuilt after each write)
+    return read_snapshot("cyber_incidents")
+
+
+# READ (one page, newest first)
+@cached("cyber_incidents")
+def get_incidents_page(after=None, before=None, page_size=PAGE_SIZE, order_by="id", severities=None):
+    # Keyset page ordered by id or by (date, id); pass the "last"/"first"
+    # cursor of the current page as after/before to move forward/back
+    if order_by not in ("id", "date"):
+        raise ValueError(f"Cannot order incidents by {order_by}")
     conn = connect_database()
-    df = pd.read_sql_query(
-        "SELECT * FROM cyber_incidents ORDER BY id DESC",
-        conn
-    )
-    conn.close()
-    return df
+    try:
+        return keyset_page(
+            conn, "cyber_incidents",
+            order_column="date" if order_by == "date" else None,
+            after=after, before=before, page_size=page_size,
+            filters={"severity": severities} if severities is not None else None
+        )
+    finally:
+        conn.close()
 
 
 # READ (single)  ← ADDED
+@cached("cyber_incidents")
 def get_incident_by_id(incident_id):
     conn = connect_database()
     df = pd.read_sql_query(
@@ -37,19 +62,21 @@ def get_incident_by_id(incident_id):
         params=(incident_id,)
     )
     conn.close()
-    return df
+    return decode_frame("cyber_incidents", df)
 
 
 # UPDATE (status only – kept as-is)
 def update_incident_status(incident_id, new_status):
     conn = connect_database()
+    encode = table_encoder(conn, "cyber_incidents")
     cursor = conn.cursor()
     cursor.execute(
         "UPDATE cyber_incidents SET status = ? WHERE id = ?",
-        (new_status, incident_id)
+        (encode("status", new_status), incident_id)
     )
     conn.commit()
     conn.close()
+    bump_version("cyber_incidents")
 
 
 # UPDATE (full record)  ← ADDED
@@ -63,14 +90,17 @@ def update_incident(
     reported_by
 ):
     conn = connect_database()
+    encode = table_encoder(conn, "cyber_incidents")
     cursor = conn.cursor()
     cursor.execute("""
         UPDATE cyber_incidents
         SET date = ?, incident_type = ?, severity = ?, status = ?, description = ?, reported_by = ?
         WHERE id = ?
-    """, (date, incident_type, severity, status, description, reported_by, incident_id))
+    """, (date, encode("incident_type", incident_type), encode("severity", severity),
+          encode("status", status), description, reported_by, incident_id))
     conn.commit()
     conn.close()
+    bump_version("cyber_incidents")
 
 
 # DELETE
@@ -83,16 +113,96 @@ def delete_incident(incident_id):
     )
     conn.commit()
     conn.close()
+    bump_version("cyber_incidents")
+
+
+# READ (analytics – counts for the dashboard)
+@cached("cyber_incidents")
+def get_incident_counts():
+    # One row per (date, type, severity, status) with its incident count,
+    # so pages can filter and chart without loading every incident.
+    # Read from the per-day rollup, so the size depends on days x categories.
+    df = rollup_counts(
+        "cyber_incidents", ["incident_type", "severity", "status"], daily=True
+    )
+    return df.rename(columns={"day": "date"})[["date", "incident_type", "severity", "status", "count"]]
+
+
+# READ (analytics – timeline)
+def get_incident_timeline(bucket=None, split_by=None, severities=None):
+    # Incidents per hour/day/week/month/year, one line per split_by value
+    # (e.g. "severity"); the bucket is widened so the chart stays small.
+    # Returns {"bucket": bucket used, "series": DataFrame [period, split_by?, count]}
+    return time_series(
+        "cyber_incidents", bucket=bucket, split_by=split_by,
+        filters={"severity": severities} if severities is not None else None
+    )
 
 
 # READ (analytics – kept)
+@cached("cyber_incidents")
 def get_incidents_by_type():
+    # Read from the trigger-maintained rollup, not the incidents table
+    return rollup_counts("cyber_incidents", ["incident_type"])
+
+
+# Column order for tuple records in insert_incidents()
+INCIDENT_FIELDS = ("date", "incident_type", "severity", "status", "description", "reported_by")
+
+
+# CREATE (many)
+def insert_incidents(records, chunk_size=None):
+    # Insert many incidents with executemany and return their new ids
+    # records: dicts or tuples in insert_incident() argument order
+    # chunk_size: commit every N incidents instead of once at the end
     conn = connect_database()
-    df = pd.read_sql_query("""
-        SELECT incident_type, COUNT(*) as count
-        FROM cyber_incidents
-        GROUP BY incident_type
-        ORDER BY count DESC
-    """, conn)
-    conn.close()
-    return df
+    try:
+        encode = table_encoder(conn, "cyber_incidents")
+        rows = (
+            tuple(encode(field, value) for field, value in zip(INCIDENT_FIELDS, row))
+            for row in as_rows(records, INCIDENT_FIELDS)
+        )
+        stats = write_many(conn, """
+            INSERT INTO cyber_incidents
+            (date, incident_type, severity, status, description, reported_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows, chunk_size, return_ids=True)
+    finally:
+        conn.close()
+        bump_version("cyber_incidents")
+    return stats["ids"]
+
+
+# UPDATE (status of many)
+def update_incidents_status(incident_ids, new_status, chunk_size=None):
+    # Set the same status on many incidents; returns how many were updated
+    conn = connect_database()
+    try:
+        new_status = table_encoder(conn, "cyber_incidents")("status", new_status)
+        stats = write_many(
+            conn,
+            "UPDATE cyber_incidents SET status = ? WHERE id = ?",
+            ((new_status, int(incident_id)) for incident_id in incident_ids),
+            chunk_size
+        )
+    finally:
+        conn.close()
+        bump_version("cyber_incidents")
+    return stats["affected"]
+
+
+# DELETE (many)
+def delete_incidents(incident_ids, chunk_size=None):
+    # Delete many incidents by ID; returns how many were deleted
+    conn = connect_database()
+    try:
+        stats = write_many(
+            conn,
+            "DELETE FROM cyber_incidents WHERE id = ?",
+            ((int(incident_id),) for incident_id in incident_ids),
+            chunk_size
+        )
+    finally:
+        conn.close()
+        bump_version("cyber_incidents")
+    return stats["affected"]
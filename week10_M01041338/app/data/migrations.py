@@ -0,0 +1,500 @@
+# Schema migrations
+#
+# schema.py creates the tables as they were first designed; every change
+# since then is a numbered migration in MIGRATIONS. Each database records
+# the migrations it has run in schema_version, and migrate() runs the
+# missing ones, oldest first.
+#
+# Migrations are written to run while the app is up:
+#   - new columns use ALTER TABLE ... ADD COLUMN, which rewrites no rows;
+#   - backfills update one range of ids per transaction;
+#   - a table whose constraints change is rebuilt by copy and swap: rows are
+#     copied into a new table one batch per transaction while triggers
+#     mirror the writes that happen meanwhile, then the tables are swapped
+#     in one short transaction.
+# The write lock is held for one batch at a time, never for the whole table.
+# A migration that stops half way can be run again from the start.
+#
+# Run from the command line:
+#   python -m app.data.migrations             apply pending migrations
+#   python -m app.data.migrations --dry-run   list them with estimated rows
+
+import re
+import sqlite3
+import sys
+import time
+
+from app.data.db import connect_database
+from app.data.cache import bump_version
+from app.data.search import SEARCH_INDEXES, drop_search_index
+from app.data.rollups import ROLLUPS, create_rollups, drop_rollups
+from app.data.categories import LOOKUPS, CODED_COLUMNS, coded_columns, encoder
+
+# Rows per transaction for backfills and table copies
+BATCH_SIZE = 5000
+
+
+def create_schema_version_table(conn):
+    # One row per migration that has been applied
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            rows_touched INTEGER,
+            seconds REAL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+
+def _columns(conn, table_name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+
+def applied_versions(conn):
+    if not _columns(conn, "schema_version"):
+        return set()
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+
+def current_version(conn):
+    return max(applied_versions(conn), default=0)
+
+
+def estimate_rows(conn, table_name):
+    # Row count without counting: the ANALYZE statistics if there are any,
+    # else the span of ids (both read a few pages whatever the table size)
+    if not _columns(conn, table_name):
+        return 0
+    try:
+        row = conn.execute(
+            "SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table_name,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    if row and row[0]:
+        return int(str(row[0]).split()[0])
+    low, high = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table_name}").fetchone()
+    return 0 if low is None else high - low + 1
+
+
+def _run_script(conn, statements):
+    # Run statements as one transaction
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        for sql in statements:
+            conn.execute(sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _id_is_unique(conn, table_name):
+    # True if id alone is the table's primary key or has a unique index
+    primary_key = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})") if row[5]]
+    if primary_key == ["id"]:
+        return True
+    for _, name, unique, _, partial in conn.execute(f"PRAGMA index_list({table_name})"):
+        if unique and not partial:
+            if [row[2] for row in conn.execute(f'PRAGMA index_info("{name}")')] == ["id"]:
+                return True
+    return False
+
+
+# --- Building blocks for migrations ---
+# Each returns a list of steps: {"table", "step", "rows"}; with dry_run=True
+# nothing is changed and "rows" is an estimate.
+
+def add_columns(conn, table_name, columns, dry_run=False):
+    # Add the (name, type) columns the table does not have yet
+    existing = _columns(conn, table_name)
+    missing = [(name, column_type) for name, column_type in columns if name not in existing]
+    if missing and not dry_run:
+        _run_script(conn, [
+            f'ALTER TABLE {table_name} ADD COLUMN "{name}" {column_type}'
+            for name, column_type in missing
+        ])
+    return [
+        {"table": table_name, "step": f"add column {name} {column_type}", "rows": 0}
+        for name, column_type in missing
+    ]
+
+
+def backfill(conn, table_name, column, expression, batch_size=BATCH_SIZE, dry_run=False):
+    # SET column = expression on rows where it is NULL, one id range per transaction
+    step = {"table": table_name, "step": f"backfill {column} from {expression}", "rows": 0}
+    if dry_run:
+        step["rows"] = estimate_rows(conn, table_name)
+        return [step]
+
+    low, high = conn.execute(f"SELECT MIN(id), MAX(id) FROM {table_name}").fetchone()
+    if low is None:
+        return [step]
+    for start in range(low - 1, high, batch_size):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(f"""
+                UPDATE {table_name} SET "{column}" = {expression}
+                WHERE id > ? AND id <= ? AND "{column}" IS NULL
+            """, (start, start + batch_size))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        step["rows"] += max(cursor.rowcount, 0)
+    return [step]
+
+
+def copy_and_swap(conn, table_name, create_sql, columns, batch_size=BATCH_SIZE, dry_run=False):
+    # Rebuild a table with a new definition while it stays readable and writable
+    #   create_sql: CREATE TABLE {name} (...) for the new shape ({name} is filled in)
+    #   columns:    {new column: SQL expression over the old table's columns}
+    # Indexes and triggers of the old table are made again on the new one
+    # (indexes on columns that no longer exist are dropped).
+    step = {"table": table_name, "step": "rebuild (copy and swap)", "rows": 0}
+    if dry_run:
+        step["rows"] = estimate_rows(conn, table_name)
+        return [step]
+    if "id" not in columns:
+        raise ValueError("copy_and_swap needs the id column")
+
+    new_table = f"{table_name}__new"
+    old_table = f"{table_name}__old"
+    mirrors = [f"{table_name}__mirror_{suffix}" for suffix in ("ai", "au", "ad")]
+    names = ", ".join(f'"{c}"' for c in columns)
+    values = ", ".join(columns.values())
+    copy_row = f"""
+        INSERT INTO {new_table} ({names})
+        SELECT {values} FROM {table_name} WHERE id = new.id
+        ON CONFLICT (id) DO NOTHING;"""
+
+    # Left over from a copy that did not finish
+    leftovers = ([f"DROP TRIGGER IF EXISTS {name}" for name in mirrors]
+                 + [f"DROP TABLE IF EXISTS {new_table}"])
+    _run_script(conn, leftovers)
+    dependents = conn.execute("""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    """, (table_name,)).fetchall()
+    triggers = [(name, sql) for kind, name, sql in dependents if kind == "trigger"]
+    indexes = [(name, sql) for kind, name, sql in dependents if kind == "index"]
+
+    try:
+        # 1. New empty table; triggers copy every row written from now on.
+        #    Copies skip ids already there, so id must be unique in it.
+        _run_script(conn, [create_sql.format(name=new_table)])
+        if not _id_is_unique(conn, new_table):
+            raise ValueError(f"copy_and_swap: id is not unique in the new {table_name}")
+        _run_script(conn, [
+            f"""CREATE TRIGGER {mirrors[0]} AFTER INSERT ON {table_name} BEGIN{copy_row}
+            END""",
+            f"""CREATE TRIGGER {mirrors[1]} AFTER UPDATE ON {table_name} BEGIN
+                DELETE FROM {new_table} WHERE id = old.id;{copy_row}
+            END""",
+            f"""CREATE TRIGGER {mirrors[2]} AFTER DELETE ON {table_name} BEGIN
+                DELETE FROM {new_table} WHERE id = old.id;
+            END""",
+        ])
+
+        # 2. Copy the existing rows, one id range per transaction; rows the
+        #    triggers already copied are newer and are kept
+        last_id = conn.execute(f"SELECT MIN(id) - 1 FROM {table_name}").fetchone()[0]
+        while last_id is not None:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                upper = conn.execute(f"""
+                    SELECT MAX(id) FROM (
+                        SELECT id FROM {table_name} WHERE id > ? ORDER BY id LIMIT ?
+                    )
+                """, (last_id, batch_size)).fetchone()[0]
+                if upper is not None:
+                    cursor = conn.execute(f"""
+                        INSERT INTO {new_table} ({names})
+                        SELECT {values} FROM {table_name} WHERE id > ? AND id <= ?
+                        ON CONFLICT (id) DO NOTHING
+                    """, (last_id, upper))
+                    step["rows"] += max(cursor.rowcount, 0)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            last_id = upper
+
+        # 3. Swap in one short transaction, then drop the old table
+        _run_script(conn,
+            [f"DROP TRIGGER {name}" for name in mirrors]
+            + [f"DROP TRIGGER {name}" for name, _ in triggers]
+            + [f"ALTER TABLE {table_name} RENAME TO {old_table}",
+               f"ALTER TABLE {new_table} RENAME TO {table_name}"]
+            + [sql for _, sql in triggers]
+        )
+    except Exception:
+        # Leave the table as it was: the mirror triggers would make every
+        # later write to it fail
+        _run_script(conn, leftovers)
+        raise
+    _run_script(conn, [f"DROP TABLE {old_table}"])
+
+    # 4. Indexes, one per transaction
+    for name, sql in indexes:
+        try:
+            _run_script(conn, [sql])
+        except sqlite3.OperationalError as e:
+            print(f" Index {name} not recreated: {e}")
+    return [step]
+
+
+# --- Migrations ---
+# (conn, dry_run, batch_size) -> steps. Never edit one that has shipped;
+# add a new one instead.
+
+def m001_incident_details(conn, dry_run, batch_size):
+    # Columns the CRUD page writes that the first schema never had
+    steps = add_columns(conn, "cyber_incidents", [
+        ("title", "TEXT"),
+        ("source_ip", "TEXT"),
+        ("target_ip", "TEXT"),
+        ("created_date", "TEXT"),
+    ], dry_run)
+    if "date" in _columns(conn, "cyber_incidents"):
+        steps += backfill(conn, "cyber_incidents", "created_date", "date", batch_size, dry_run)
+    return steps
+
+
+def m002_dataset_details(conn, dry_run, batch_size):
+    # Columns the CRUD page writes, plus the schema.py columns a table
+    # created by the CSV loader lacks
+    steps = add_columns(conn, "datasets_metadata", [
+        ("source", "TEXT"),
+        ("category", "TEXT"),
+        ("last_updated", "TEXT"),
+        ("record_count", "INTEGER"),
+        ("file_size_mb", "REAL"),
+        ("description", "TEXT"),
+        ("owner", "TEXT"),
+        ("format", "TEXT"),
+        ("file_path", "TEXT"),
+        ("created_date", "TEXT"),
+    ], dry_run)
+    steps += backfill(conn, "datasets_metadata", "created_date", "last_updated", batch_size, dry_run)
+    return steps
+
+
+TICKETS_TABLE = """
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id TEXT UNIQUE NOT NULL,
+        priority TEXT,
+        status TEXT,
+        category TEXT,
+        subject TEXT NOT NULL,
+        description TEXT,
+        created_date TEXT,
+        resolved_date TEXT,
+        assigned_to TEXT{extra}
+    )
+"""
+TICKET_COLUMNS = (
+    "id", "ticket_id", "priority", "status", "category", "subject",
+    "description", "created_date", "resolved_date", "assigned_to",
+)
+
+
+def m003_ticket_shape(conn, dry_run, batch_size):
+    # A tickets table first created by the CSV loader has the CSV's columns
+    # and none of the NOT NULL/UNIQUE constraints; rebuild it in the
+    # schema.py shape, keeping any extra CSV columns
+    info = {row[1]: row for row in conn.execute("PRAGMA table_info(it_tickets)")}
+    if not info:
+        return []
+    ticket_id = info.get("ticket_id")
+    if ticket_id is not None and ticket_id[3]:
+        return []
+
+    def column(name):
+        return f'"{name}"' if name in info else "NULL"
+
+    derived_id = "'TKT-' || printf('%05d', id)"
+    columns = {name: column(name) for name in TICKET_COLUMNS}
+    columns["ticket_id"] = f"COALESCE({column('ticket_id')}, {derived_id})"
+    columns["subject"] = f"COALESCE({column('subject')}, {column('title')}, '')"
+    extras = [name for name in info if name not in TICKET_COLUMNS]
+    for name in extras:
+        columns[name] = f'"{name}"'
+    extra = "".join(f',\n        "{name}" {info[name][2]}' for name in extras)
+
+    if not dry_run and "it_tickets" in SEARCH_INDEXES:
+        # Made again over the full set of text columns by create_search_indexes()
+        drop_search_index(conn, "it_tickets")
+    return copy_and_swap(
+        conn, "it_tickets", TICKETS_TABLE.replace("{extra}", extra),
+        columns, batch_size, dry_run
+    )
+
+
+def _retyped(create_sql, columns):
+    # CREATE TABLE {name} (...) from a table's own CREATE statement, with
+    # `columns` ({column: new type}) declared with their new types
+    sql = create_sql.replace("{", "{{").replace("}", "}}")
+    sql = re.sub(r'^\s*CREATE\s+TABLE\s+("[^"]+"|\S+)', "CREATE TABLE {name}", sql, count=1, flags=re.I)
+    for column, column_type in columns.items():
+        sql = re.sub(
+            rf'([(,]\s*)"?{column}"?(\s+(?!NOT\b|NULL\b|DEFAULT\b|REFERENCES\b)[A-Za-z]+)?(?=[\s,)])',
+            rf'\1"{column}" {column_type}', sql, count=1, flags=re.I
+        )
+    return sql
+
+
+def _renumber_ids(conn, table_name, dry_run=False):
+    # Give rows with no id or a repeated one (the first keeps it) new ids
+    # after the highest, so id can become the primary key
+    step = {"table": table_name, "step": "new ids for rows with none or a repeated one", "rows": 0}
+    rowids = [row[0] for row in conn.execute(f"""
+        SELECT rowid FROM {table_name}
+        WHERE id IS NULL
+           OR rowid NOT IN (SELECT MIN(rowid) FROM {table_name} WHERE id IS NOT NULL GROUP BY id)
+        ORDER BY rowid
+    """)]
+    step["rows"] = len(rowids)
+    if rowids and not dry_run:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            next_id = (conn.execute(f"SELECT MAX(id) FROM {table_name}").fetchone()[0] or 0) + 1
+            conn.executemany(
+                f"UPDATE {table_name} SET id = ? WHERE rowid = ?",
+                [(next_id + i, rowid) for i, rowid in enumerate(rowids)]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return [step] if rowids else []
+
+
+def m004_category_ids(conn, dry_run, batch_size):
+    # Severity, status, incident type and priority as lookup ids instead of
+    # repeated strings (see app/data/categories.py). Every spelling already
+    # stored is mapped to one label ("low"/"LOW" -> "Low") while copying.
+    steps = []
+    for table_name, wanted in CODED_COLUMNS.items():
+        info = {row[1]: row for row in conn.execute(f"PRAGMA table_info({table_name})")}
+        done = coded_columns(conn, table_name)
+        columns = [c for c in wanted if c in info and c not in done]
+        if not columns:
+            continue
+
+        create_sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+        ).fetchone()[0]
+        new_types = {c: f"INTEGER REFERENCES {LOOKUPS[c][0]}(id)" for c in columns}
+        if not _id_is_unique(conn, table_name):
+            # Tables written by pandas' to_sql have a plain "id" INTEGER; the
+            # rebuilt one has it as the primary key, as schema.py makes it
+            steps += _renumber_ids(conn, table_name, dry_run)
+            if any(row[5] for row in info.values()):
+                new_types["id"] = "INTEGER UNIQUE"
+            else:
+                new_types["id"] = "INTEGER PRIMARY KEY AUTOINCREMENT"
+        copied = {name: f'"{name}"' for name in info}
+        if not dry_run:
+            for column in columns:
+                copied[column] = _id_expression(conn, table_name, column)
+            conn.commit()
+            if table_name in SEARCH_INDEXES:
+                # Made again over the text columns only by create_search_indexes()
+                drop_search_index(conn, table_name)
+
+        steps += copy_and_swap(
+            conn, table_name, _retyped(create_sql, new_types), copied, batch_size, dry_run
+        )
+        if not dry_run and table_name in ROLLUPS:
+            # Recounted with ids as the keys
+            drop_rollups(conn, table_name)
+            create_rollups(conn, table_name)
+    return steps
+
+
+def _id_expression(conn, table_name, column):
+    # SQL turning a stored label into its lookup id: a CASE over every value
+    # in the table (read from an index), then a lookup for labels written
+    # while the copy runs
+    encode = encoder(conn, column)
+    table, label_column, _ = LOOKUPS[column]
+    cases = []
+    for (value,) in conn.execute(
+        f'SELECT DISTINCT "{column}" FROM {table_name} WHERE "{column}" IS NOT NULL'
+    ).fetchall():
+        code = encode(value)
+        quoted = str(value).replace("'", "''")
+        cases.append(f"WHEN '{quoted}' THEN {'NULL' if code is None else code}")
+    looked_up = f'COALESCE((SELECT id FROM {table} WHERE {label_column} = "{column}"), "{column}")'
+    if not cases:
+        return looked_up
+    return f'CASE "{column}" {" ".join(cases)} ELSE {looked_up} END'
+
+
+# (version, description, migration), in the order they run
+MIGRATIONS = [
+    (1, "Incident title, source/target IP and created date", m001_incident_details),
+    (2, "Dataset description, owner, format, file path and created date", m002_dataset_details),
+    (3, "Tickets created by the CSV loader rebuilt in the schema.py shape", m003_ticket_shape),
+    (4, "Category columns stored as lookup ids", m004_category_ids),
+]
+
+
+def migrate(conn, target=None, dry_run=False, batch_size=BATCH_SIZE):
+    # Run the migrations this database has not had yet, up to `target`
+    # Returns one entry per migration:
+    #   {"version", "description", "steps", "rows", "seconds"}
+    # With dry_run=True nothing is changed and rows are estimates.
+    done = applied_versions(conn)
+    results = []
+    for version, description, run in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        started = time.perf_counter()
+        steps = run(conn, dry_run, batch_size)
+        result = {
+            "version": version,
+            "description": description,
+            "steps": steps,
+            "rows": sum(step["rows"] for step in steps),
+            "seconds": time.perf_counter() - started,
+        }
+        results.append(result)
+        if dry_run:
+            continue
+
+        create_schema_version_table(conn)
+        conn.execute(
+            "INSERT INTO schema_version (version, description, rows_touched, seconds) "
+            "VALUES (?, ?, ?, ?)",
+            (version, description, result["rows"], result["seconds"])
+        )
+        conn.commit()
+        tables = {step["table"] for step in steps}
+        if tables:
+            bump_version(*tables)
+        print(f" Migration {version} applied: {description}")
+    return results
+
+
+if __name__ == "__main__":
+    dry_run = "--dry-run" in sys.argv[1:]
+    conn = connect_database()
+    if dry_run:
+        results = migrate(conn, dry_run=True)
+    else:
+        # Creates missing tables first, then migrates
+        from app.data.schema import create_all_tables
+        create_all_tables(conn)
+        results = []
+    print(f"\n Schema version {current_version(conn)}")
+    for result in results:
+        print(f" {result['version']:>3}  {result['description']}  (~{result['rows']:,} rows)")
+        for step in result["steps"]:
+            print(f"        {step['table']}: {step['step']}  (~{step['rows']:,} rows)")
+    conn.close()
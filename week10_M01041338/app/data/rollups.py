@@ -0,0 +1,266 @@
+# Rollup tables: pre-counted incidents and tickets
+#
+# Dashboards only need counts per category, so instead of running
+# COUNT(*) ... GROUP BY over the whole table on every rerun, each source
+# table gets two small tables that triggers keep up to date:
+#
+#   <name>_counts        one row per combination of dimension values
+#   <name>_daily_counts  the same per day, for timelines
+#
+# Reading a count is then a sum over (categories) or (days x categories)
+# rows, however many incidents there are. NULL dimension values are
+# stored as '' (primary keys cannot match NULL) and read back as NULL.
+# Dimension columns have no declared type, so lookup ids (see
+# app/data/categories.py) stay integers; they are read back as labels.
+# The tables are WITHOUT ROWID, so rows are stored in key order and a
+# timeline reads the per-day table front to back without lookups.
+#
+# Rebuild (backfill) from the command line:  python -m app.data.rollups
+
+import threading
+
+import pandas as pd
+import app.data.db as db
+from app.data.db import connect_database
+from app.data.categories import decode_frame
+
+# Source table -> rollup settings
+ROLLUPS = {
+    "cyber_incidents": {
+        "name": "incident",
+        "date_column": "date",
+        "dimensions": ("incident_type", "severity", "status"),
+    },
+    "it_tickets": {
+        "name": "ticket",
+        "date_column": "created_date",
+        "dimensions": ("priority", "status"),
+    },
+}
+
+_ready = set()            # (database file, table) whose rollups are known to exist
+_ready_lock = threading.Lock()
+_create_lock = threading.Lock()     # held while _ensure_rollups() builds rollups
+
+
+def _columns(conn, table_name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+
+def _tables(table_name):
+    name = ROLLUPS[table_name]["name"]
+    return f"{name}_counts", f"{name}_daily_counts"
+
+
+def _key_values(prefix, settings):
+    # IFNULL(new.x, '') for every dimension (and the day for daily rows)
+    day = f"substr(IFNULL({prefix}.{settings['date_column']}, ''), 1, 10)"
+    dims = [f"IFNULL({prefix}.{d}, '')" for d in settings["dimensions"]]
+    return day, dims
+
+
+def create_rollups(conn, table_name, verbose=False):
+    # Create the rollup tables and triggers for one source table (if missing)
+    # and backfill them, all in one transaction, so readers see either no
+    # rollups or complete ones. Returns False if the source table cannot be
+    # rolled up.
+    settings = ROLLUPS[table_name]
+    needed = (settings["date_column"],) + settings["dimensions"]
+    existing = _columns(conn, table_name)
+    if not existing or any(c not in existing for c in needed):
+        return False
+
+    totals, daily = _tables(table_name)
+    dims = ", ".join(settings["dimensions"])
+    dim_defs = ", ".join(f"{d} NOT NULL" for d in settings["dimensions"])
+    watched = ", ".join(needed)
+    new_day, new_dims = _key_values("new", settings)
+    old_day, old_dims = _key_values("old", settings)
+    old_match = " AND ".join(f"{d} = {v}" for d, v in zip(settings["dimensions"], old_dims))
+
+    def add(values_day, values_dims):
+        return f"""
+            INSERT INTO {totals} ({dims}, count) VALUES ({', '.join(values_dims)}, 1)
+                ON CONFLICT ({dims}) DO UPDATE SET count = count + 1;
+            INSERT INTO {daily} (day, {dims}, count) VALUES ({values_day}, {', '.join(values_dims)}, 1)
+                ON CONFLICT (day, {dims}) DO UPDATE SET count = count + 1;"""
+
+    remove = f"""
+            UPDATE {totals} SET count = count - 1 WHERE {old_match};
+            UPDATE {daily} SET count = count - 1 WHERE day = {old_day} AND {old_match};"""
+
+    name = settings["name"]
+    statements = [
+        f"""CREATE TABLE IF NOT EXISTS {totals} (
+            {dim_defs},
+            count INTEGER NOT NULL,
+            PRIMARY KEY ({dims})
+        ) WITHOUT ROWID""",
+        f"""CREATE TABLE IF NOT EXISTS {daily} (
+            day TEXT NOT NULL,
+            {dim_defs},
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, {dims})
+        ) WITHOUT ROWID""",
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_rollup_ai AFTER INSERT ON {table_name} BEGIN{add(new_day, new_dims)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_rollup_ad AFTER DELETE ON {table_name} BEGIN{remove}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {name}_rollup_au AFTER UPDATE OF {watched} ON {table_name} BEGIN{remove}{add(new_day, new_dims)}
+        END""",
+    ]
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        # Looked up under the write lock: another connection may have made
+        # them while this one waited for it
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (daily,)
+        ).fetchone():
+            conn.commit()
+            return True
+        for sql in statements:
+            conn.execute(sql)
+        _recount(conn, table_name)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if verbose:
+        print(f" Rollups for {table_name} created")
+    return True
+
+
+def create_all_rollups(conn):
+    # Part of schema setup (create_all_tables); reads only fall back to
+    # making them (see _ensure_rollups)
+    for table_name in ROLLUPS:
+        create_rollups(conn, table_name, verbose=True)
+
+
+def drop_rollups(conn, table_name):
+    # Remove the rollup tables and triggers (create_rollups() makes them again)
+    totals, daily = _tables(table_name)
+    name = ROLLUPS[table_name]["name"]
+    conn.executescript(f"""
+        BEGIN;
+        DROP TRIGGER IF EXISTS {name}_rollup_ai;
+        DROP TRIGGER IF EXISTS {name}_rollup_ad;
+        DROP TRIGGER IF EXISTS {name}_rollup_au;
+        DROP TABLE IF EXISTS {totals};
+        DROP TABLE IF EXISTS {daily};
+        COMMIT;
+    """)
+    with _ready_lock:
+        _ready.discard((db.DATABASE_FILE, table_name))
+
+
+def _recount(conn, table_name):
+    # Refill the rollups of one table from its rows (inside the caller's transaction)
+    settings = ROLLUPS[table_name]
+    totals, daily = _tables(table_name)
+    dims = ", ".join(settings["dimensions"])
+    keys = ", ".join(f"IFNULL({d}, '')" for d in settings["dimensions"])
+    day = f"substr(IFNULL({settings['date_column']}, ''), 1, 10)"
+    conn.execute(f"DELETE FROM {totals}")
+    conn.execute(f"DELETE FROM {daily}")
+    conn.execute(f"""
+        INSERT INTO {daily} (day, {dims}, count)
+        SELECT {day}, {keys}, COUNT(*) FROM {table_name} GROUP BY 1, {keys}
+    """)
+    conn.execute(f"""
+        INSERT INTO {totals} ({dims}, count)
+        SELECT {dims}, SUM(count) FROM {daily} GROUP BY {dims}
+    """)
+
+
+def rebuild_rollups(conn, table_name=None):
+    # Recount the rollups from the source table(s) in one transaction
+    # (backfill, or repair after rows were written with triggers off)
+    for name in ([table_name] if table_name else list(ROLLUPS)):
+        daily = _tables(name)[1]
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (daily,)
+        ).fetchone():
+            continue
+        try:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            _recount(conn, name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _ensure_rollups(conn, table_name):
+    # Rollups are made during schema setup; this makes them on first read
+    # for a database set up before they existed. One thread at a time, so
+    # concurrent first reads do not both build them (other processes wait
+    # on the write lock, see create_rollups()).
+    key = (db.DATABASE_FILE, table_name)
+    with _ready_lock:
+        if key in _ready:
+            return True
+    with _create_lock:
+        with _ready_lock:
+            if key in _ready:
+                return True
+        ready = create_rollups(conn, table_name)
+        if ready:
+            with _ready_lock:
+                _ready.add(key)
+    return ready
+
+
+def _grouped(conn, source, select, keys, order):
+    # SELECT <select> FROM source [GROUP BY keys] ORDER BY order
+    group = f"GROUP BY {', '.join(keys)}" if keys else ""
+    return pd.read_sql_query(f"""
+        SELECT {', '.join(select)}
+        FROM {source}
+        {group}
+        ORDER BY {order}
+    """, conn)
+
+
+def rollup_counts(table_name, dimensions, daily=False):
+    # Counts of `table_name` grouped by `dimensions` (and by day if daily=True):
+    # DataFrame [day?, *dimensions, count], largest first (by day first if daily)
+    # Reads the rollup tables; falls back to GROUP BY on the source table
+    # if it cannot have rollups (e.g. a column is missing).
+    settings = ROLLUPS[table_name]
+    dimensions = list(dimensions)
+    for d in dimensions:
+        if d not in settings["dimensions"]:
+            raise ValueError(f"{table_name} has no rollup for {d}")
+    keys = (["day"] if daily else []) + dimensions
+    order = "day, count DESC" if daily else "count DESC"
+
+    conn = connect_database()
+    try:
+        if _ensure_rollups(conn, table_name):
+            totals, daily_table = _tables(table_name)
+            select = [f"NULLIF({k}, '') AS {k}" for k in keys] + ["SUM(count) AS count"]
+            df = _grouped(conn, daily_table if daily else totals, select, keys, order)
+            return decode_frame(table_name, df[df["count"] > 0].reset_index(drop=True))
+
+        existing = _columns(conn, table_name)
+        needed = ([settings["date_column"]] if daily else []) + dimensions
+        if not existing or any(c not in existing for c in needed):
+            return pd.DataFrame(columns=keys + ["count"])
+        select = [f"substr({settings['date_column']}, 1, 10) AS day"] if daily else []
+        select += dimensions + ["COUNT(*) AS count"]
+        return decode_frame(table_name, _grouped(conn, table_name, select, keys, order))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    conn = connect_database()
+    create_all_rollups(conn)
+    rebuild_rollups(conn)
+    for table_name in ROLLUPS:
+        total = rollup_counts(table_name, [])["count"].sum()
+        print(f" {table_name}: {total} rows rolled up")
+    conn.close()
@@ -1,4 +1,11 @@
+import threading
+
+import app.data.db as db
 from app.data.db import connect_database
+from app.data.migrations import migrate
+from app.data.search import create_search_indexes
+from app.data.rollups import create_all_rollups
+from app.data.categories import create_lookup_tables
 
 
 def create_users_table(conn):
@@ -69,11 +76,94 @@ def create_it_tickets_table(conn):
     print(" IT tickets table created")
 
 
+# Secondary indexes for the columns the pages filter and group on.
+# Each entry is (index name, columns); composite indexes put the filter column
+# first so COUNT(*) ... GROUP BY queries can be answered from the index alone.
+INDEXES = {
+    "cyber_incidents": [
+        ("idx_incidents_type", ("incident_type",)),
+        ("idx_incidents_severity_status", ("severity", "status")),
+        ("idx_incidents_status", ("status",)),
+        ("idx_incidents_date_severity", ("date", "severity")),
+        # Keyset pagination by (date, id): the rowid rides along in every index
+        ("idx_incidents_date", ("date",)),
+    ],
+    "it_tickets": [
+        ("idx_tickets_status_priority", ("status", "priority")),
+        ("idx_tickets_priority_status", ("priority", "status")),
+        ("idx_tickets_assigned_status", ("assigned_to", "status")),
+        ("idx_tickets_created_date", ("created_date",)),
+    ],
+    "datasets_metadata": [
+        ("idx_datasets_category", ("category",)),
+        ("idx_datasets_last_updated", ("last_updated",)),
+    ],
+}
+
+
+def _table_columns(conn, table_name):
+    # Column names of a table (empty set if the table does not exist)
+    rows = conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+    return {row[1] for row in rows}
+
+
+def create_indexes(conn):
+    # Create the secondary indexes; indexes whose columns are missing are
+    # skipped (tables loaded straight from CSV can have a different shape)
+    cursor = conn.cursor()
+    created = []
+    for table_name, indexes in INDEXES.items():
+        columns = _table_columns(conn, table_name)
+        for index_name, index_columns in indexes:
+            if not set(index_columns) <= columns:
+                continue
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} "
+                f"ON {table_name} ({', '.join(index_columns)})"
+            )
+            created.append(index_name)
+    conn.commit()
+    print(f" {len(created)} indexes created")
+    return created
+
+
+def optimize_indexes(conn):
+    # Refresh the planner statistics so SQLite keeps picking the indexes
+    # (cheap; only re-analyzes tables that changed a lot)
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
 def create_all_tables(conn):
     create_users_table(conn)
     create_cyber_incidents_table(conn)
     create_datasets_metadata_table(conn)
     create_it_tickets_table(conn)
+    create_lookup_tables(conn)
+    # Bring the tables up to the latest shape before indexing them
+    migrate(conn)
+    create_indexes(conn)
+    create_search_indexes(conn)
+    create_all_rollups(conn)
+
+
+_ready = set()            # database files whose schema is known to be current
+_ready_lock = threading.Lock()
+
+
+def ensure_schema():
+    # create_all_tables() once per database file per process, so pages can
+    # call this on every rerun
+    with _ready_lock:
+        if db.DATABASE_FILE in _ready:
+            return
+    conn = connect_database()
+    try:
+        create_all_tables(conn)
+    finally:
+        conn.close()
+    with _ready_lock:
+        _ready.add(db.DATABASE_FILE)
 
 
 if __name__ == "__main__":
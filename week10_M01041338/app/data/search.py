@@ -0,0 +1,309 @@
+# Full-text search over incidents and tickets
+#
+# Each searchable table gets an FTS5 index that stores no text of its own
+# (external content: it reads the rows from the base table). Triggers on
+# insert, update and delete keep the index in step with every writer,
+# including the CSV loader, so nothing has to remember to re-index.
+#
+# A search is an index lookup ranked with bm25() over a bounded number of
+# candidates, so it costs about the same on a thousand rows or a few million.
+
+import re
+import threading
+
+import pandas as pd
+import app.data.db as db
+from app.data.db import connect_database
+from app.data.categories import coded_columns, codes_for, decode_frame
+
+# Searchable tables: base table -> (index name, indexed text columns)
+# (incident_type is a lookup id, not text: filter on it instead)
+SEARCH_INDEXES = {
+    "cyber_incidents": ("incidents_fts", ("description",)),
+    "it_tickets": ("tickets_fts", ("subject", "description")),
+}
+
+# Columns that search filters may use, per table
+FILTERABLE = {
+    "cyber_incidents": {"severity", "status", "incident_type", "reported_by"},
+    "it_tickets": {"priority", "status", "category", "assigned_to"},
+}
+
+# Markers put around matched words in snippets (markdown bold)
+HIGHLIGHT = ("**", "**")
+SNIPPET_TOKENS = 16
+DEFAULT_LIMIT = 20
+# Matches ranked per search. Words found in a large share of rows would
+# otherwise mean scoring every one of them; past this many only the newest
+# matches are ranked.
+MAX_CANDIDATES = 1000
+
+_ready = set()            # (database file, table) whose index is known to exist
+_ready_lock = threading.Lock()
+_create_lock = threading.Lock()     # held while _ensure_index() builds an index
+
+
+def _columns(conn, table_name):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")]
+
+
+def create_search_index(conn, table_name, verbose=False):
+    # Create the FTS5 index and its triggers for one table (if missing)
+    # and fill it from the rows already there, in one transaction
+    fts_name, wanted = SEARCH_INDEXES[table_name]
+    existing = _columns(conn, table_name)
+    if not existing:
+        return False
+    # Tables loaded from a CSV may lack some text columns
+    columns = [c for c in wanted if c in existing]
+    if not columns:
+        return False
+
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{c}" for c in columns)
+    old_values = ", ".join(f"old.{c}" for c in columns)
+    statements = [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts_name} USING fts5(
+            {names},
+            content='{table_name}',
+            content_rowid='id',
+            tokenize='porter unicode61'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_name}_ai AFTER INSERT ON {table_name} BEGIN
+            INSERT INTO {fts_name}(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_name}_ad AFTER DELETE ON {table_name} BEGIN
+            INSERT INTO {fts_name}({fts_name}, rowid, {names})
+            VALUES ('delete', old.id, {old_values});
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {fts_name}_au AFTER UPDATE OF {names} ON {table_name} BEGIN
+            INSERT INTO {fts_name}({fts_name}, rowid, {names})
+            VALUES ('delete', old.id, {old_values});
+            INSERT INTO {fts_name}(rowid, {names}) VALUES (new.id, {new_values});
+        END""",
+        f"INSERT INTO {fts_name}({fts_name}) VALUES ('rebuild')",
+    ]
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        # Looked up under the write lock: another connection may have made
+        # it while this one waited for it
+        if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_name,)
+        ).fetchone():
+            conn.commit()
+            return True
+        for sql in statements:
+            conn.execute(sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if verbose:
+        print(f" Search index {fts_name} created")
+    return True
+
+
+def create_search_indexes(conn):
+    # Part of schema setup (create_all_tables); searches only fall back to
+    # making them (see _ensure_index)
+    for table_name in SEARCH_INDEXES:
+        create_search_index(conn, table_name, verbose=True)
+
+
+def drop_search_index(conn, table_name):
+    # Remove the index and its triggers (create_search_index() makes them again)
+    fts_name = SEARCH_INDEXES[table_name][0]
+    conn.executescript(f"""
+        BEGIN;
+        DROP TRIGGER IF EXISTS {fts_name}_ai;
+        DROP TRIGGER IF EXISTS {fts_name}_ad;
+        DROP TRIGGER IF EXISTS {fts_name}_au;
+        DROP TABLE IF EXISTS {fts_name};
+        COMMIT;
+    """)
+    with _ready_lock:
+        _ready.discard((db.DATABASE_FILE, table_name))
+
+
+def rebuild_search_index(conn, table_name):
+    # Re-read every row into the index (e.g. after loading rows with triggers off)
+    fts_name = SEARCH_INDEXES[table_name][0]
+    conn.execute(f"INSERT INTO {fts_name}({fts_name}) VALUES ('rebuild')")
+    conn.commit()
+
+
+def _ensure_index(conn, table_name):
+    # Indexes are made during schema setup; this makes one on first search
+    # for a database set up before it existed. One thread at a time, so
+    # concurrent first searches do not both build it (other processes wait
+    # on the write lock, see create_search_index()).
+    key = (db.DATABASE_FILE, table_name)
+    with _ready_lock:
+        if key in _ready:
+            return True
+    with _create_lock:
+        with _ready_lock:
+            if key in _ready:
+                return True
+        ready = create_search_index(conn, table_name)
+        if ready:
+            with _ready_lock:
+                _ready.add(key)
+    return ready
+
+
+def _words(text):
+    # Words of a user query; a trailing * asks for a prefix match
+    return re.findall(r"\w+\*?", text or "")
+
+
+def to_match_query(text, any_word=False):
+    # Turn what a user typed into a safe FTS5 query: every word must match
+    # (any_word: at least one; bm25 ranks rows matching more of them higher)
+    words = _words(text)
+    if not words:
+        return None
+    terms = []
+    for word in words:
+        if word.endswith("*"):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return (" OR " if any_word else " ").join(terms)
+
+
+def word_counts(table_name, words, limit=MAX_CANDIDATES):
+    # {word: rows whose text contains it}, counted up to `limit` (a word
+    # at the limit is at least that common); cheap, as counting stops there
+    fts_name = SEARCH_INDEXES[table_name][0]
+    conn = connect_database()
+    try:
+        if not _ensure_index(conn, table_name):
+            return {}
+        counts = {}
+        for word in words:
+            match = to_match_query(word)
+            counts[word] = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT rowid FROM {fts_name} WHERE {fts_name} MATCH ? LIMIT ?)",
+                (match, limit)
+            ).fetchone()[0] if match else 0
+        return counts
+    finally:
+        conn.close()
+
+
+def _snippet(text, words):
+    # Up to SNIPPET_TOKENS words around the first match, matches highlighted
+    if not text:
+        return ""
+    # Stems match longer forms too ("breach" finds "breaches")
+    pattern = re.compile(
+        r"\b(?:" + "|".join(re.escape(w.rstrip("*")) for w in words) + r")\w*",
+        re.IGNORECASE
+    )
+    tokens = str(text).split()
+    hits = [i for i, token in enumerate(tokens) if pattern.search(token)]
+    if not hits:
+        return ""
+    start = max(hits[0] - SNIPPET_TOKENS // 4, 0)
+    window = tokens[start:start + SNIPPET_TOKENS]
+    snippet = " ".join(
+        pattern.sub(lambda m: f"{HIGHLIGHT[0]}{m.group(0)}{HIGHLIGHT[1]}", token)
+        for token in window
+    )
+    if start > 0:
+        snippet = "…" + snippet
+    if start + SNIPPET_TOKENS < len(tokens):
+        snippet += "…"
+    return snippet
+
+
+def _search(table_name, query, filters=None, limit=DEFAULT_LIMIT, any_word=False):
+    match = to_match_query(query, any_word)
+    fts_name, text_columns = SEARCH_INDEXES[table_name]
+    for column in filters or {}:
+        if column not in FILTERABLE[table_name]:
+            raise ValueError(f"Cannot filter {table_name} by {column}")
+
+    conn = connect_database()
+    try:
+        if match is None or not _ensure_index(conn, table_name):
+            return pd.DataFrame()
+
+        coded = coded_columns(conn, table_name)
+        clauses = [f"{fts_name} MATCH ?"]
+        params = [match]
+        for column, values in (filters or {}).items():
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            values = list(values)
+            if column in coded:
+                values = codes_for(conn, column, values)
+            if not values:
+                clauses.append("0")
+                continue
+            clauses.append(f"t.{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+
+        # 1. Rank the newest MAX_CANDIDATES matches with bm25 and keep the best
+        ranked = conn.execute(f"""
+            SELECT id, rank FROM (
+                SELECT {fts_name}.rowid AS id, bm25({fts_name}) AS rank
+                FROM {fts_name}
+                JOIN {table_name} t ON t.id = {fts_name}.rowid
+                WHERE {' AND '.join(clauses)}
+                ORDER BY {fts_name}.rowid DESC
+                LIMIT ?
+            )
+            ORDER BY rank
+            LIMIT ?
+        """, params + [MAX_CANDIDATES, limit]).fetchall()
+        if not ranked:
+            return pd.DataFrame(columns=_columns(conn, table_name) + ["rank", "snippet"])
+
+        # 2. Load just those rows by primary key
+        ids = [row[0] for row in ranked]
+        df = pd.read_sql_query(
+            f"SELECT * FROM {table_name} WHERE id IN ({', '.join('?' for _ in ids)})",
+            conn,
+            params=ids
+        )
+    finally:
+        conn.close()
+
+    df = decode_frame(table_name, df)
+    ranks = {row[0]: row[1] for row in ranked}
+    df["rank"] = df["id"].map(ranks)
+    df = df.sort_values("rank").reset_index(drop=True)
+
+    words = _words(query)
+    columns = [c for c in text_columns if c in df.columns]
+    df["snippet"] = [
+        next((s for s in (_snippet(row[c], words) for c in columns) if s), "")
+        for _, row in df[columns].iterrows()
+    ]
+    return df
+
+
+def search_incidents(query, filters=None, limit=DEFAULT_LIMIT, any_word=False):
+    # Incidents whose description matches `query`, best match first
+    # filters: {column: value or [values]} on severity, status, incident_type, reported_by
+    # any_word: match rows with any of the words instead of all of them
+    # Returns the incident columns plus rank (lower is better) and a snippet
+    return _search("cyber_incidents", query, filters, limit, any_word)
+
+
+def search_tickets(query, filters=None, limit=DEFAULT_LIMIT, any_word=False):
+    # Tickets whose subject/description match `query`, best match first
+    # filters: {column: value or [values]} on priority, status, category, assigned_to
+    return _search("it_tickets", query, filters, limit, any_word)
+
+
+def search_table(table_name, query, filters=None, limit=DEFAULT_LIMIT, any_word=False):
+    # search_incidents() / search_tickets() by table name
+    if table_name not in SEARCH_INDEXES:
+        raise ValueError(f"No search index for {table_name}")
+    return _search(table_name, query, filters, limit, any_word)
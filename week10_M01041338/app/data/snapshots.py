@@ -0,0 +1,202 @@
+# Columnar snapshots of whole tables
+#
+# Readers that want every row of a table (get_all_incidents) used to go
+# through pd.read_sql_query, which builds one Python tuple per row and then
+# converts them column by column. Instead, the table is exported once per
+# write version to an Arrow IPC file next to the database:
+#
+#   intelligence_platform.db.snapshots/cyber_incidents.arrow
+#
+# and read back with a memory map: only the columns asked for are touched,
+# numbers are used in place and category columns come back as Categorical.
+# The file is uncompressed Arrow rather than Parquet so it can be mapped
+# as is instead of decoded.
+#
+# A snapshot is used while the table's write version (app/data/cache.py)
+# is the one it was exported at; the first read after a write exports it
+# again. Versions live in this process, so the file is also rebuilt on
+# first use after a restart, and writes made by another process are picked
+# up after drop_snapshots() (the Settings page's Clear Cache button).
+#
+# Without pyarrow, readers fall back to pd.read_sql_query.
+
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:          # optional: plain SQL reads without it
+    pa = None
+
+import app.data.db as db
+from app.data.db import connect_database
+from app.data.cache import table_version
+from app.data.categories import coded_columns, decode, decode_frame
+
+# Rows fetched from SQLite (and written as one record batch) at a time
+BATCH_ROWS = 100_000
+
+_current = {}             # (database file, table, order) -> (version, path)
+_locks = {}               # same key -> lock held while exporting
+_locks_lock = threading.Lock()
+
+
+def snapshot_dir():
+    return Path(f"{db.DATABASE_FILE}.snapshots")
+
+
+def _lock(key):
+    with _locks_lock:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _arrow_types(conn, table_name):
+    # Arrow type of each column from its declared type; category ids are
+    # stored as labels (dictionary-encoded)
+    coded = coded_columns(conn, table_name)
+    types = {}
+    for row in conn.execute(f"PRAGMA table_info({table_name})"):
+        name, declared = row[1], (row[2] or "").upper()
+        if name in coded:
+            types[name] = pa.dictionary(pa.int32(), pa.string())
+        elif "INT" in declared:
+            types[name] = pa.int64()
+        elif any(word in declared for word in ("REAL", "FLOA", "DOUB")):
+            types[name] = pa.float64()
+        else:
+            types[name] = pa.string()
+    return types
+
+
+class _DoesNotFit(Exception):
+    # A value that does not fit its column's declared type (SQLite does not
+    # enforce types); the column is then kept as text
+    def __init__(self, column):
+        super().__init__(column)
+        self.column = column
+
+
+def _column_array(name, values, arrow_type, categories):
+    if pa.types.is_dictionary(arrow_type):
+        labels = decode(name, values)
+        if name not in categories:
+            categories[name] = list(labels.categories)
+        # Same dictionary in every batch (an IPC file cannot change it)
+        labels = labels.set_categories(categories[name])
+        return pa.DictionaryArray.from_arrays(
+            pa.array(labels.codes, type=pa.int32(), mask=labels.codes < 0),
+            pa.array(categories[name], type=pa.string())
+        )
+    if pa.types.is_string(arrow_type):
+        try:
+            return pa.array(values, type=arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Numbers stored in a text column
+            return pa.array([None if v is None else str(v) for v in values], type=arrow_type)
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        raise _DoesNotFit(name)
+
+
+def export_snapshot(conn, table_name, order_by="id DESC"):
+    # Write the whole table (in `order_by` order) to its snapshot file and
+    # return the path. The file is replaced atomically, so readers that
+    # still have the old one mapped keep a consistent copy.
+    types = _arrow_types(conn, table_name)
+    while True:
+        try:
+            return _write_file(conn, table_name, order_by, types)
+        except _DoesNotFit as e:
+            types[e.column] = pa.string()
+
+
+def _write_file(conn, table_name, order_by, types):
+    directory = snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{table_name}.arrow"
+    partial = directory / f"{table_name}.arrow.{os.getpid()}.{threading.get_ident()}.tmp"
+    schema = pa.schema(list(types.items()))
+    names = list(types)
+    selected = ", ".join(f'"{name}"' for name in names)
+    categories = {}
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None       # plain tuples: cheaper than sqlite3.Row
+        cursor.execute(f"SELECT {selected} FROM {table_name} ORDER BY {order_by}")
+        with pa.OSFile(str(partial), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            rows = cursor.fetchmany(BATCH_ROWS)
+            while rows:
+                columns = list(zip(*rows))
+                arrays = [
+                    _column_array(name, columns[i], types[name], categories)
+                    for i, name in enumerate(names)
+                ]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                rows = cursor.fetchmany(BATCH_ROWS)
+        os.replace(partial, path)
+    finally:
+        if partial.exists():
+            partial.unlink()
+    return path
+
+
+def snapshot_path(table_name, order_by="id DESC"):
+    # Path of a snapshot that matches the table's current write version,
+    # exporting it first if needed
+    key = (db.DATABASE_FILE, table_name, order_by)
+    version = table_version(table_name)
+    current = _current.get(key)
+    if current is not None and current[0] == version and current[1].exists():
+        return current[1]
+    with _lock(key):
+        current = _current.get(key)
+        if current is not None and current[0] == version and current[1].exists():
+            return current[1]
+        conn = connect_database()
+        try:
+            path = export_snapshot(conn, table_name, order_by)
+        finally:
+            conn.close()
+        # A write that landed during the export makes it stale straight away
+        if table_version(table_name) == version:
+            _current[key] = (version, path)
+        return path
+
+
+def read_snapshot(table_name, columns=None, order_by="id DESC"):
+    # The whole table as a DataFrame, read from its memory-mapped snapshot
+    #   columns: only these columns (None = all)
+    # Category columns come back as Categorical labels.
+    if pa is None:
+        return _read_sql(table_name, columns, order_by)
+    path = snapshot_path(table_name, order_by)
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(list(columns))
+        return table.to_pandas()
+
+
+def _read_sql(table_name, columns, order_by):
+    selected = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+    conn = connect_database()
+    try:
+        df = pd.read_sql_query(
+            f"SELECT {selected} FROM {table_name} ORDER BY {order_by}", conn
+        )
+    finally:
+        conn.close()
+    return decode_frame(table_name, df)
+
+
+def drop_snapshots():
+    # Delete every snapshot file of the current database
+    _current.clear()
+    directory = snapshot_dir()
+    if directory.exists():
+        for path in directory.glob("*.arrow"):
+            path.unlink()
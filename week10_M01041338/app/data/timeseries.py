@@ -0,0 +1,169 @@
+# Time series: counts per hour, day, week, month or year
+#
+# Timelines are drawn from counts per bucket, never from raw rows:
+#   - day/week/month/year buckets are summed from the per-day rollup tables
+#     (app/data/rollups.py), so ten years of history is ~3,650 rows per
+#     category whatever the number of incidents;
+#   - hour buckets are counted in SQL over a date index range, and are only
+#     picked when the whole range fits in the point budget (a few weeks).
+#
+# The resolution is chosen so a chart never has more than POINT_BUDGET
+# points per line; a finer bucket the caller asks for is widened if needed.
+# Buckets with no events are filled in with 0 so gaps show as gaps.
+
+import pandas as pd
+from app.data.db import connect_database
+from app.data.cache import cached
+from app.data.rollups import ROLLUPS, rollup_counts
+from app.data.categories import coded_columns, codes_for, decode_frame
+
+# Finest to coarsest: (name, approximate length, pandas frequency)
+BUCKETS = (
+    ("hour", pd.Timedelta(hours=1), "h"),
+    ("day", pd.Timedelta(days=1), "D"),
+    ("week", pd.Timedelta(weeks=1), "W-MON"),
+    ("month", pd.Timedelta(days=30), "MS"),
+    ("year", pd.Timedelta(days=365), "YS"),
+)
+BUCKET_NAMES = tuple(name for name, _, _ in BUCKETS)
+
+# Most points drawn per line
+POINT_BUDGET = 400
+
+
+def _frequency(bucket):
+    return dict((name, freq) for name, _, freq in BUCKETS)[bucket]
+
+
+def floor_to_bucket(times, bucket):
+    # Start of the bucket each timestamp falls in (weeks start on Monday)
+    times = pd.to_datetime(times)
+    if bucket == "hour":
+        return times.dt.floor("h")
+    days = times.dt.normalize()
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        return days - pd.to_timedelta(days.dt.weekday, unit="D")
+    if bucket == "month":
+        return days.dt.to_period("M").dt.to_timestamp()
+    if bucket == "year":
+        return days.dt.to_period("Y").dt.to_timestamp()
+    raise ValueError(f"Unknown bucket {bucket}")
+
+
+def pick_bucket(start, end, bucket=None, budget=POINT_BUDGET):
+    # The finest bucket (no finer than `bucket`) that covers start..end
+    # in at most `budget` points
+    if bucket is not None and bucket not in BUCKET_NAMES:
+        raise ValueError(f"Unknown bucket {bucket}")
+    first = BUCKET_NAMES.index(bucket) if bucket else 0
+    if start is None or pd.isna(start):
+        return BUCKET_NAMES[first]
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for name, length, _ in BUCKETS[first:]:
+        if span / length + 1 <= budget:
+            return name
+    return BUCKET_NAMES[-1]
+
+
+def _fill_gaps(counts, bucket, split_by):
+    # One row per bucket (per split value) from the first to the last bucket
+    if counts.empty:
+        return counts
+    periods = pd.date_range(
+        counts["period"].min(), counts["period"].max(), freq=_frequency(bucket)
+    )
+    if split_by is None:
+        filled = counts.set_index("period")["count"].reindex(periods, fill_value=0)
+        return filled.rename_axis("period").reset_index()
+    wide = counts.pivot_table(
+        index="period", columns=split_by, values="count",
+        aggfunc="sum", fill_value=0, dropna=False
+    ).reindex(periods, fill_value=0)
+    return (
+        wide.rename_axis("period").reset_index()
+        .melt(id_vars="period", var_name=split_by, value_name="count")
+    )
+
+
+def bucket_counts(counts, time_column, bucket=None, split_by=None,
+                  count_column=None, budget=POINT_BUDGET):
+    # Bucket a DataFrame of events (one row each) or of counts (count_column)
+    # Returns {"bucket": bucket used, "series": DataFrame [period, split_by?, count]}
+    keys = [split_by] if split_by else []
+    times = pd.to_datetime(counts[time_column], errors="coerce", format="mixed")
+    frame = counts[keys].copy()
+    frame["time"] = times
+    frame["count"] = counts[count_column] if count_column else 1
+    frame = frame.dropna(subset=["time"])
+    if split_by:
+        # Plain labels: a Categorical would keep a line for unused categories
+        frame[split_by] = frame[split_by].astype(object).fillna("Unknown")
+
+    bucket = pick_bucket(frame["time"].min(), frame["time"].max(), bucket, budget)
+    frame["period"] = floor_to_bucket(frame["time"], bucket)
+    grouped = frame.groupby(["period"] + keys, as_index=False)["count"].sum()
+    series = _fill_gaps(grouped, bucket, split_by)
+    series["count"] = series["count"].astype(int)
+    return {"bucket": bucket, "series": series.sort_values(["period"] + keys).reset_index(drop=True)}
+
+
+def _hourly(table_name, start, end, split_by, filters):
+    # Events per hour between two days (inclusive), counted in SQL over
+    # the date index; hour buckets are only picked for short ranges
+    date_column = ROLLUPS[table_name]["date_column"]
+    select = [f"strftime('%Y-%m-%d %H:00:00', {date_column}) AS period"]
+    keys = ["period"]
+    if split_by:
+        select.append(split_by)
+        keys.append(split_by)
+    clauses = [f"{date_column} >= ?", f"{date_column} < ?"]
+    params = [start.strftime("%Y-%m-%d"), (end + pd.Timedelta(days=1)).strftime("%Y-%m-%d")]
+    conn = connect_database()
+    try:
+        coded = coded_columns(conn, table_name)
+        for column, values in filters.items():
+            if column in coded:
+                values = codes_for(conn, column, values)
+            if not values:
+                clauses.append("0")
+                continue
+            clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        return decode_frame(table_name, pd.read_sql_query(f"""
+            SELECT {', '.join(select)}, COUNT(*) AS count
+            FROM {table_name}
+            WHERE {' AND '.join(clauses)}
+            GROUP BY {', '.join(keys)}
+        """, conn, params=params))
+    finally:
+        conn.close()
+
+
+def time_series(table_name, bucket=None, split_by=None, filters=None, budget=POINT_BUDGET):
+    # Events of `table_name` per bucket, optionally one line per `split_by`
+    #   bucket:  finest resolution wanted (None = finest that fits the budget)
+    #   filters: {column: [allowed values]} on rollup columns
+    # Returns {"bucket": bucket used, "series": DataFrame [period, split_by?, count]}
+    filters = {column: tuple(values) for column, values in (filters or {}).items()}
+    frozen = tuple(sorted(filters.items()))
+    return cached(table_name)(_time_series)(table_name, bucket, split_by, frozen, budget)
+
+
+def _time_series(table_name, bucket, split_by, filters, budget):
+    filters = dict(filters)
+    dimensions = list(dict.fromkeys(([split_by] if split_by else []) + list(filters)))
+    daily = rollup_counts(table_name, dimensions, daily=True)
+    for column, values in filters.items():
+        daily = daily[daily[column].isin(values)]
+
+    days = pd.to_datetime(daily["day"], errors="coerce", format="mixed")
+    if days.isna().all():
+        columns = ["period"] + ([split_by] if split_by else []) + ["count"]
+        return {"bucket": bucket or BUCKET_NAMES[0], "series": pd.DataFrame(columns=columns)}
+    bucket = pick_bucket(days.min(), days.max(), bucket, budget)
+    if bucket == "hour":
+        counts = _hourly(table_name, days.min(), days.max(), split_by, filters)
+        return bucket_counts(counts, "period", "hour", split_by, "count", budget)
+    return bucket_counts(daily, "day", bucket, split_by, "count", budget)
@@ -0,0 +1,275 @@
+# OpenAI chat client for the assistant panel
+#
+# One OpenAI client per (API key, base URL) for the whole process, so its
+# HTTP connection pool (keep-alive, TLS session) is shared by every session
+# and message instead of being set up again for each reply.
+#
+# Replies are streamed: a ReplyStream yields the text as it arrives, which
+# the page hands to st.write_stream(). For each reply it records
+#
+#   time to first token, total time, completion tokens, tokens/s, outcome
+#
+# and reply_stats() sums them up per model. A reply can be cancelled (the
+# user clicks Stop, or any other widget, which reruns the page and closes
+# the generator) and is cut off after ASSISTANT_TIMEOUT seconds in total.
+#
+# Settings (environment):
+#   OPENAI_BASE_URL              API endpoint (e.g. a local fake server for tests)
+#   ASSISTANT_MODEL              default gpt-4o-mini
+#   ASSISTANT_STREAM=0           wait for the whole reply instead of streaming
+#   ASSISTANT_CONNECT_TIMEOUT    seconds to open the connection (default 5)
+#   ASSISTANT_READ_TIMEOUT       seconds to wait for the next chunk (default 30)
+#   ASSISTANT_TIMEOUT            seconds for the whole reply (default 120)
+#   ASSISTANT_MAX_RETRIES        retries before the first token (default 2)
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import openai
+from openai import OpenAI
+
+BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+MODEL = os.environ.get("ASSISTANT_MODEL", "gpt-4o-mini")
+TEMPERATURE = 0.3
+STREAM = os.environ.get("ASSISTANT_STREAM", "1") != "0"
+CONNECT_TIMEOUT = float(os.environ.get("ASSISTANT_CONNECT_TIMEOUT", 5.0))
+READ_TIMEOUT = float(os.environ.get("ASSISTANT_READ_TIMEOUT", 30.0))
+TOTAL_TIMEOUT = float(os.environ.get("ASSISTANT_TIMEOUT", 120.0))
+MAX_RETRIES = int(os.environ.get("ASSISTANT_MAX_RETRIES", 2))
+
+# Replies kept for the statistics
+WINDOW = 200
+
+_clients = {}             # (api key, base url) -> OpenAI
+_clients_lock = threading.Lock()
+_replies = deque(maxlen=WINDOW)
+_replies_lock = threading.Lock()
+
+
+def get_client(api_key, base_url=None):
+    # The process-wide client for this key and endpoint
+    base_url = base_url or BASE_URL
+    key = (api_key, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=openai.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                max_retries=MAX_RETRIES,
+            )
+            _clients[key] = client
+        return client
+
+
+def close_clients():
+    # Close every client's connection pool
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+atexit.register(close_clients)
+
+
+def _events(response):
+    # The chunks of a server-sent event stream. The body is read to its end
+    # so the connection goes back to the pool; the SDK's own Stream stops at
+    # [DONE] and closes it, so every streamed reply would open a new one.
+    try:
+        for line in response.iter_lines():
+            if line.startswith("data:"):
+                data = line[5:].strip()
+                if data != "[DONE]":
+                    yield json.loads(data)
+    except Exception as e:
+        # Read errors of the SDK's HTTP library (httpx or httpx2), which
+        # the SDK only turns into its own errors inside its Stream
+        kinds = {cls.__name__ for cls in type(e).__mro__}
+        if "TimeoutException" in kinds:
+            raise openai.APITimeoutError(request=response.http_request) from e
+        if "TransportError" in kinds:
+            raise openai.APIConnectionError(request=response.http_request) from e
+        raise
+
+
+class ReplyStream:
+    # One assistant reply. Iterate over it for the text chunks; afterwards
+    # (or after it was cut short) the attributes describe what happened:
+    #   text           everything received so far
+    #   status         "ok", "cancelled", "timeout" or "error"
+    #   ttft           seconds until the first text arrived (None if none did)
+    #   seconds        seconds from the request to the end of the reply
+    #   tokens         completion tokens (from the API's usage, else chunks counted)
+    def __init__(self, client, messages, model=MODEL, temperature=TEMPERATURE,
+                 stream=STREAM, timeout=TOTAL_TIMEOUT):
+        self.client = client
+        self.messages = messages
+        self.model = model
+        self.temperature = temperature
+        self.stream = stream
+        self.timeout = timeout
+        self.text = ""
+        self.status = None
+        self.error = None
+        self.ttft = None
+        self.seconds = None
+        self.tokens = 0
+        self._cancelled = threading.Event()
+        self._generator = None
+
+    def cancel(self):
+        # Stop at the next chunk (safe to call from another thread)
+        self._cancelled.set()
+
+    @property
+    def tokens_per_s(self):
+        # Generation speed after the first token
+        if self.ttft is None or self.seconds is None or self.tokens < 2:
+            return None
+        generating = self.seconds - self.ttft
+        return (self.tokens - 1) / generating if generating > 0 else None
+
+    def __iter__(self):
+        if self._generator is None:
+            self._generator = self._run()
+        return self._generator
+
+    def close(self):
+        # Stop reading now; a reply cut short this way counts as cancelled
+        if self._generator is not None:
+            self._generator.close()
+
+    def _run(self):
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        chunks = 0
+        try:
+            if not self.stream:
+                resp = self.client.chat.completions.create(
+                    model=self.model, messages=self.messages,
+                    temperature=self.temperature, timeout=self.timeout,
+                )
+                self.text = resp.choices[0].message.content or ""
+                self.ttft = time.perf_counter() - started
+                self.tokens = resp.usage.completion_tokens if resp.usage else 0
+                self.status = "ok"
+                yield self.text
+                return
+
+            with self.client.chat.completions.with_streaming_response.create(
+                model=self.model, messages=self.messages,
+                temperature=self.temperature, stream=True,
+                stream_options={"include_usage": True},
+            ) as response:
+                for chunk in _events(response):
+                    if self._cancelled.is_set():
+                        self.status = "cancelled"
+                        break
+                    if time.perf_counter() > deadline:
+                        self.status = "timeout"
+                        self.error = f"no complete reply within {self.timeout:g}s"
+                        break
+                    if chunk.get("error"):
+                        self.status = "error"
+                        self.error = chunk["error"].get("message") or "error in the reply stream"
+                        break
+                    if chunk.get("usage"):
+                        self.tokens = chunk["usage"]["completion_tokens"]
+                    choices = chunk.get("choices")
+                    delta = choices[0]["delta"].get("content") if choices else None
+                    if delta:
+                        if self.ttft is None:
+                            self.ttft = time.perf_counter() - started
+                        chunks += 1
+                        self.text += delta
+                        yield delta
+                else:
+                    self.status = "ok"
+        except GeneratorExit:
+            # The reader stopped early (e.g. the page was rerun)
+            self.status = "cancelled"
+            raise
+        except openai.APITimeoutError as e:
+            self.status = "timeout"
+            self.error = str(e)
+        except openai.OpenAIError as e:
+            self.status = "error"
+            self.error = str(e)
+        finally:
+            if not self.tokens:
+                self.tokens = chunks
+            self.seconds = time.perf_counter() - started
+            _record(self)
+
+        if self.error and not self.text:
+            yield f"OpenAI error: {self.error}"
+
+    def summary(self):
+        # One line for under the reply, e.g. "first token 0.42s · 38 tok/s · 1.9s"
+        parts = []
+        if self.ttft is not None:
+            parts.append(f"first token {self.ttft:.2f}s")
+        if self.tokens_per_s is not None:
+            parts.append(f"{self.tokens_per_s:.0f} tok/s")
+        if self.seconds is not None:
+            parts.append(f"{self.seconds:.1f}s")
+        if self.status not in (None, "ok"):
+            parts.append(self.status)
+        return " · ".join(parts)
+
+
+def _record(reply):
+    with _replies_lock:
+        _replies.append({
+            "model": reply.model,
+            "stream": reply.stream,
+            "status": reply.status or "error",
+            "ttft_s": reply.ttft,
+            "seconds": reply.seconds,
+            "tokens": reply.tokens,
+            "tokens_per_s": reply.tokens_per_s,
+        })
+
+
+def stream_reply(api_key, messages, **options):
+    # A ReplyStream on the shared client (see ReplyStream for the options)
+    return ReplyStream(get_client(api_key), messages, **options)
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def reply_stats():
+    # Per model over the last WINDOW replies: count, outcomes, mean time to
+    # first token, mean total time and mean tokens/s
+    with _replies_lock:
+        replies = list(_replies)
+    rows = {}
+    for reply in replies:
+        rows.setdefault(reply["model"], []).append(reply)
+    return [
+        {
+            "model": model,
+            "replies": len(group),
+            "ok": sum(r["status"] == "ok" for r in group),
+            "cancelled": sum(r["status"] == "cancelled" for r in group),
+            "failed": sum(r["status"] in ("timeout", "error") for r in group),
+            "ttft_s": _mean(r["ttft_s"] for r in group),
+            "seconds": _mean(r["seconds"] for r in group),
+            "tokens_per_s": _mean(r["tokens_per_s"] for r in group),
+        }
+        for model, group in rows.items()
+    ]
+
+
+def reset_reply_stats():
+    with _replies_lock:
+        _replies.clear()
@@ -0,0 +1,203 @@
+# bcrypt worker pool
+#
+# bcrypt is deliberately slow and CPU bound. Running it on the Streamlit
+# script thread makes a burst of logins stall every other session, so the
+# hashing is sent to a small pool of worker processes instead.
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import bcrypt
+
+# Worker processes (0 = run bcrypt inline, useful for scripts and debugging)
+AUTH_WORKERS = int(os.environ.get("AUTH_WORKERS", os.cpu_count() or 1))
+# Requests allowed to wait or run at once; callers beyond this get AuthBusy
+AUTH_MAX_PENDING = int(os.environ.get("AUTH_MAX_PENDING", max(AUTH_WORKERS, 1) * 4))
+# Seconds a single hash/verify call may take, including time spent queued
+AUTH_TIMEOUT = float(os.environ.get("AUTH_TIMEOUT", 10.0))
+
+
+class AuthBusy(RuntimeError):
+    # Too many authentication requests are already queued
+    pass
+
+
+class AuthTimeout(RuntimeError):
+    # A hash/verify call did not finish in time
+    pass
+
+
+# --- Work done in the worker processes (must be top-level to be picklable) ---
+
+def _bcrypt_hash(plain_text_password):
+    # Hash a password using bcrypt (salt is generated automatically)
+    password_bytes = plain_text_password.encode('utf-8')
+    salt = bcrypt.gensalt()
+    hashed = bcrypt.hashpw(password_bytes, salt)
+    return hashed.decode('utf-8')
+
+
+def _bcrypt_check(plain_text_password, hashed_password):
+    # Check if a password matches the stored bcrypt hash
+    try:
+        password_bytes = plain_text_password.encode('utf-8')
+        hashed_bytes = hashed_password.encode('utf-8')
+        return bcrypt.checkpw(password_bytes, hashed_bytes)
+    except Exception as e:
+        print(f"Password verification error: {e}")
+        return False
+
+
+class AuthWorkerPool:
+    def __init__(self, workers=AUTH_WORKERS, max_pending=AUTH_MAX_PENDING,
+                 timeout=AUTH_TIMEOUT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        # spawn works the same on every OS and is safe next to Streamlit's threads
+        self._executor = None
+        if workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+        # Counters shown by metrics()
+        self.stats = {
+            "submitted": 0,
+            "finished": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "abandoned": 0,         # timed out but still running in a worker
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "busy_seconds": 0.0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _run(self, func, *args, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        # Bounded queue: wait for a slot, but not past the call's deadline
+        if not self._slots.acquire(timeout=timeout):
+            self._count("rejected")
+            raise AuthBusy("Authentication service is busy, please try again")
+
+        with self._lock:
+            self.stats["submitted"] += 1
+            self.stats["queue_depth"] += 1
+            self.stats["max_queue_depth"] = max(
+                self.stats["max_queue_depth"], self.stats["queue_depth"]
+            )
+
+        started = time.monotonic()
+        if self._executor is None:
+            try:
+                return func(*args)
+            finally:
+                self._finish(started)
+
+        # The slot is given back when the work ends, not when the caller
+        # stops waiting: a bcrypt call that timed out keeps its worker busy
+        # (cancel() cannot stop it), so it still counts against the bound
+        abandoned = [False]
+
+        def done(_future):
+            with self._lock:
+                if abandoned[0]:
+                    self.stats["abandoned"] -= 1
+            self._finish(started)
+
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._finish(started)
+            raise
+        future.add_done_callback(done)
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.stats["timeouts"] += 1
+                if not future.done():
+                    abandoned[0] = True
+                    self.stats["abandoned"] += 1
+            raise AuthTimeout(f"Authentication took longer than {timeout:.0f}s")
+
+    def _finish(self, started):
+        # One call's work has ended (run, failed or cancelled)
+        with self._lock:
+            self.stats["queue_depth"] -= 1
+            self.stats["finished"] += 1
+            self.stats["busy_seconds"] += time.monotonic() - started
+        self._slots.release()
+
+    def hash_password(self, plain_text_password, timeout=None):
+        return self._run(_bcrypt_hash, plain_text_password, timeout=timeout)
+
+    def verify_password(self, plain_text_password, hashed_password, timeout=None):
+        return self._run(_bcrypt_check, plain_text_password, hashed_password, timeout=timeout)
+
+    def metrics(self):
+        with self._lock:
+            info = dict(self.stats)
+        info["workers"] = self.workers
+        info["max_pending"] = self.max_pending
+        return info
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_auth_pool():
+    # Shared pool for the whole process, started on first use
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AuthWorkerPool()
+        return _pool
+
+
+def configure_auth_pool(workers=AUTH_WORKERS, max_pending=None, timeout=AUTH_TIMEOUT):
+    # Replace the shared pool (e.g. to resize it); returns the new pool
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        if max_pending is None:
+            max_pending = max(workers, 1) * 4
+        _pool = AuthWorkerPool(workers, max_pending, timeout)
+        return _pool
+
+
+def auth_metrics():
+    with _pool_lock:
+        return _pool.metrics() if _pool is not None else None
+
+
+def _shutdown_pool():
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+
+
+atexit.register(_shutdown_pool)
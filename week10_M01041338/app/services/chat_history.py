@@ -0,0 +1,156 @@
+# Chat history for the assistant panel, bounded in tokens
+#
+# Sending the whole conversation with every message made long triage
+# sessions slower and dearer with each turn, until they no longer fit the
+# model's context. A ChatHistory (one per page, in session state) instead
+#
+#   - counts the tokens of every message when it is added
+#   - keeps at most MAX_MESSAGES messages; older ones are folded into a
+#     rolling summary: one line per message (who said it and its first
+#     sentence), the oldest lines dropped once it passes SUMMARY_TOKENS
+#   - builds each request from the system prompt, the summary and as many
+#     of the latest messages as fit CONTEXT_TOKENS; the messages that do
+#     not fit are summarized the same way
+#
+# The summary is made locally (no extra model call). Every request stays
+# within CONTEXT_TOKENS, however long the session: the summary and then the
+# system prompt are shortened if needed, and a single message longer than
+# the budget is cut.
+#
+# Settings (environment):
+#   ASSISTANT_CONTEXT_TOKENS     tokens per request (default 3000)
+#   ASSISTANT_HISTORY_MESSAGES   messages kept per page (default 40)
+#   ASSISTANT_SUMMARY_TOKENS     tokens of the rolling summary (default 400)
+
+import os
+import re
+
+from app.services.tokens import CHARS_PER_TOKEN, MESSAGE_OVERHEAD, count_tokens
+
+CONTEXT_TOKENS = int(os.environ.get("ASSISTANT_CONTEXT_TOKENS", 3000))
+MAX_MESSAGES = int(os.environ.get("ASSISTANT_HISTORY_MESSAGES", 40))
+SUMMARY_TOKENS = int(os.environ.get("ASSISTANT_SUMMARY_TOKENS", 400))
+# Characters of a message kept in its summary line
+SNIPPET_CHARS = 160
+# Share of the budget the system prompt may take before it is shortened
+SYSTEM_SHARE = 0.5
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_SPACES = re.compile(r"\s+")
+
+
+def _snippet(message):
+    # "User: which incidents are still open?" / "Assistant: 12 are open. ..."
+    text = _SPACES.sub(" ", message["content"]).strip()
+    first = _SENTENCE_END.split(text, maxsplit=1)[0]
+    if len(first) > SNIPPET_CHARS:
+        first = first[:SNIPPET_CHARS - 1] + "…"
+    elif len(first) < len(text):
+        first += " …"
+    return f"{message['role'].capitalize()}: {first}"
+
+
+def _truncate(text, tokens):
+    # The start of text, at most `tokens` tokens long
+    if tokens <= 0:
+        return ""
+    if count_tokens(text) <= tokens:
+        return text
+    cut = text[:tokens * CHARS_PER_TOKEN]
+    while cut and count_tokens(cut + "…") > tokens:
+        cut = cut[:int(len(cut) * 0.9)]
+    return cut + "…" if cut else ""
+
+
+def _summary_text(lines, omitted):
+    header = "Earlier in this conversation"
+    if omitted:
+        header += f" ({omitted} older messages not shown)"
+    return header + ":\n" + "\n".join(lines)
+
+
+class ChatHistory:
+    def __init__(self, max_messages=MAX_MESSAGES, summary_tokens=SUMMARY_TOKENS):
+        self.max_messages = max_messages
+        self.summary_tokens = summary_tokens
+        self.messages = []            # {"role", "content", "tokens"}
+        self.summary_lines = []       # one line per message folded into the summary
+        self.omitted = 0              # summary lines dropped for room
+        self.folded = 0               # messages moved out of self.messages
+        self.last_request = None      # {"tokens", "messages", "summarized"} of the last request
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, role, content):
+        self.messages.append({"role": role, "content": content, "tokens": count_tokens(content)})
+        while len(self.messages) > self.max_messages:
+            self._fold(self.messages.pop(0))
+
+    def _fold(self, message):
+        # Move a message into the rolling summary
+        self.folded += 1
+        self.summary_lines.append(_snippet(message))
+        while self.summary_lines and count_tokens(self.summary()) > self.summary_tokens:
+            self.summary_lines.pop(0)
+            self.omitted += 1
+
+    def summary(self):
+        # The rolling summary ("" while nothing was folded)
+        if not self.summary_lines and not self.omitted:
+            return ""
+        return _summary_text(self.summary_lines, self.omitted)
+
+    def turns(self):
+        # What the conversation so far consists of, as {"role", "content"}
+        # dicts (for cache keys); the summary comes first
+        summary = self.summary()
+        head = [{"role": "system", "content": summary}] if summary else []
+        return head + [{"role": m["role"], "content": m["content"]} for m in self.messages]
+
+    def request_messages(self, system_prompt, budget=CONTEXT_TOKENS):
+        # [system prompt, summary of older turns, latest turns] in at most
+        # `budget` tokens (counted as in tokens.message_tokens)
+        system_prompt = _truncate(system_prompt, int(budget * SYSTEM_SHARE) - MESSAGE_OVERHEAD)
+        left = budget - count_tokens(system_prompt) - MESSAGE_OVERHEAD
+
+        # Newest first, while they fit (the latest one always, cut if need be)
+        window = []
+        for message in reversed(self.messages):
+            cost = message["tokens"] + MESSAGE_OVERHEAD
+            if cost > left:
+                if not window:
+                    content = _truncate(message["content"], left - MESSAGE_OVERHEAD)
+                    window.append({"role": message["role"], "content": content})
+                    left -= count_tokens(content) + MESSAGE_OVERHEAD
+                break
+            window.append({"role": message["role"], "content": message["content"]})
+            left -= cost
+        window.reverse()
+
+        # Older turns: the rolling summary plus the stored messages left out
+        skipped = self.messages[:len(self.messages) - len(window)]
+        lines = self.summary_lines + [_snippet(m) for m in skipped]
+        omitted = self.omitted
+        summary = None
+        room = left - MESSAGE_OVERHEAD
+        while lines or omitted:
+            text = _summary_text(lines, omitted)
+            if count_tokens(text) <= room:
+                summary = text
+                break
+            if not lines:
+                break
+            lines = lines[1:]
+            omitted += 1
+
+        request = [{"role": "system", "content": system_prompt}]
+        if summary:
+            request.append({"role": "system", "content": summary})
+        request += window
+        self.last_request = {
+            "tokens": sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in request),
+            "messages": len(window),
+            "summarized": self.folded + len(skipped),
+        }
+        return request
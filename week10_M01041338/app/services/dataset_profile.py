@@ -0,0 +1,358 @@
+# Dataset profiles for assistant prompts
+#
+# The assistant is told what the data on the page looks like. profile_frame()
+# describes every column:
+#
+#   all columns   kind, missing values, distinct values
+#   labels        the TOP_K most common values with their counts
+#   numbers       min, quartiles, max and mean (ids: just the range)
+#   dates         first and last (datetime columns and text holding ISO dates)
+#   free text     mean length
+#
+# using whole-column numpy/pandas calls: each text column is factorized once
+# and its counts, top values, lengths and dates all come from that one pass;
+# the numeric columns share one quantile call.
+#
+# Profiles are cached by a fingerprint of the frame's contents (columns,
+# dtypes and a hash of every value, taken from the column buffers), so for
+# unchanged data a rerun costs one pass of sha256 over the frame's memory
+# (~1 GB/s) instead of a profile; rendered summaries are cached per
+# (fingerprint, budget).
+#
+# summarize_frame() renders the profile as prompt text that fits a token
+# budget, dropping detail (fewer top values, then per-column detail, then
+# columns) until it does.
+#
+# summarize_counts() does the same for a frame of counts (one row per
+# combination of labels with its number of rows, as get_incident_counts()
+# returns): the totals per value it lists cover every row counted, not just
+# the rows a page shows.
+#
+# Settings (environment):
+#   ASSISTANT_PROFILE_TOKENS    token budget of the summary (default 500)
+
+import hashlib
+import itertools
+import os
+import re
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:          # optional: slower fingerprints without it
+    pa = None
+
+from app.services.tokens import CHARS_PER_TOKEN, count_tokens
+
+PROFILE_TOKENS = int(os.environ.get("ASSISTANT_PROFILE_TOKENS", 500))
+TOP_K = 5
+# A text column with more distinct values than this share of its rows (and
+# more than LABEL_MAX in all) is free text rather than labels
+LABEL_SHARE = 0.5
+LABEL_MAX = 50
+# Characters of a value shown in a summary
+VALUE_CHARS = 40
+# Profiles and summaries kept (least recently used are dropped first)
+MAX_PROFILES = 32
+MAX_SUMMARIES = 64
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+_profiles = OrderedDict()     # fingerprint -> profile
+_summaries = OrderedDict()    # (fingerprint, budget) -> text
+_lock = threading.Lock()
+
+
+def _hash_column(digest, column):
+    # Feed the column's values to digest, from their memory where possible
+    # (hash_pandas_object hashes strings one by one, 20x slower). An object
+    # column's memory holds pointers, not values: it takes the slow path.
+    values = column.array
+    if isinstance(column.dtype, np.dtype) and column.dtype != object:
+        digest.update(np.ascontiguousarray(column.to_numpy()).data)
+    elif isinstance(column.dtype, pd.CategoricalDtype):
+        digest.update(np.ascontiguousarray(values.codes).data)
+        digest.update(repr(values.categories.tolist()).encode("utf-8"))
+    elif pa is not None and hasattr(values, "__arrow_array__"):
+        # Arrow-backed (pandas' default string type): hash the buffers
+        arrow = pa.array(values)
+        chunks = arrow.chunks if isinstance(arrow, pa.ChunkedArray) else [arrow]
+        for chunk in chunks:
+            digest.update(f"{chunk.offset}:{len(chunk)}".encode("ascii"))
+            for buffer in chunk.buffers():
+                if buffer is not None:
+                    digest.update(buffer)
+    else:
+        digest.update(pd.util.hash_pandas_object(column, index=False).to_numpy().data)
+
+
+def fingerprint(df):
+    # Hash of the frame's columns, dtypes and values (None if some values
+    # cannot be hashed, e.g. lists)
+    digest = hashlib.sha256()
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode("utf-8"))
+    try:
+        for i in range(df.shape[1]):
+            _hash_column(digest, df.iloc[:, i])
+    except (TypeError, ValueError):
+        return None
+    return digest.hexdigest()
+
+
+def _cache_get(cache, key):
+    with _lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache, key, value, limit):
+    with _lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+
+
+# --- profiling ---
+
+def _is_id(name, distinct, non_null):
+    return (name == "id" or str(name).endswith("_id")) and distinct == non_null
+
+
+def _top(uniques, counts, k=TOP_K):
+    # The k largest counts, largest first
+    if len(counts) > k:
+        keep = np.argpartition(counts, -k)[-k:]
+    else:
+        keep = np.arange(len(counts))
+    keep = keep[np.argsort(-counts[keep], kind="stable")]
+    return [(uniques[i], int(counts[i])) for i in keep]
+
+
+def _looks_like_dates(uniques):
+    sample = [uniques[i] for i in range(min(len(uniques), 20))]
+    return bool(sample) and all(isinstance(v, str) and _ISO_DATE.match(v) for v in sample)
+
+
+def _profile_values(column, non_null):
+    # Labels, dates or free text, from one factorize of the column
+    try:
+        codes, uniques = pd.factorize(column, sort=False)
+    except TypeError:
+        # Unhashable values (lists, dicts): described by their text
+        column = column.astype(str).where(column.notna())
+        codes, uniques = pd.factorize(column, sort=False)
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    info = {"distinct": len(uniques)}
+
+    if _looks_like_dates(uniques):
+        # ISO dates sort as text: no need to parse them all
+        try:
+            first, last = pd.Timestamp(column.min()), pd.Timestamp(column.max())
+        except (TypeError, ValueError):
+            pass
+        else:
+            info.update(kind="date", first=first, last=last)
+            return info
+
+    if len(uniques) <= LABEL_MAX or len(uniques) <= LABEL_SHARE * non_null:
+        info.update(kind="label", top=_top(uniques, counts))
+    else:
+        lengths = column.astype(str).str.len() if column.dtype == object else column.str.len()
+        info.update(kind="text", mean_length=float(lengths.mean()))
+    return info
+
+
+def _profile(df):
+    rows = len(df)
+    nulls = df.isna().sum().to_numpy()
+    columns = []
+    numeric = []
+    for i, (name, dtype) in enumerate(df.dtypes.items()):
+        column = df.iloc[:, i]
+        non_null = rows - int(nulls[i])
+        info = {"name": str(name), "dtype": str(dtype), "nulls": int(nulls[i])}
+        if non_null == 0:
+            info.update(kind="empty", distinct=0)
+        elif pd.api.types.is_bool_dtype(dtype):
+            counts = column.value_counts()
+            info.update(kind="label", distinct=len(counts),
+                        top=list(zip(counts.index.tolist(), counts.tolist())))
+        elif pd.api.types.is_numeric_dtype(dtype):
+            info.update(kind="number", distinct=int(column.nunique()))
+            if _is_id(name, info["distinct"], non_null):
+                info["kind"] = "id"
+            numeric.append((len(columns), column))
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            info.update(kind="date", distinct=int(column.nunique()),
+                        first=column.min(), last=column.max())
+        else:
+            info.update(_profile_values(column, non_null))
+        columns.append(info)
+
+    if numeric:
+        # All numeric columns in one call
+        block = np.column_stack([c.to_numpy(dtype=float, na_value=np.nan) for _, c in numeric])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)      # all-missing columns
+            quantiles = np.nanquantile(block, [0, 0.25, 0.5, 0.75, 1], axis=0)
+            means = np.nanmean(block, axis=0)
+        for j, (i, _) in enumerate(numeric):
+            columns[i]["quantiles"] = quantiles[:, j].tolist()
+            columns[i]["mean"] = float(means[j])
+
+    return {"rows": rows, "columns": columns}
+
+
+def profile_frame(df):
+    # Column statistics of df (cached while its contents are unchanged)
+    return _cached_profile(df, fingerprint(df))
+
+
+def _cached_profile(df, key):
+    if key is not None:
+        cached = _cache_get(_profiles, key)
+        if cached is not None:
+            return cached
+    profile = _profile(df)
+    if key is not None:
+        _cache_put(_profiles, key, profile, MAX_PROFILES)
+    return profile
+
+
+# --- rendering ---
+
+def _value(value):
+    if isinstance(value, float):
+        return f"{value:.0f}" if value.is_integer() and abs(value) < 1e15 else f"{value:.4g}"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d %H:%M") if (value.hour or value.minute) else value.strftime("%Y-%m-%d")
+    text = str(value)
+    return text if len(text) <= VALUE_CHARS else text[:VALUE_CHARS - 1] + "…"
+
+
+def _column_line(info, rows, top_k, detail):
+    if info["kind"] == "empty":
+        return f"- {info['name']} (empty)"
+    facts = [info["kind"]]
+    if info["kind"] != "id":
+        facts.append(f"{info['distinct']} distinct")
+    if info["nulls"]:
+        share = info["nulls"] / rows
+        facts.append(f"{share:.0%} missing" if share >= 0.01 else "<1% missing")
+    line = f"- {info['name']} ({', '.join(facts)})"
+    if not detail:
+        return line
+
+    kind = info["kind"]
+    if kind == "label" and top_k:
+        line += ": " + ", ".join(f"{_value(v)} {n}" for v, n in info["top"][:top_k])
+    elif kind == "id" and "quantiles" in info:
+        q = info["quantiles"]
+        line += f": {_value(q[0])} to {_value(q[4])}"
+    elif kind == "number" and "quantiles" in info:
+        q = info["quantiles"]
+        line += (f": min {_value(q[0])}, p25 {_value(q[1])}, median {_value(q[2])}, "
+                 f"p75 {_value(q[3])}, max {_value(q[4])}, mean {_value(info['mean'])}")
+    elif kind == "date" and pd.notna(info.get("first")):
+        line += f": {_value(info['first'])} to {_value(info['last'])}"
+    elif kind == "text":
+        line += f": mean {info['mean_length']:.0f} chars"
+    return line
+
+
+def _render(profile, top_k, detail, max_columns=None):
+    rows = profile["rows"]
+    columns = profile["columns"]
+    shown = columns if max_columns is None else columns[:max_columns]
+    lines = [f"Rows: {rows}", f"Columns ({len(columns)}):"]
+    lines += [_column_line(info, rows, top_k, detail and rows > 0) for info in shown]
+    if len(shown) < len(columns):
+        lines.append(f"- ... {len(columns) - len(shown)} more: " + ", ".join(c["name"] for c in columns[len(shown):]))
+    return "\n".join(lines)
+
+
+def render_profile(profile, budget=PROFILE_TOKENS):
+    # The richest summary of the profile that fits `budget` tokens
+    for top_k in (TOP_K, 3, 1):
+        text = _render(profile, top_k, detail=True)
+        if count_tokens(text) <= budget:
+            return text
+    text = _render(profile, 0, detail=False)
+    max_columns = len(profile["columns"])
+    while count_tokens(text) > budget and max_columns > 0:
+        max_columns -= 1
+        text = _render(profile, 0, detail=False, max_columns=max_columns)
+    if count_tokens(text) > budget:
+        # Not even the column names fit: cut the text itself
+        text = text[:max(budget, 0) * CHARS_PER_TOKEN]
+    return text
+
+
+def summarize_frame(df, budget=PROFILE_TOKENS):
+    # Prompt text describing df within `budget` tokens (cached for unchanged data)
+    key = fingerprint(df)
+    if key is not None:
+        cached = _cache_get(_summaries, (key, budget))
+        if cached is not None:
+            return cached
+    text = render_profile(_cached_profile(df, key), budget)
+    if key is not None:
+        _cache_put(_summaries, (key, budget), text, MAX_SUMMARIES)
+    return text
+
+
+def _counts_lines(counts):
+    # Lines always shown, and lines kept while they fit (most useful first)
+    counts = counts[counts["count"] > 0]
+    dims = [c for c in counts.columns if c != "count"]
+    dates = [c for c in dims if _looks_like_dates(pd.unique(counts[c].dropna()))]
+    labels = [c for c in dims if c not in dates]
+    lines = [f"Rows: {int(counts['count'].sum())} (the counts below cover every row)"]
+    extra = []
+    if counts.empty:
+        return lines, extra
+    for c in dates:
+        days = counts[c].dropna().astype(str).str[:10]
+        if len(days):
+            lines.append(f"- {c}: {days.min()} to {days.max()}")
+            per_year = counts.groupby(days.str[:4])["count"].sum()
+            extra.append(f"- {c} by year: " + ", ".join(f"{y} {int(n)}" for y, n in per_year.items()))
+    for c in labels:
+        totals = counts.groupby(c)["count"].sum().sort_values(ascending=False, kind="stable")
+        lines.append(f"- {c}: " + ", ".join(f"{_value(v)} {int(n)}" for v, n in totals.items()))
+    # Pairs with the fewest combinations first (the shortest lines)
+    pairs = []
+    for a, b in itertools.combinations(labels, 2):
+        totals = counts.groupby([a, b])["count"].sum().sort_values(ascending=False, kind="stable")
+        pairs.append((len(totals), f"- {a} x {b}: " + ", ".join(
+            f"{_value(x)}/{_value(y)} {int(n)}" for (x, y), n in totals.items()
+        )))
+    extra += [line for _, line in sorted(pairs, key=lambda pair: pair[0])]
+    return lines, extra
+
+
+def summarize_counts(counts, budget=PROFILE_TOKENS):
+    # Prompt text with the totals per value (and per pair of values) of a
+    # frame of counts, within `budget` tokens (cached for unchanged data)
+    key = fingerprint(counts)
+    if key is not None:
+        cached = _cache_get(_summaries, ("counts", key, budget))
+        if cached is not None:
+            return cached
+    lines, extra = _counts_lines(counts)
+    text = "\n".join(lines + extra)
+    while extra and count_tokens(text) > budget:
+        extra.pop()
+        text = "\n".join(lines + extra)
+    if count_tokens(text) > budget:
+        text = text[:max(budget, 0) * CHARS_PER_TOKEN]
+    if key is not None:
+        _cache_put(_summaries, ("counts", key, budget), text, MAX_SUMMARIES)
+    return text
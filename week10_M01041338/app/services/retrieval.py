@@ -0,0 +1,183 @@
+# Rows for the assistant that match the question
+#
+# The dataset profile tells the model what the page's data looks like as a
+# whole; it cannot say which incidents mention payroll. For each question,
+# question_context() finds the rows whose text matches it best and lists
+# them in the prompt, within a token budget.
+#
+# The rows come from the full-text indexes of search.py: FTS5 indexes ranked
+# with BM25, kept up to date by triggers on every insert, update and delete,
+# so there is no separate index to build, load into memory or refresh. A
+# question becomes a search like this:
+#
+#   - category names in it become filters ("phishing" -> incident_type
+#     Phishing, "critical" -> severity Critical)
+#   - question and stop words are dropped ("which", "mention", ...)
+#   - rows with every remaining word come first; if there are fewer than
+#     ROWS, rows with any of them fill up, leaving out words found in so
+#     many rows (COMMON_ROWS) that they would crowd out the rarer ones
+#   - with filters but no words left ("open critical phishing incidents"),
+#     the newest rows matching the filters are used
+#
+# If the filters leave no row, the search is run again without them.
+#
+# Settings (environment):
+#   ASSISTANT_RETRIEVAL=0              no rows in the prompt
+#   ASSISTANT_RETRIEVAL_ROWS           rows per question at most (default 8)
+#   ASSISTANT_RETRIEVAL_TOKENS         token budget of the rows (default 800)
+
+import os
+import re
+
+import pandas as pd
+
+from app.data.db import connect_database
+from app.data.categories import CODED_COLUMNS, category_labels
+from app.data.pagination import keyset_page
+from app.data.search import MAX_CANDIDATES, SEARCH_INDEXES, search_table, word_counts
+from app.services.tokens import count_tokens
+
+ENABLED = os.environ.get("ASSISTANT_RETRIEVAL", "1") != "0"
+ROWS = int(os.environ.get("ASSISTANT_RETRIEVAL_ROWS", 8))
+RETRIEVAL_TOKENS = int(os.environ.get("ASSISTANT_RETRIEVAL_TOKENS", 800))
+# A word in at least this many rows is left out of the any-word search
+COMMON_ROWS = MAX_CANDIDATES
+# Words of a question searched at most
+MAX_WORDS = 8
+# Characters of a row's text shown in the prompt
+TEXT_CHARS = 240
+
+STOP_WORDS = frozenset("""
+    a about above after again all also am an and any are as at be been before
+    being below between both but by can could did do does doing down during
+    each few for from further had has have having he her here hers him his how
+    i if in into is it its itself just me more most my no nor not now of off
+    on once only or other our out over own same she should so some such than
+    that the their them then there these they this those through to too under
+    until up very was we were what when where which while who whom why will
+    with would you your
+    give find list show tell describe explain summarize summarise mention
+    mentions mentioned mentioning contain contains containing related many
+    much recent latest still please
+    incident incidents ticket tickets row rows record records
+""".split())
+
+_WORD = re.compile(r"[^\W_]+")
+
+
+def _text(value):
+    return " ".join(str(value).replace("_", " ").replace("-", " ").lower().split())
+
+
+def _filters(table_name, question):
+    # {column: [labels]} for the category names in the question, and the
+    # question without them
+    text = _text(question)
+    filters = {}
+    for column in CODED_COLUMNS.get(table_name, ()):
+        # Longest labels first, so "data breach" is not read as "breach"
+        for label in sorted(category_labels(column), key=len, reverse=True):
+            pattern = re.compile(r"\b" + re.escape(_text(label)) + r"(?:e?s)?\b")
+            if pattern.search(text):
+                filters.setdefault(column, []).append(label)
+                text = pattern.sub(" ", text)
+    return filters, text
+
+
+def keywords(text):
+    # The words of a question worth searching for, in order, without repeats
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) > 1 and word not in STOP_WORDS and word not in words:
+            words.append(word)
+    return words[:MAX_WORDS]
+
+
+def _newest(table_name, filters, limit):
+    conn = connect_database()
+    try:
+        return keyset_page(conn, table_name, page_size=limit, filters=filters)["rows"]
+    finally:
+        conn.close()
+
+
+def _text_search(table_name, words, filters, limit):
+    # Rows with every word, then rows with any of the less common ones
+    found = search_table(table_name, " ".join(words), filters, limit)
+    if len(found) < limit and len(words) > 1:
+        counts = word_counts(table_name, words, COMMON_ROWS)
+        rare = [w for w in words if 0 < counts.get(w, 0) < COMMON_ROWS]
+        wanted = rare or [w for w in words if counts.get(w, 0)]
+        if wanted:
+            more = search_table(table_name, " ".join(wanted), filters, limit, any_word=True)
+            if len(found) and len(more):
+                more = more[~more["id"].isin(found["id"])]
+            found = pd.concat([found, more], ignore_index=True) if len(found) else more
+    return found.head(limit)
+
+
+def retrieve_rows(table_name, question, limit=ROWS):
+    # The rows of a table that match `question` best (at most `limit`)
+    if table_name not in SEARCH_INDEXES:
+        raise ValueError(f"No search index for {table_name}")
+    filters, rest = _filters(table_name, question)
+    words = keywords(rest)
+    if words:
+        found = _text_search(table_name, words, filters, limit)
+        if not len(found) and filters:
+            # Category names may just be words in the text ("phishing email")
+            found = _text_search(table_name, keywords(question), None, limit)
+        return found
+    if filters:
+        return _newest(table_name, filters, limit)
+    return pd.DataFrame()
+
+
+def _value(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return " ".join(str(value).split())
+
+
+def render_rows(table_name, df, budget=RETRIEVAL_TOKENS):
+    # Rows as prompt text: a header naming the columns, then one line per
+    # row (text cut to TEXT_CHARS), as many as fit `budget` tokens
+    if df is None or not len(df):
+        return ""
+    text_columns = [c for c in SEARCH_INDEXES[table_name][1] if c in df.columns]
+    # Columns empty in all of these rows are left out
+    fields = [
+        c for c in df.columns
+        if c not in text_columns and c not in ("rank", "snippet") and df[c].notna().any()
+    ]
+    header = f"Rows of {table_name} matching the question, best first ({' | '.join(fields + text_columns)}):"
+    lines = [header]
+    used = count_tokens(header)
+    for row in zip(*(df[c].tolist() for c in fields + text_columns)):
+        values = [_value(v) for v in row]
+        for i in range(len(fields), len(values)):
+            if len(values[i]) > TEXT_CHARS:
+                values[i] = values[i][:TEXT_CHARS - 1] + "…"
+        line = " | ".join(values)
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines) if len(lines) > 1 else ""
+
+
+def question_context(question, tables, limit=ROWS, budget=RETRIEVAL_TOKENS):
+    # Prompt text listing the rows of `tables` that match the question,
+    # within `budget` tokens in all: {"text", "rows"} ("" and 0 if none)
+    if not ENABLED or not tables:
+        return {"text": "", "rows": 0}
+    parts = []
+    rows = 0
+    share = budget // len(tables)
+    for table_name in tables:
+        text = render_rows(table_name, retrieve_rows(table_name, question, limit), share)
+        if text:
+            parts.append(text)
+            rows += text.count("\n")
+    return {"text": "\n\n".join(parts), "rows": rows}
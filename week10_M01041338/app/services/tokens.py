@@ -0,0 +1,38 @@
+# Token counts for assistant prompts
+#
+# With tiktoken installed, counts use the model's own encoding. Without it
+# they are estimated at CHARS_PER_TOKEN characters per token, which is close
+# for English text and errs on the high side for numbers and ids.
+
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:          # optional: estimated counts without it
+    tiktoken = None
+
+from app.services.assistant_client import MODEL
+
+CHARS_PER_TOKEN = 4
+# Added per chat message for the role and separators
+MESSAGE_OVERHEAD = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text, model=MODEL):
+    if tiktoken is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(_encoding(model).encode(text))
+
+
+def message_tokens(message, model=MODEL):
+    # Tokens a {"role", "content"} message takes in a request
+    return count_tokens(message["content"], model) + MESSAGE_OVERHEAD
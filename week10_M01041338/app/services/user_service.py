@@ -1,44 +1,46 @@
-import bcrypt
+import sqlite3
+
 from app.data.db import connect_database
+from app.services.auth_pool import get_auth_pool
 
 
+# bcrypt runs on the auth worker pool (see auth_pool.py) so a burst of
+# logins does not block other sessions. Both calls can raise AuthBusy or
+# AuthTimeout, which the functions below report as errors.
 def hash_password(plain_text_password):
-    password_bytes = plain_text_password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password_bytes, salt)
-    return hashed.decode('utf-8')
+    return get_auth_pool().hash_password(plain_text_password)
 
 
 def verify_password(plain_text_password, hashed_password):
-    try:
-        password_bytes = plain_text_password.encode('utf-8')
-        hashed_bytes = hashed_password.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hashed_bytes)
-    except Exception as e:
-        print(f"Password verification error: {e}")
-        return False
+    return get_auth_pool().verify_password(plain_text_password, hashed_password)
 
 
 # CREATE
 def register_user(username, password, role="user"):
+    # The pooled connection is only held for the two short queries, not
+    # while bcrypt runs
     try:
-        conn = connect_database()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-        if cursor.fetchone():
-            conn.close()
+        if user_exists(username):
             return False, f"Username '{username}' already exists."
-        
+
         hashed = hash_password(password)
-        
-        cursor.execute(
-            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-            (username, hashed, role)
-        )
-        conn.commit()
-        conn.close()
-        
+
+        conn = connect_database()
+        try:
+            conn.execute(
+                "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                (username, hashed, role)
+            )
+            conn.commit()
+        except sqlite3.IntegrityError:
+            # Registered by someone else while the password was hashed
+            conn.rollback()
+            if user_exists(username):
+                return False, f"Username '{username}' already exists."
+            raise
+        finally:
+            conn.close()
+
         return True, f"User '{username}' registered successfully!"
     
     except Exception as e:
@@ -0,0 +1,79 @@
+# Load test: logins/sec through login_user() at different auth pool sizes
+#
+# Registers one user in a throwaway database, then fires LOGINS concurrent
+# login_user() calls from CLIENTS threads (like many Streamlit sessions
+# logging in at once) for each worker count.
+#
+# Run from the week10 folder:  python benchmark_auth.py [logins]
+
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import app.data.db as db
+from app.data.schema import create_users_table
+from app.services.auth_pool import configure_auth_pool
+from app.services.user_service import login_user, register_user
+
+WORKER_COUNTS = (1, 4, 16)
+CLIENTS = 32
+LOGINS = 200
+
+
+def run(workers, logins):
+    pool = configure_auth_pool(workers=workers, max_pending=CLIENTS, timeout=120.0)
+
+    # Start the worker processes before timing
+    list(ThreadPoolExecutor(workers).map(lambda _: pool.hash_password("warmup"), range(workers)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as clients:
+        results = list(clients.map(lambda _: login_user("loadtest", "Password123!"), range(logins)))
+    seconds = time.perf_counter() - started
+
+    ok = sum(1 for success, _ in results if success)
+    metrics = pool.metrics()
+    return {
+        "workers": workers,
+        "logins_per_sec": logins / seconds,
+        "ok": ok,
+        "max_queue_depth": metrics["max_queue_depth"],
+        "timeouts": metrics["timeouts"],
+        "rejected": metrics["rejected"],
+    }
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else LOGINS
+
+    workdir = Path(tempfile.mkdtemp())
+    db.DATABASE_FILE = str(workdir / "auth.db")
+    conn = db.connect_database()
+    create_users_table(conn)
+    conn.close()
+
+    configure_auth_pool(workers=1)
+    register_user("loadtest", "Password123!")
+
+    print(f"{logins} logins from {CLIENTS} client threads")
+    print(f"{'workers':>8}{'logins/s':>12}{'ok':>8}{'max depth':>11}{'timeouts':>10}")
+    for workers in WORKER_COUNTS:
+        result = run(workers, logins)
+        print(
+            f"{result['workers']:>8}"
+            f"{result['logins_per_sec']:>12.1f}"
+            f"{result['ok']:>8}"
+            f"{result['max_queue_depth']:>11}"
+            f"{result['timeouts']:>10}"
+        )
+
+    configure_auth_pool(workers=0)
+    db.close_all_pools()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
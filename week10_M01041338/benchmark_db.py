@@ -0,0 +1,113 @@
+# Benchmark: concurrent read/write throughput per database profile
+#
+# Copies intelligence_platform.db to a temp folder, then runs several reader
+# threads (dashboard style queries) next to one writer thread (CRUD style
+# inserts/updates) for a few seconds under each profile.
+#
+# Run from the week10 folder:  python benchmark_db.py [path/to/db] [seconds]
+
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app.data.db import DATABASE_FILE, PROFILES, apply_profile
+from app.data.pool import ConnectionPool
+from app.data.categories import table_encoder
+
+READERS = 4
+
+
+def _read_once(conn):
+    conn.execute(
+        "SELECT severity, COUNT(*) FROM cyber_incidents GROUP BY severity"
+    ).fetchall()
+    conn.execute(
+        "SELECT * FROM cyber_incidents ORDER BY id DESC LIMIT 100"
+    ).fetchall()
+
+
+def _write_once(conn):
+    encode = table_encoder(conn, "cyber_incidents")
+    cursor = conn.execute("""
+        INSERT INTO cyber_incidents
+        (date, incident_type, severity, status, description, reported_by)
+        VALUES ('2024-11-05', ?, ?, ?, 'benchmark', 'bench')
+    """, (encode("incident_type", "Phishing"), encode("severity", "high"), encode("status", "open")))
+    conn.execute(
+        "UPDATE cyber_incidents SET status = ? WHERE id = ?",
+        (encode("status", "resolved"), cursor.lastrowid)
+    )
+    conn.commit()
+
+
+def _worker(pool, stop, counts, work, counter):
+    # Repeat one unit of work until told to stop; lock errors are counted
+    while not stop.is_set():
+        try:
+            with pool.connection() as conn:
+                work(conn)
+            counts[counter] += 1
+        except sqlite3.OperationalError:
+            counts["errors"] += 1
+
+
+def run_profile(source_db, profile_name, seconds):
+    # Each profile gets a fresh copy so results are comparable
+    workdir = Path(tempfile.mkdtemp())
+    db_file = workdir / "bench.db"
+    shutil.copy(source_db, db_file)
+
+    pool = ConnectionPool(
+        db_file,
+        max_size=READERS + 1,
+        on_connect=lambda conn: apply_profile(conn, profile_name),
+    )
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+
+    threads = [
+        threading.Thread(target=_worker, args=(pool, stop, counts, _read_once, "reads"))
+        for _ in range(READERS)
+    ]
+    threads.append(
+        threading.Thread(target=_worker, args=(pool, stop, counts, _write_once, "writes"))
+    )
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    pool.close_all()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "profile": profile_name,
+        "reads_per_sec": counts["reads"] / seconds,
+        "writes_per_sec": counts["writes"] / seconds,
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    source_db = sys.argv[1] if len(sys.argv) > 1 else DATABASE_FILE
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+
+    print(f"Database: {source_db}  ({READERS} readers + 1 writer, {seconds:.0f}s each)")
+    print(f"{'profile':<14}{'reads/s':>12}{'writes/s':>12}{'errors':>8}")
+    for profile_name in PROFILES:
+        result = run_profile(source_db, profile_name, seconds)
+        print(
+            f"{result['profile']:<14}"
+            f"{result['reads_per_sec']:>12.1f}"
+            f"{result['writes_per_sec']:>12.1f}"
+            f"{result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# Benchmark: retrieval of incident rows for the assistant
+#
+# Builds a throwaway database with N incidents (descriptions made from a
+# small vocabulary, a few words rare) for each size given, then measures,
+# each in a fresh process with its peak memory (RSS):
+#
+#   write, no index     insert + delete WRITES incidents before the index exists
+#   index build         create_search_index(): the FTS5 index over every row
+#   write, index        the same writes with the index kept up to date
+#   query (cold)        first question_context() call of a process
+#   query               question_context() for each of QUESTIONS, REPEAT times
+#
+# and the size of the index on disk.
+#
+# On this machine (1M incidents): index built in 4.7s, 42 MB on disk; a
+# question takes 35 ms median, 90 ms p95; writes cost ~0.75 ms per row more
+# with the index kept up to date (0.03 ms without).
+#
+# Run from the week10 folder:  python benchmark_retrieval.py [rows ...]
+# (default 100000 1000000)
+
+import json
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import app.data.db as db
+
+SIZES = (100_000, 1_000_000)
+REPEAT = 5
+WRITES = 1000
+TABLE = "cyber_incidents"
+BATCH = 50_000
+
+QUESTIONS = (
+    "which phishing incidents mention payroll?",
+    "open critical phishing incidents",
+    "any ransomware on the backup servers?",
+    "malware found on finance laptops",
+    "data breaches involving customer records",
+    "vpn credential stuffing from unknown ip addresses",
+    "what happened with the ddos against the web gateway",
+    "incidents reported by the soc about usb devices",
+)
+
+ACTIONS = ("Suspicious login", "Blocked email", "Unusual traffic", "Malicious file",
+           "Credential theft attempt", "Policy violation", "Encrypted files", "Port scan")
+ASSETS = ("laptop", "web gateway", "mail server", "database server", "vpn concentrator",
+          "domain controller", "backup servers", "workstation", "file share", "cloud bucket")
+TEAMS = ("finance", "hr", "sales", "engineering", "support", "legal", "marketing", "it")
+DETAILS = ("reported by the soc", "flagged by the edr agent", "found in the proxy logs",
+           "raised by a user", "seen from an unknown ip address", "linked to a usb device",
+           "after a credential stuffing wave", "involving customer records")
+# Rare words, each in about 1 row in 200
+RARE = ("payroll", "invoice", "ceo", "wire transfer", "tax form", "badge")
+
+
+def descriptions(rng, rows):
+    # Text made of the lists above; one row in 200 also gets a rare word
+    action = rng.integers(len(ACTIONS), size=rows)
+    asset = rng.integers(len(ASSETS), size=rows)
+    team = rng.integers(len(TEAMS), size=rows)
+    detail = rng.integers(len(DETAILS), size=rows)
+    rare = rng.integers(len(RARE) * 200, size=rows)
+    for i in range(rows):
+        text = f"{ACTIONS[action[i]]} on {TEAMS[team[i]]} {ASSETS[asset[i]]}, {DETAILS[detail[i]]}"
+        if rare[i] < len(RARE):
+            text += f"; mentions {RARE[rare[i]]}"
+        yield text
+
+
+def build_database(path, rows):
+    # Real schema without the search index (built and timed separately)
+    # and without rollups (not read here)
+    from app.data.schema import create_all_tables
+    from app.data.search import drop_search_index
+    from app.data.rollups import drop_rollups
+
+    db.DATABASE_FILE = str(path)
+    conn = db.connect_database()
+    create_all_tables(conn)
+    drop_search_index(conn, TABLE)
+    drop_rollups(conn, TABLE)
+    rng = np.random.default_rng(20)
+    texts = descriptions(rng, rows)
+    for start in range(0, rows, BATCH):
+        size = min(BATCH, rows - start)
+        days = rng.integers(3650, size=size)
+        types = rng.integers(1, 6, size=size)
+        severities = rng.integers(1, 5, size=size)
+        statuses = rng.integers(1, 7, size=size)
+        conn.executemany(f"""
+            INSERT INTO {TABLE} (date, incident_type, severity, status, description, reported_by)
+            VALUES (date('2015-01-01', '+' || ? || ' days'), ?, ?, ?, ?, ?)
+        """, [
+            (int(days[i]), int(types[i]), int(severities[i]), int(statuses[i]),
+             next(texts), f"user{(start + i) % 500}")
+            for i in range(size)
+        ])
+        conn.commit()
+    conn.close()
+    db.close_all_pools()
+
+
+def _index_mb(conn):
+    fts_name = "incidents_fts"
+    size = conn.execute(
+        "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name LIKE ?", (f"{fts_name}%",)
+    ).fetchone()[0]
+    return size / 1e6
+
+
+def measure(step, path):
+    # Runs in a child process: one step, printed as JSON
+    from app.data.incidents import insert_incidents, delete_incidents
+    from app.data.search import create_search_index
+
+    db.DATABASE_FILE = str(path)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result = {}
+    started = time.perf_counter()
+    if step == "index build":
+        conn = db.connect_database()
+        create_search_index(conn, TABLE)
+        result["seconds"] = time.perf_counter() - started
+        result["index_mb"] = _index_mb(conn)
+        conn.close()
+    elif step.startswith("write"):
+        records = [("2024-06-01", "Phishing", "High", "Open", text, "bench")
+                   for text in descriptions(np.random.default_rng(1), WRITES)]
+        ids = insert_incidents(records)
+        inserted = time.perf_counter()
+        delete_incidents(ids)
+        result["seconds"] = time.perf_counter() - started
+        result["insert_ms_per_row"] = (inserted - started) * 1000 / WRITES
+        result["delete_ms_per_row"] = (time.perf_counter() - inserted) * 1000 / WRITES
+    else:
+        from app.services.retrieval import question_context
+        started = time.perf_counter()
+        context = question_context(QUESTIONS[0], (TABLE,))
+        result["cold_ms"] = (time.perf_counter() - started) * 1000
+        times = []
+        rows = []
+        for _ in range(REPEAT):
+            for question in QUESTIONS:
+                started = time.perf_counter()
+                context = question_context(question, (TABLE,))
+                times.append((time.perf_counter() - started) * 1000)
+                rows.append(context["rows"])
+        times.sort()
+        result["median_ms"] = statistics.median(times)
+        result["p95_ms"] = times[int(len(times) * 0.95) - 1]
+        result["max_ms"] = times[-1]
+        result["mean_rows"] = sum(rows) / len(rows)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result["peak_mb"] = peak / 1024             # ru_maxrss is in KiB on Linux
+    result["added_mb"] = (peak - before) / 1024
+    print(json.dumps(result))
+
+
+def run_child(step, path):
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure", step, str(path)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or list(SIZES)
+    for rows in sizes:
+        workdir = Path(tempfile.mkdtemp())
+        path = workdir / "retrieval.db"
+        started = time.perf_counter()
+        build_database(path, rows)
+        print(f"\n{rows:,} incidents (database built in {time.perf_counter() - started:.1f}s)")
+
+        write_plain = run_child("write, no index", path)
+        build = run_child("index build", path)
+        write_indexed = run_child("write, index", path)
+        query = run_child("query", path)
+
+        print(f"  index build      {build['seconds']:8.2f} s     index {build['index_mb']:.1f} MB on disk, "
+              f"peak RSS {build['peak_mb']:.0f} MB (+{build['added_mb']:.0f})")
+        for name, write in (("write, no index", write_plain), ("write, index", write_indexed)):
+            print(f"  {name:<16} {write['insert_ms_per_row']:8.3f} ms  insert per row, "
+                  f"{write['delete_ms_per_row']:.3f} ms delete per row ({WRITES} rows, batched)")
+        print(f"  query            {query['median_ms']:8.2f} ms  median, p95 {query['p95_ms']:.2f} ms, "
+              f"max {query['max_ms']:.2f} ms, cold {query['cold_ms']:.1f} ms, "
+              f"{query['mean_rows']:.1f} rows per question, peak RSS {query['peak_mb']:.0f} MB")
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,137 @@
+# Benchmark: whole-table reads, pd.read_sql_query vs columnar snapshots
+#
+# Builds a throwaway database with N incidents for each size given, then
+# times each way of loading the table in a fresh process and reports its
+# peak memory (RSS):
+#
+#   read_sql_query         SELECT * ... ORDER BY id DESC (what get_all_incidents did)
+#   snapshot export        first read after a write: export + read
+#   snapshot               read of an up-to-date snapshot (memory-mapped)
+#   read_sql_query, 3 col  SELECT date, severity, status ...
+#   snapshot, 3 col        the same columns from the snapshot
+#
+# Run from the week10 folder:  python benchmark_snapshots.py [rows ...]
+# (default 100000 10000000; the 10M database needs a few GB of disk)
+
+import json
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import app.data.db as db
+
+SIZES = (100_000, 10_000_000)
+REPEAT = 3
+TABLE = "cyber_incidents"
+PROJECTION = ("date", "severity", "status")
+
+METHODS = (
+    "read_sql_query",
+    "snapshot export",
+    "snapshot",
+    "read_sql_query, 3 col",
+    "snapshot, 3 col",
+)
+
+
+def build_database(path, rows):
+    # Real schema, without the search index and rollups (not read here,
+    # and they would make filling 10M rows much slower)
+    from app.data.schema import create_all_tables
+    from app.data.search import drop_search_index
+    from app.data.rollups import drop_rollups
+
+    db.DATABASE_FILE = str(path)
+    conn = db.connect_database()
+    create_all_tables(conn)
+    drop_search_index(conn, TABLE)
+    drop_rollups(conn, TABLE)
+    conn.execute(f"""
+        INSERT INTO {TABLE} (date, incident_type, severity, status, description, reported_by)
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {rows})
+        SELECT date('2015-01-01', '+' || (i % 3650) || ' days'),
+               1 + i % 5, 1 + i % 4, 1 + i % 6,
+               'Suspicious activity reported on host ' || (i % 9973) || ' by the monitoring team',
+               'user' || (i % 500)
+        FROM n
+    """)
+    conn.commit()
+    conn.close()
+    db.close_all_pools()
+
+
+def measure(method, path):
+    # Runs in a child process: load the table one way, print the result
+    import pandas as pd
+    from app.data import snapshots
+    from app.data.cache import table_version
+    from app.data.categories import decode_frame
+
+    db.DATABASE_FILE = str(path)
+    if method in ("snapshot", "snapshot, 3 col"):
+        # The parent exported it for this database and nothing has written since
+        key = (db.DATABASE_FILE, TABLE, "id DESC")
+        snapshots._current[key] = (table_version(TABLE), snapshots.snapshot_dir() / f"{TABLE}.arrow")
+    if method == "snapshot export":
+        snapshots.drop_snapshots()
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if method.startswith("snapshot"):
+        columns = PROJECTION if method.endswith("3 col") else None
+        df = snapshots.read_snapshot(TABLE, columns)
+    else:
+        selected = ", ".join(PROJECTION) if method.endswith("3 col") else "*"
+        conn = db.connect_database()
+        df = decode_frame(TABLE, pd.read_sql_query(
+            f"SELECT {selected} FROM {TABLE} ORDER BY id DESC", conn
+        ))
+        conn.close()
+    seconds = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "seconds": seconds,
+        "peak_mb": peak / 1024,             # ru_maxrss is in KiB on Linux
+        "added_mb": (peak - before) / 1024,
+        "rows": len(df),
+    }))
+
+
+def run_child(method, path):
+    output = subprocess.run(
+        [sys.executable, __file__, "--measure", method, str(path)],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or list(SIZES)
+    print(f"{'rows':>12}  {'method':<24}{'seconds':>10}{'peak RSS MB':>13}{'added MB':>10}")
+    for rows in sizes:
+        workdir = Path(tempfile.mkdtemp())
+        path = workdir / "snapshots.db"
+        started = time.perf_counter()
+        build_database(path, rows)
+        print(f"{rows:>12,}  (database built in {time.perf_counter() - started:.1f}s)")
+
+        for method in METHODS:
+            # Fastest of REPEAT runs, each in a new process
+            results = [run_child(method, path) for _ in range(REPEAT)]
+            best = min(results, key=lambda r: r["seconds"])
+            print(
+                f"{rows:>12,}  {method:<24}{best['seconds']:>10.3f}"
+                f"{best['peak_mb']:>13.1f}{best['added_mb']:>10.1f}"
+            )
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--measure"]:
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,205 @@
+# Streaming check for the assistant client, against a local fake API
+#
+# Starts a fake OpenAI chat completions server on 127.0.0.1 (server-sent
+# events, a fixed delay before the first token and between tokens) and
+# runs app/services/assistant_client.py against it:
+#
+#   streamed text, time to first token, tokens/s and usage tokens
+#   one client and one kept-alive connection for several replies
+#   cancel() and close() stop the reply and drop the connection
+#   read timeouts (server stalls) and total timeout (reply too long)
+#   server error, and the non-streaming mode
+#
+# Nothing is sent to the real API. Exit code 1 if any check fails.
+#
+# Run from the week10 folder:  python check_assistant_stream.py
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services import assistant_client
+
+FIRST_TOKEN_DELAY = 0.20      # seconds before the first token
+TOKEN_DELAY = 0.01            # seconds between tokens
+TOKENS = 50
+STALL = 2.0                   # "stall" requests wait this long before answering
+SHORT_TIMEOUT = 0.5
+
+
+def _reply_tokens(count=TOKENS):
+    return [f"tok{i} " for i in range(count)]
+
+
+class FakeCompletions(BaseHTTPRequestHandler):
+    # POST /v1/chat/completions; the last message picks the behaviour:
+    #   "stall"  wait STALL seconds first     "fail"  answer 500
+    #   "long"   ten times as many tokens     "pause"  stall after 5 tokens
+    #   anything else: TOKENS tokens
+    protocol_version = "HTTP/1.1"      # keep-alive, so connection reuse shows
+    connections = set()
+    aborted = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        FakeCompletions.connections.add(self.client_address)
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+
+        if prompt == "fail":
+            data = json.dumps({"error": {"message": "fake failure", "type": "server_error"}}).encode()
+            self.send_response(500)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        if prompt == "stall":
+            time.sleep(STALL)
+
+        tokens = _reply_tokens(TOKENS * 10 if prompt == "long" else TOKENS)
+        if not body.get("stream"):
+            data = json.dumps({
+                "id": "fake", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens)}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": len(tokens), "total_tokens": len(tokens) + 1},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            time.sleep(FIRST_TOKEN_DELAY)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(STALL if prompt == "pause" and i == 5 else TOKEN_DELAY)
+                self._event({"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}, body)
+            self._event({"choices": [], "usage": {
+                "prompt_tokens": 1, "completion_tokens": len(tokens), "total_tokens": len(tokens) + 1,
+            }}, body)
+            # Last event and end of the body in one write, as a real server
+            # would, so the client finds the response complete and keeps the
+            # connection
+            self._send(b"data: [DONE]\n\n", end=True)
+        except (BrokenPipeError, ConnectionResetError):
+            FakeCompletions.aborted += 1
+            self.close_connection = True
+
+    def _event(self, chunk, body):
+        chunk.update({"id": "fake", "object": "chat.completion.chunk", "created": 0, "model": body["model"]})
+        self._send(f"data: {json.dumps(chunk)}\n\n".encode())
+
+    def _send(self, data, end=False):
+        # One HTTP chunk, flushed straight away
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n" + (b"0\r\n\r\n" if end else b""))
+        self.wfile.flush()
+
+
+def _messages(prompt):
+    return [{"role": "system", "content": "test"}, {"role": "user", "content": prompt}]
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeCompletions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    assistant_client.BASE_URL = base_url
+    failures = []
+
+    def check(label, ok, detail=""):
+        print(f"{'ok  ' if ok else 'FAIL'}  {label}{'  ' + detail if detail else ''}")
+        if not ok:
+            failures.append(label)
+
+    expected = "".join(_reply_tokens())
+
+    # Streaming: text, time to first token, tokens/s
+    reply = assistant_client.stream_reply("test", _messages("hello"))
+    started = time.perf_counter()
+    first = None
+    for _ in reply:
+        first = first or time.perf_counter() - started
+    check("streamed text", reply.text == expected and reply.status == "ok")
+    check("first token before the end", first is not None and first < reply.seconds / 2,
+          f"first chunk {first:.3f}s of {reply.seconds:.3f}s")
+    check("time to first token recorded", abs(reply.ttft - FIRST_TOKEN_DELAY) < 0.15, f"ttft {reply.ttft:.3f}s")
+    check("usage tokens", reply.tokens == TOKENS, f"{reply.tokens} tokens, {reply.tokens_per_s:.0f} tok/s")
+
+    # One client, one connection for several replies
+    FakeCompletions.connections.clear()
+    for _ in range(3):
+        list(assistant_client.stream_reply("test", _messages("hello")))
+    check("client reused", assistant_client.get_client("test") is assistant_client.get_client("test"))
+    check("connection kept alive", len(FakeCompletions.connections) == 1,
+          f"{len(FakeCompletions.connections)} connection(s) for 3 replies")
+
+    # Cancellation
+    reply = assistant_client.stream_reply("test", _messages("hello"))
+    for n, _ in enumerate(reply):
+        if n == 2:
+            reply.cancel()
+    check("cancel()", reply.status == "cancelled" and reply.text == "".join(_reply_tokens(3)),
+          f"{reply.status}, {len(reply.text)} chars kept")
+
+    aborted = FakeCompletions.aborted
+    reply = assistant_client.stream_reply("test", _messages("long"))
+    iterator = iter(reply)
+    next(iterator)
+    reply.close()
+    time.sleep(0.3)
+    check("close() drops the connection", reply.status == "cancelled" and FakeCompletions.aborted > aborted,
+          f"{reply.status}, server saw {FakeCompletions.aborted - aborted} abort(s)")
+
+    # Timeouts and errors, on a client without retries and a short read timeout
+    assistant_client.READ_TIMEOUT = SHORT_TIMEOUT
+    assistant_client.MAX_RETRIES = 0
+    started = time.perf_counter()
+    reply = assistant_client.stream_reply("short-timeout", _messages("stall"))
+    text = "".join(reply)
+    check("read timeout", reply.status == "timeout" and text.startswith("OpenAI error")
+          and time.perf_counter() - started < STALL, f"{reply.status} after {reply.seconds:.2f}s")
+
+    reply = assistant_client.stream_reply("short-timeout", _messages("pause"))
+    list(reply)
+    check("read timeout mid-reply", reply.status == "timeout" and reply.text == "".join(_reply_tokens(5)),
+          f"{reply.status} after {reply.seconds:.2f}s, {len(reply.text)} chars kept")
+
+    reply = assistant_client.stream_reply("test", _messages("long"), timeout=SHORT_TIMEOUT)
+    list(reply)
+    check("total timeout", reply.status == "timeout" and 0 < len(reply.text) < len(expected) * 10,
+          f"{reply.status} after {reply.seconds:.2f}s, {reply.tokens} tokens kept")
+
+    reply = assistant_client.stream_reply("short-timeout", _messages("fail"))
+    text = "".join(reply)
+    check("server error", reply.status == "error" and text.startswith("OpenAI error"), reply.status)
+
+    # Waiting for the whole reply
+    reply = assistant_client.stream_reply("test", _messages("hello"), stream=False)
+    check("non-streaming mode", "".join(reply) == expected and reply.tokens == TOKENS, reply.status)
+
+    stats = {row["model"]: row for row in assistant_client.reply_stats()}[assistant_client.MODEL]
+    check("reply statistics", stats["replies"] == 11 and stats["cancelled"] == 2 and stats["failed"] == 4,
+          f"{stats['replies']} replies, {stats['ok']} ok, {stats['cancelled']} cancelled, {stats['failed']} failed")
+
+    assistant_client.close_clients()
+    server.shutdown()
+    if failures:
+        print(f"\n{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("\nAll assistant checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# Query plan regression check for the data layer
+#
+# Builds a throwaway database with the real schema + indexes, fills it with
+# ROWS synthetic rows per table, then calls the functions in app/data and
+# app/services while tracing every SQL statement they run. Each statement is
+# put through EXPLAIN QUERY PLAN and the check fails (exit code 1) if any of
+# them scans a whole table instead of using an index.
+#
+# Run from the week10 folder:  python check_query_plans.py [rows]
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import app.data.db as db
+from app.data.cache import clear_cache
+from app.data.rollups import ROLLUPS
+from app.data.categories import LOOKUPS
+from app.data.schema import create_all_tables, optimize_indexes
+from app.data import incidents, search, timeseries
+from app.services import user_service
+
+ROWS = 1_000_000
+
+# (label, call, reads_everything)
+# reads_everything=True marks functions that return the whole table on
+# purpose, so a full scan is the expected plan for them.
+CHECKS = [
+    ("get_all_incidents", lambda: incidents.get_all_incidents(), True),
+    ("get_incident_by_id", lambda: incidents.get_incident_by_id(ROWS // 2), False),
+    ("get_incidents_by_type", lambda: incidents.get_incidents_by_type(), False),
+    ("get_incidents_page by id", lambda: incidents.get_incidents_page(after=(ROWS // 2,)), False),
+    ("get_incidents_page by date", lambda: incidents.get_incidents_page(order_by="date"), False),
+    ("get_incidents_page by date, next", lambda: incidents.get_incidents_page(after=("2023-06-01", ROWS // 2), order_by="date"), False),
+    ("get_incidents_page by date, previous", lambda: incidents.get_incidents_page(before=("2023-06-01", ROWS // 2), order_by="date"), False),
+    ("get_incident_timeline", lambda: incidents.get_incident_timeline(split_by="severity"), False),
+    ("get_incident_timeline by hour", lambda: timeseries.time_series("cyber_incidents", bucket="hour", budget=10 ** 6), False),
+    ("update_incident_status", lambda: incidents.update_incident_status(1, "Resolved"), False),
+    ("delete_incident", lambda: incidents.delete_incident(2), False),
+    ("update_incidents_status", lambda: incidents.update_incidents_status([3, 4, 5], "Contained"), False),
+    ("delete_incidents", lambda: incidents.delete_incidents([6, 7, 8]), False),
+    ("search_incidents", lambda: search.search_incidents("phishing", {"severity": "High"}), False),
+    ("get_user_by_username", lambda: user_service.get_user_by_username("user42"), False),
+    ("user_exists", lambda: user_service.user_exists("user42"), False),
+    ("update_user_role", lambda: user_service.update_user_role("user42", "analyst"), False),
+    ("get_all_users", lambda: user_service.get_all_users(), True),
+]
+
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def _label_id(column, label_sql):
+    # Lookup id of a category label (the data tables store ids)
+    table, label_column, _ = LOOKUPS[column]
+    return f"(SELECT id FROM {table} WHERE {label_column} = {label_sql})"
+
+
+INCIDENT_TYPE = _label_id("incident_type", (
+    "CASE i % 5 WHEN 0 THEN 'Phishing' WHEN 1 THEN 'Malware' WHEN 2 THEN 'DDoS' "
+    "WHEN 3 THEN 'Ransomware' ELSE 'Data Breach' END"
+))
+INCIDENT_SEVERITY = _label_id("severity", (
+    "CASE i % 4 WHEN 0 THEN 'Critical' WHEN 1 THEN 'High' WHEN 2 THEN 'Medium' ELSE 'Low' END"
+))
+INCIDENT_STATUS = _label_id("status", (
+    "CASE i % 3 WHEN 0 THEN 'Investigating' WHEN 1 THEN 'Contained' ELSE 'Resolved' END"
+))
+TICKET_PRIORITY = _label_id("priority", (
+    "CASE i % 4 WHEN 0 THEN 'Critical' WHEN 1 THEN 'High' WHEN 2 THEN 'Medium' ELSE 'Low' END"
+))
+TICKET_STATUS = _label_id("status", (
+    "CASE i % 4 WHEN 0 THEN 'Open' WHEN 1 THEN 'In Progress' WHEN 2 THEN 'Resolved' ELSE 'Closed' END"
+))
+
+
+def fill_database(conn, rows):
+    # Synthetic rows with a realistic spread of categories
+    conn.execute(f"""
+        INSERT INTO cyber_incidents (date, incident_type, severity, status, description, reported_by)
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {rows})
+        SELECT date('2015-01-01', '+' || (i % 3650) || ' days'),
+               {INCIDENT_TYPE}, {INCIDENT_SEVERITY}, {INCIDENT_STATUS},
+               'Incident ' || i, 'user' || (i % 500)
+        FROM n
+    """)
+    conn.execute(f"""
+        INSERT INTO it_tickets (ticket_id, priority, status, category, subject, description,
+                                created_date, assigned_to)
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {rows})
+        SELECT 'TKT-' || i, {TICKET_PRIORITY}, {TICKET_STATUS},
+               'Software', 'Ticket ' || i, 'Ticket ' || i,
+               date('2015-01-01', '+' || (i % 3650) || ' days'), 'Team ' || (i % 4)
+        FROM n
+    """)
+    conn.execute(f"""
+        INSERT INTO datasets_metadata (dataset_name, category, source, last_updated,
+                                       record_count, file_size_mb)
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {rows})
+        SELECT 'Dataset_' || i, 'Category ' || (i % 10), 'Internal', '2024-01-01', i, i / 100.0
+        FROM n
+    """)
+    conn.execute(f"""
+        INSERT INTO users (username, password_hash, role)
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < {rows})
+        SELECT 'user' || i, 'x', 'user' FROM n
+    """)
+    conn.commit()
+
+
+# Tables of counts per category (per day), see app/data/rollups.py
+ROLLUP_TABLES = {
+    table
+    for settings in ROLLUPS.values()
+    for table in (f"{settings['name']}_counts", f"{settings['name']}_daily_counts")
+}
+# Category label tables, see app/data/categories.py
+LOOKUP_TABLES = {table for table, _, _ in LOOKUPS.values()}
+
+
+def full_scans(conn, sql):
+    # Return the plan lines that read a table without an index
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    bad = []
+    for row in plan:
+        detail = row[3]
+        # Subquery results, the schema table, the rollup and the lookup
+        # tables are small by construction
+        if detail.startswith(("SCAN (", "SCAN sqlite_")):
+            continue
+        if detail.split()[1] in ROLLUP_TABLES | LOOKUP_TABLES:
+            continue
+        if detail.startswith("SCAN ") and "INDEX" not in detail:
+            bad.append(detail)
+    return bad
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+
+    workdir = Path(tempfile.mkdtemp())
+    db.DATABASE_FILE = str(workdir / "plans.db")
+
+    print(f"Building test database with {rows:,} rows per table...")
+    started = time.perf_counter()
+    conn = db.connect_database()
+    create_all_tables(conn)
+    fill_database(conn, rows)
+    optimize_indexes(conn)
+    conn.execute("ANALYZE")
+    print(f"Built in {time.perf_counter() - started:.1f}s\n")
+
+    # conn stays checked out, so every data function below reuses it
+    # (nested connect_database() calls on one thread share a connection)
+    failures = 0
+    for label, call, reads_everything in CHECKS:
+        # A cache hit would run no SQL at all
+        clear_cache()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        try:
+            call()
+        finally:
+            conn.set_trace_callback(None)
+
+        for sql in statements:
+            if not sql.lstrip().upper().startswith(EXPLAINABLE):
+                continue
+            bad = full_scans(conn, sql)
+            if bad and not reads_everything:
+                failures += 1
+                print(f"FAIL  {label}: {' | '.join(bad)}")
+                print(f"      {' '.join(sql.split())}")
+            else:
+                print(f"ok    {label}")
+
+    conn.close()
+    db.close_all_pools()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f"\n{failures} quer{'y' if failures == 1 else 'ies'} fell back to a full table scan")
+        sys.exit(1)
+    print("\nAll queries use an index")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,39 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from app.data.incidents import (
     insert_incident,
-    get_all_incidents,
+    get_incidents_page,
+    get_incident_counts,
+    get_incident_timeline,
     update_incident_status,
+    update_incidents_status,
     delete_incident
 )
+from app.data.search import search_incidents
+from app.data.schema import ensure_schema
+from app.services.profiler import start_page, section, render_diagnostics
 
 # ---------------- LOGIN PROTECTION ----------------
 if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.error("❌ Please login first!")
     st.stop()
 
+# Time this rerun (diagnostics in the sidebar for admins)
+start_page("Cybersecurity")
+
 st.set_page_config(page_title="Cybersecurity Analytics", layout="wide")
 
 st.title("🛡️ Cybersecurity Incidents Dashboard")
 st.markdown("Monitor and analyze cybersecurity incidents across your organization")
+ensure_schema()
 
 # ---------------- READ (DATABASE) ----------------
-df_incidents = get_all_incidents()
+# Counts per (date, type, severity, status) drive the filters, metrics and
+# charts; incident rows are only read one page at a time (see TABLE below)
+with section("incident counts"):
+    df_counts = get_incident_counts()
 
-if df_incidents.empty:
+if df_counts.empty:
     st.warning("No incidents found in the database.")
 
 st.sidebar.markdown("---")
@@ -63,24 +75,27 @@ st.sidebar.subheader("Filters")
 
 severity_filter = st.sidebar.multiselect(
     "Severity Level",
-    options=df_incidents["severity"].unique(),
-    default=df_incidents["severity"].unique(),
+    options=df_counts["severity"].unique(),
+    default=df_counts["severity"].unique(),
 )
 
-filtered_df = (
-    df_incidents[df_incidents["severity"].isin(severity_filter)]
-    if severity_filter else df_incidents
-)
+with section("severity filter", "aggregate"):
+    filtered_counts = (
+        df_counts[df_counts["severity"].isin(severity_filter)]
+        if severity_filter else df_counts
+    )
+    total_incidents = int(filtered_counts["count"].sum())
 
 # ---------------- METRICS ----------------
 col1, col2, col3, col4 = st.columns(4)
-col1.metric("Total Incidents", len(filtered_df))
-col2.metric("Critical Issues", len(filtered_df[filtered_df["severity"] == "Critical"]))
-col3.metric(
-    "Resolved",
-    f"{len(filtered_df[filtered_df['status'] == 'Resolved'])}/{len(filtered_df)}"
-)
-col4.metric("Avg Resolution", f"{filtered_df.index.size:.1f}")
+with section("metrics", "aggregate"):
+    col1.metric("Total Incidents", total_incidents)
+    col2.metric("Critical Issues", int(filtered_counts.loc[filtered_counts["severity"] == "Critical", "count"].sum()))
+    col3.metric(
+        "Resolved",
+        f"{int(filtered_counts.loc[filtered_counts['status'] == 'Resolved', 'count'].sum())}/{total_incidents}"
+    )
+    col4.metric("Avg Resolution", f"{total_incidents:.1f}")
 
 st.markdown("---")
 
@@ -89,37 +104,135 @@ col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("Incidents by Severity")
-    fig1 = px.pie(
-        filtered_df,
-        names="severity"
-    )
-    st.plotly_chart(fig1, use_container_width=True)
+    with section("severity chart", "figure"):
+        fig1 = px.pie(
+            filtered_counts.groupby("severity", as_index=False)["count"].sum(),
+            names="severity",
+            values="count"
+        )
+        st.plotly_chart(fig1, use_container_width=True)
 
 with col2:
     st.subheader("Incidents Over Time")
-    timeline = filtered_df.groupby("date").size().reset_index(name="count")
-    fig2 = px.line(timeline, x="date", y="count", markers=True)
-    st.plotly_chart(fig2, use_container_width=True)
+    tcol1, tcol2 = st.columns(2)
+    with tcol1:
+        resolution = st.selectbox(
+            "Resolution", ["Auto", "Hour", "Day", "Week", "Month", "Year"],
+            key="timeline_resolution"
+        )
+    with tcol2:
+        split_by = st.selectbox("Split By", ["None", "Severity"], key="timeline_split")
+
+    # Counted per bucket from the rollups; coarser buckets are used when
+    # the range would need more points than the chart budget
+    with section("timeline"):
+        timeline = get_incident_timeline(
+            bucket=None if resolution == "Auto" else resolution.lower(),
+            split_by=None if split_by == "None" else "severity",
+            severities=severity_filter or None
+        )
+    with section("timeline chart", "figure"):
+        fig2 = px.line(
+            timeline["series"], x="period", y="count",
+            color=None if split_by == "None" else "severity",
+            markers=len(timeline["series"]) <= 60,
+            labels={"period": "Date", "count": "Incidents"}
+        )
+        st.plotly_chart(fig2, use_container_width=True)
+    st.caption(f"One point per {timeline['bucket']}")
 
 col1, col2 = st.columns(2)
 
 with col1:
     st.subheader("Incident Types")
-    fig3 = px.bar(
-        filtered_df["incident_type"].value_counts().reset_index(),
-        x="incident_type",
-        y="count"
-    )
-    st.plotly_chart(fig3, use_container_width=True)
+    with section("type chart", "figure"):
+        fig3 = px.bar(
+            filtered_counts.groupby("incident_type", as_index=False)["count"].sum()
+            .sort_values("count", ascending=False),
+            x="incident_type",
+            y="count"
+        )
+        st.plotly_chart(fig3, use_container_width=True)
 
 with col2:
     st.subheader("Status Distribution")
-    fig4 = px.bar(
-        filtered_df["status"].value_counts().reset_index(),
-        x="status",
-        y="count"
+    with section("status chart", "figure"):
+        fig4 = px.bar(
+            filtered_counts.groupby("status", as_index=False)["count"].sum()
+            .sort_values("count", ascending=False),
+            x="status",
+            y="count"
+        )
+        st.plotly_chart(fig4, use_container_width=True)
+
+st.markdown("---")
+
+# ---------------- SEARCH ----------------
+st.subheader("🔍 Search Incidents")
+
+search_query = st.text_input(
+    "Search descriptions",
+    placeholder="e.g. phishing credential (end a word with * to match its prefix)",
+    key="incident_search"
+)
+
+if search_query:
+    with section("search"):
+        results = search_incidents(
+            search_query,
+            filters={"severity": severity_filter} if severity_filter else None,
+            limit=25
+        )
+    if results.empty:
+        st.info("No matching incidents")
+    else:
+        st.caption(f"Top {len(results)} matches, best first")
+        for _, row in results.iterrows():
+            st.markdown(
+                f"**#{row['id']}** · {row['date']} · {row['severity']} · {row['status']} — "
+                f"{row['snippet']}"
+            )
+
+st.markdown("---")
+
+# ---------------- TABLE (ONE PAGE AT A TIME) ----------------
+st.subheader("Incident Details")
+
+col1, col2 = st.columns(2)
+with col1:
+    order_by = st.radio("Order By", ["id", "date"], horizontal=True, key="incident_order")
+with col2:
+    page_size = st.selectbox("Rows per Page", [25, 50, 100, 250], index=1, key="incident_page_size")
+
+# The page cursor is only valid for the ordering/filter it was taken with
+page_filter = (order_by, page_size, tuple(severity_filter))
+if st.session_state.get("incident_page_filter") != page_filter:
+    st.session_state.incident_page_filter = page_filter
+    st.session_state.incident_cursor = {}
+
+with section("incident page"):
+    page = get_incidents_page(
+        page_size=page_size,
+        order_by=order_by,
+        severities=tuple(severity_filter) if severity_filter else None,
+        **st.session_state.incident_cursor
     )
-    st.plotly_chart(fig4, use_container_width=True)
+page_df = page["rows"]
+
+with section("incident table", "table"):
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
+
+col1, col2, col3 = st.columns([1, 4, 1])
+with col1:
+    if st.button("◀ Previous", disabled=not page["has_previous"], use_container_width=True):
+        st.session_state.incident_cursor = {"before": page["first"]}
+        st.rerun()
+with col2:
+    st.caption(f"Showing {len(page_df)} of {total_incidents} incidents")
+with col3:
+    if st.button("Next ▶", disabled=not page["has_next"], use_container_width=True):
+        st.session_state.incident_cursor = {"after": page["last"]}
+        st.rerun()
 
 st.markdown("---")
 
@@ -128,7 +241,7 @@ st.subheader("✏️ Manage Incidents")
 
 selected_id = st.selectbox(
     "Select Incident ID",
-    options=filtered_df["id"].tolist()
+    options=page_df["id"].tolist()
 )
 
 new_status = st.selectbox(
@@ -150,12 +263,43 @@ with col2:
         st.warning("🗑️ Incident deleted")
         st.rerun()
 
-st.markdown("---")
+# ---------------- BULK STATUS CHANGE ----------------
+st.subheader("🗂️ Bulk Status Change")
 
-# ---------------- TABLE ----------------
-st.subheader("Incident Details")
-st.dataframe(filtered_df, use_container_width=True, hide_index=True)
+# Result of the last bulk update (shown after the rerun)
+if "bulk_status_message" in st.session_state:
+    st.success(st.session_state.pop("bulk_status_message"))
+
+select_page = st.checkbox("Select all incidents on this page", key="bulk_select_page")
+bulk_ids = st.multiselect(
+    "Incidents to update",
+    options=page_df["id"].tolist(),
+    default=page_df["id"].tolist() if select_page else [],
+    key=f"bulk_ids_{select_page}"
+)
+
+col1, col2 = st.columns([3, 1])
+with col1:
+    bulk_status = st.selectbox(
+        "New Status",
+        ["Investigating", "Contained", "Resolved"],
+        key="bulk_status"
+    )
+with col2:
+    st.write("")  # spacer
+    if st.button("Apply to Selected", disabled=not bulk_ids, use_container_width=True):
+        # One transaction for the whole selection
+        updated = update_incidents_status(bulk_ids, bulk_status)
+        st.session_state.bulk_status_message = f"✅ {updated} incidents set to {bulk_status}"
+        st.rerun()
+
+st.markdown("---")
 
 # ---------------- ASSISTANT ----------------
 from app.components.assistant_bot import render_assistant
-render_assistant(filtered_df, "Cybersecurity")
+with section("assistant", "assistant"):
+    # Totals over every filtered incident (the same counts as the metrics
+    # above), not the page of rows shown in the table
+    render_assistant(filtered_counts, "Cybersecurity", search_tables=("cyber_incidents",), counts=True)
+
+render_diagnostics()
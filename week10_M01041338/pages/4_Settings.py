@@ -1,5 +1,12 @@
 import streamlit as st
 from datetime import datetime
+from app.data.cache import cache_stats, clear_cache
+from app.data.schema import ensure_schema
+from app.data.snapshots import drop_snapshots
+from app.data.tracing import query_stats, slow_queries, reset_query_stats, SLOW_QUERY_MS
+from app.services.assistant_client import reply_stats, reset_reply_stats
+from app.data.assistant_cache import assistant_cache_stats, clear_assistant_cache
+from app.services.profiler import start_page, render_diagnostics
 
 # LOGIN PROTECTION - MUST BE FIRST
 # Block access to this page unless the user is logged in
@@ -7,12 +14,16 @@ if 'logged_in' not in st.session_state or not st.session_state.logged_in:
     st.error("❌ Please login first!")
     st.stop()
 
+# Time this rerun (diagnostics in the sidebar for admins)
+start_page("Settings")
+
 # Configure Streamlit page settings (title + wide layout)
 st.set_page_config(page_title="Settings", layout="wide")
 
 # Page heading + description
 st.title("⚙️ Application Settings")
 st.markdown("Manage your dashboard preferences and configurations")
+ensure_schema()
 
 # Sidebar divider
 st.sidebar.markdown("---")
@@ -101,6 +112,114 @@ with tab2:
     if st.button("💾 Save Data Settings", key="save_data"):
         st.success("✅ Data settings saved successfully!")
 
+    st.divider()
+    st.subheader("Read Cache")
+
+    # Hit/miss counters of the shared data cache (app/data/cache.py)
+    stats = cache_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hits", stats["hits"])
+    col2.metric("Misses", stats["misses"])
+    col3.metric("Hit Rate", f"{stats['hit_rate']:.0%}")
+    col4.metric("Cached Results", stats["entries"])
+
+    # Write version per table (goes up on every insert/update/delete)
+    if stats["versions"]:
+        st.caption("Table versions: " + ", ".join(
+            f"{table} v{version}" for table, version in sorted(stats["versions"].items())
+        ))
+
+    if st.button("🧹 Clear Cache", key="clear_cache"):
+        clear_cache()
+        drop_snapshots()
+        st.success("✅ Cache cleared")
+
+    # Query statistics (admins only): collected by the traced connections
+    # in app/data/tracing.py since the app started
+    if st.session_state.get("role") == "admin":
+        st.divider()
+        st.subheader("Query Statistics")
+
+        if st.button("🔄 Reset Query Statistics", key="reset_query_stats"):
+            reset_query_stats()
+            st.success("✅ Query statistics reset")
+
+        top = query_stats(limit=20)
+        if top:
+            st.caption("Queries that took the most time in total (ms; percentiles over recent calls)")
+            st.dataframe(
+                [
+                    {
+                        "query": q["fingerprint"],
+                        "calls": q["calls"],
+                        "total": round(q["total_ms"], 1),
+                        "mean": round(q["mean_ms"], 2),
+                        "p50": round(q["p50_ms"], 2),
+                        "p95": round(q["p95_ms"], 2),
+                        "p99": round(q["p99_ms"], 2),
+                        "rows": q["rows"],
+                        "called from": q["top_caller"],
+                    }
+                    for q in top
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("No queries recorded yet")
+
+        slow = slow_queries(limit=20)
+        st.caption(f"Slowest recent queries (over {SLOW_QUERY_MS:g} ms)")
+        if slow:
+            st.dataframe(
+                [{"time": q["time"], "ms": q["ms"], "rows": q["rows"],
+                  "called from": q["caller"], "query": q["fingerprint"]} for q in slow],
+                use_container_width=True,
+                hide_index=True
+            )
+
+        # Assistant replies (app/services/assistant_client.py): time to first
+        # token and generation speed per model
+        st.divider()
+        st.subheader("Assistant Replies")
+
+        if st.button("🔄 Reset Assistant Statistics", key="reset_reply_stats"):
+            reset_reply_stats()
+            st.success("✅ Assistant statistics reset")
+
+        replies = reply_stats()
+        if replies:
+            st.dataframe(
+                [
+                    {
+                        "model": r["model"],
+                        "replies": r["replies"],
+                        "ok": r["ok"],
+                        "cancelled": r["cancelled"],
+                        "failed": r["failed"],
+                        "first token (s)": None if r["ttft_s"] is None else round(r["ttft_s"], 2),
+                        "total (s)": round(r["seconds"], 2),
+                        "tokens/s": None if r["tokens_per_s"] is None else round(r["tokens_per_s"]),
+                    }
+                    for r in replies
+                ],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("No assistant replies yet")
+
+        # Replies answered from app/data/assistant_cache.py instead of the model
+        cached = assistant_cache_stats()
+        st.caption(
+            f"Response cache: {cached['entries']} replies stored, "
+            f"{cached['hits']} hits / {cached['misses']} misses ({cached['hit_rate']:.0%} hit rate, "
+            f"{cached['similar_hits']} on similar questions), {cached['saved_s']:.1f}s of model time saved"
+        )
+        if st.button("🧹 Clear Assistant Cache", key="clear_assistant_cache"):
+            clear_assistant_cache()
+            st.success("✅ Assistant cache cleared")
+
 # Divider line between sections
 st.markdown("---")
 
@@ -211,3 +330,5 @@ st.markdown(
     f"</p>",
     unsafe_allow_html=True
 )
+
+render_diagnostics()